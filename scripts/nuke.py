@@ -6,8 +6,10 @@ doc = """
 usage:
   teuthology-nuke --help
   teuthology-nuke [-v] [--owner OWNER] [-n NAME] [-u] [-i] [-r] [-s]
-                       [-p PID] [--dry-run] (-t CONFIG... | -a DIR)
-  teuthology-nuke [-v] [-u] [-i] [-r] [-s] [--dry-run] --owner OWNER --stale
+                       [--script] [--full] [-p PID] [--dry-run]
+                       (-t CONFIG... | -a DIR)
+  teuthology-nuke [-v] [-u] [-i] [-r] [-s] [--script] [--full] [--dry-run]
+                       --owner OWNER --stale
   teuthology-nuke [-v] [--dry-run] --stale-openstack
 
 Reset test machines
@@ -27,12 +29,17 @@ optional arguments:
                         targets that would be nuked
   --owner OWNER         job owner
   -p PID, --pid PID     pid of the process to be killed
-  -r, --reboot-all      reboot all machines
+  -r, --reboot-all      reboot all machines, even those found clean; implies
+                        --full
   -s, --synch-clocks    synchronize clocks on all machines
   -u, --unlock          Unlock each successfully nuked machine, and output
                         targets thatcould not be nuked.
   -n NAME, --name NAME  Name of run to cleanup
   -i, --noipmi          Skip ipmi checking
+  --script              Do most of the cleanup with a single generated shell
+                        script per machine instead of one command per step
+  --full                Reboot machines and clean them up a second time even
+                        if nothing was found on them that needs it
 
 Examples:
 teuthology-nuke -t target.yaml --unlock --owner user@host
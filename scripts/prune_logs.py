@@ -26,9 +26,22 @@ optional arguments:
                         Negative values will skip this operation.
                         [default: 60]
   -z DAYS, --compress DAYS
-                        Compress (using gzip) any teuthology.log files older
-                        than DAYS. Negative values will skip this operation.
+                        Compress any teuthology.log files older than DAYS.
+                        Negative values will skip this operation.
                         [default: 30]
+  -c CODEC, --codec CODEC
+                        Compress with CODEC: gz or zstd [default: gz]
+  -l LEVEL, --level LEVEL
+                        The compression level. Defaults to 6 for gz and 3 for
+                        zstd
+  -t N, --threads N     How many threads to compress each file with. gz needs
+                        pigz, or --seekable, to use more than one
+                        [default: 1]
+  --seekable            Compress files in independent chunks and write an
+                        index next to them, so that any part of them can be
+                        read without decompressing what comes before it
+  -j N, --processes N   How many removals and compressions to run at once.
+                        Defaults to the number of CPUs
 """.format(archive_base=teuthology.config.config.archive_base)
 
 
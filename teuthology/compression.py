@@ -0,0 +1,255 @@
+"""
+Compressing archived logs, and reading them back
+
+Logs can be compressed with gzip or zstd. A log compressed in the seekable
+format is cut into chunks that are compressed independently and written one
+after the other, which gzip and zstd still decompress as a whole. Where each
+chunk starts is recorded in an index written next to the compressed file, so
+that the end of a log, or any other part of it, can be read without
+decompressing what comes before it.
+"""
+import bisect
+import gzip
+import json
+import logging
+import os
+import shutil
+import subprocess
+import zlib
+
+from collections import deque
+from distutils.spawn import find_executable
+
+import gevent.threadpool
+
+# Optional; needed for the zstd codec
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+log = logging.getLogger(__name__)
+
+# The extension each codec adds to the files it compresses
+CODEC_EXTENSIONS = dict(
+    gz='.gz',
+    zstd='.zst',
+)
+
+DEFAULT_LEVELS = dict(
+    gz=6,
+    zstd=3,
+)
+
+# The extension of the index of a file compressed in the seekable format
+INDEX_EXTENSION = '.idx'
+
+# How much of a file each chunk of the seekable format holds
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+# The buffer size used to copy streams
+BUFSIZE = 1024 * 1024
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def get_codec(path):
+    """
+    :returns: The codec path was compressed with, judging by its extension,
+              or None
+    """
+    for (codec, ext) in CODEC_EXTENSIONS.items():
+        if path.endswith(ext):
+            return codec
+    return None
+
+
+def check_codec(codec):
+    """
+    :raises: ValueError if codec is unknown or needs a missing module
+    """
+    if codec not in CODEC_EXTENSIONS:
+        raise ValueError("Unknown compression codec: %s" % codec)
+    if codec == 'zstd' and zstandard is None:
+        raise ValueError("The zstd codec needs the zstandard module")
+
+
+def compress_file(in_path, codec='gz', level=None, threads=1,
+                  seekable=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Compress a file, preserving the original permissions, atime and mtime.
+    Does not remove the original.
+
+    :param codec:      A key of CODEC_EXTENSIONS
+    :param level:      The compression level; defaults to DEFAULT_LEVELS
+    :param threads:    How many threads to compress with
+    :param seekable:   Use the seekable format, and write an index
+    :param chunk_size: The uncompressed size of each chunk of the seekable
+                       format
+    :returns:          The path of the compressed file
+    """
+    check_codec(codec)
+    if level is None:
+        level = DEFAULT_LEVELS[codec]
+    out_path = in_path + CODEC_EXTENSIONS[codec]
+    if seekable:
+        _compress_seekable(in_path, out_path, codec, level, threads,
+                           chunk_size)
+    elif codec == 'zstd':
+        cctx = zstandard.ZstdCompressor(
+            level=level, threads=threads if threads > 1 else 0)
+        with open(in_path, 'rb') as src, open(out_path, 'wb') as dest:
+            cctx.copy_stream(src, dest, read_size=BUFSIZE, write_size=BUFSIZE)
+    elif threads > 1 and find_executable('pigz'):
+        with open(in_path, 'rb') as src, open(out_path, 'wb') as dest:
+            subprocess.check_call(
+                ['pigz', '-%d' % level, '-p', str(threads), '-c'],
+                stdin=src, stdout=dest)
+    else:
+        with open(in_path, 'rb') as src, open(out_path, 'wb') as raw:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+            while True:
+                data = src.read(BUFSIZE)
+                if not data:
+                    break
+                raw.write(compressor.compress(data))
+            raw.write(compressor.flush())
+    shutil.copystat(in_path, out_path)
+    return out_path
+
+
+def _compress_chunk(codec, level, data):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compress_seekable(in_path, out_path, codec, level, threads,
+                       chunk_size):
+    # zlib and zstandard release the GIL, so chunks are compressed in native
+    # threads
+    pool = gevent.threadpool.ThreadPool(threads) if threads > 1 else None
+    chunks = []
+    offset = 0
+    compressed_offset = 0
+    compress = lambda data: _compress_chunk(codec, level, data)
+    with open(in_path, 'rb') as src, open(out_path, 'wb') as dest:
+        while True:
+            batch = []
+            for _ in range(max(threads, 1)):
+                data = src.read(chunk_size)
+                if not data:
+                    break
+                batch.append(data)
+            if not batch:
+                break
+            if pool:
+                results = pool.map(compress, batch)
+            else:
+                results = map(compress, batch)
+            for (data, result) in zip(batch, results):
+                chunks.append([offset, compressed_offset])
+                dest.write(result)
+                offset += len(data)
+                compressed_offset += len(result)
+    if pool:
+        pool.kill()
+    index = dict(
+        codec=codec,
+        size=offset,
+        compressed_size=compressed_offset,
+        chunks=chunks,
+    )
+    with open(out_path + INDEX_EXTENSION, 'w') as f:
+        json.dump(index, f)
+
+
+def read_index(path):
+    """
+    :returns: The index of a file compressed in the seekable format, or None
+              if there is none
+    """
+    try:
+        with open(path + INDEX_EXTENSION) as f:
+            index = json.load(f)
+    except (IOError, ValueError):
+        return None
+    # An index that does not match the file is useless
+    if os.path.getsize(path) != index['compressed_size']:
+        return None
+    return index
+
+
+def _decompress_chunk(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data, GZIP_WBITS)
+
+
+def open_log(path):
+    """
+    Open a log for reading, decompressing it if its extension says it is
+    compressed
+
+    :returns: A file-like object
+    """
+    codec = get_codec(path)
+    if codec is None:
+        return open(path, 'rb')
+    check_codec(codec)
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(path, 'rb'), read_across_frames=True)
+    return gzip.open(path, 'rb')
+
+
+def read_tail(path, size):
+    """
+    Read the last size bytes of a log, which may be compressed. For logs
+    compressed in the seekable format, only the chunks holding those bytes
+    are decompressed.
+
+    :returns: A string
+    """
+    codec = get_codec(path)
+    if codec is None:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - size, 0))
+            return f.read()
+    index = read_index(path)
+    if index is None:
+        return _read_tail_stream(path, size)
+    chunks = index['chunks']
+    if not chunks:
+        return ''
+    start = max(index['size'] - size, 0)
+    # The chunk holding the first byte to read, and the ones after it
+    first = bisect.bisect_right([c[0] for c in chunks], start) - 1
+    ends = [c[1] for c in chunks[1:]] + [index['compressed_size']]
+    parts = []
+    with open(path, 'rb') as f:
+        f.seek(chunks[first][1])
+        for (chunk, end) in zip(chunks[first:], ends[first:]):
+            parts.append(_decompress_chunk(codec, f.read(end - chunk[1])))
+    return ''.join(parts)[start - chunks[first][0]:]
+
+
+def _read_tail_stream(path, size):
+    tail = deque()
+    tail_size = 0
+    f = open_log(path)
+    try:
+        while True:
+            data = f.read(BUFSIZE)
+            if not data:
+                break
+            tail.append(data)
+            tail_size += len(data)
+            while tail_size - len(tail[0]) >= size:
+                tail_size -= len(tail.popleft())
+    finally:
+        f.close()
+    data = ''.join(tail)
+    return data[max(len(data) - size, 0):]
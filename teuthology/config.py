@@ -132,6 +132,8 @@ class TeuthologyConfig(YamlConfig):
         'archive_upload': None,
         'archive_upload_key': None,
         'archive_upload_url': None,
+        'archive_compression': 'gz',
+        'archive_filter': None,
         'automated_scheduling': False,
         'reserve_machines': 5,
         'ceph_git_base_url': 'https://github.com/ceph/',
@@ -145,6 +147,8 @@ class TeuthologyConfig(YamlConfig):
         'check_package_signatures': True,
         'lab_domain': 'front.sepia.ceph.com',
         'lock_server': 'http://paddles.front.sepia.ceph.com/',
+        'lock_server_cache_ttl': 5,
+        'lock_queue_dir': None,
         'max_job_time': 259200,  # 3 days
         'results_server': 'http://paddles.front.sepia.ceph.com/',
         'results_ui_server': 'http://pulpito.ceph.com/',
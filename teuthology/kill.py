@@ -1,16 +1,21 @@
 #!/usr/bin/python
+import errno
 import os
+import signal
 import sys
 import yaml
 import psutil
 import subprocess
 import tempfile
+import time
 import logging
-import getpass
 
 from . import beanstalk
+from . import lock
+from . import manifest
 from . import report
 from .config import config
+from .parallel import parallel
 from . import misc
 
 log = logging.getLogger(__name__)
@@ -41,6 +46,7 @@ def main(args):
 def kill_run(run_name, archive_base=None, owner=None, machine_type=None,
              preserve_queue=False):
     run_info = {}
+    run_archive_dir = None
     serializer = report.ResultsSerializer(archive_base)
     if archive_base:
         run_archive_dir = os.path.join(archive_base, run_name)
@@ -52,13 +58,39 @@ def kill_run(run_name, archive_base=None, owner=None, machine_type=None,
             raise RuntimeError("The run is still entirely enqueued; " +
                                "you must also pass --machine-type")
 
-    if not preserve_queue:
-        remove_beanstalk_jobs(run_name, machine_type)
-        remove_paddles_jobs(run_name)
-    kill_processes(run_name, run_info.get('pids'))
+    # Emptying the queue and deleting queued jobs from paddles don't depend
+    # on each other or on the processes being gone, so they run at the same
+    # time as the processes are killed
+    pids = run_info.get('pids')
+    with parallel() as p:
+        if not preserve_queue:
+            p.spawn(run_phase, "Removing queued jobs from beanstalk",
+                    remove_beanstalk_jobs, run_name, machine_type)
+            p.spawn(run_phase, "Removing queued jobs from paddles",
+                    remove_paddles_jobs, run_name)
+        p.spawn(run_phase, "Killing processes", kill_processes, run_name,
+                pids)
+    if not preserve_queue and run_archive_dir:
+        # Kill any job a worker started before it was removed from the queue
+        late_pids = set(manifest.read_pids(run_archive_dir).values())
+        late_pids.difference_update(pids or [])
+        if late_pids:
+            run_phase("Killing late processes", kill_processes, run_name,
+                      late_pids)
     if owner is not None:
-        targets = find_targets(run_name, owner)
-        nuke_targets(targets, owner)
+        targets = run_phase("Finding targets", find_targets, run_name, owner)
+        run_phase("Nuking targets", nuke_targets, targets, owner)
+
+
+def run_phase(description, func, *args):
+    """
+    Call func(*args), logging when it starts and how long it took
+    """
+    log.info("%s...", description)
+    start = time.time()
+    result = func(*args)
+    log.info("%s: done in %.1fs", description, time.time() - start)
+    return result
 
 
 def kill_job(run_name, job_id, archive_base=None, owner=None,
@@ -83,7 +115,11 @@ def find_run_info(serializer, run_name):
         'owner',
     ]
 
-    pids = []
+    # Workers record the PIDs of the jobs they start. Once we know the run's
+    # info, only jobs whose PID was not recorded still need to be read.
+    registered_pids = manifest.read_pids(
+        os.path.join(serializer.archive_base, run_name))
+    pids = registered_pids.values()
     run_info = {}
     job_info = {}
     job_num = 0
@@ -94,11 +130,14 @@ def find_run_info(serializer, run_name):
             continue
         job_num += 1
         beanstalk.print_progress(job_num, job_total, 'Reading Job: ')
+        if (job_id in registered_pids and
+                all(key in run_info for key in run_info_fields)):
+            continue
         job_info = serializer.job_info(run_name, job_id, simple=True)
         for key in job_info.keys():
             if key in run_info_fields and key not in run_info:
                 run_info[key] = job_info[key]
-        if 'pid' in job_info:
+        if job_id not in registered_pids and 'pid' in job_info:
             pids.append(job_info['pid'])
     run_info['pids'] = pids
     return run_info
@@ -149,7 +188,7 @@ def remove_beanstalk_jobs(run_name, tube_name):
 
 def kill_processes(run_name, pids=None):
     if pids:
-        to_kill = set(pids).intersection(psutil.pids())
+        to_kill = set(pid for pid in pids if psutil.pid_exists(pid))
     else:
         to_kill = find_pids(run_name)
 
@@ -163,13 +202,25 @@ def kill_processes(run_name, pids=None):
         log.info("No teuthology processes running")
     else:
         log.info("Killing Pids: " + str(to_kill))
-        for pid in to_kill:
-            args = ['kill', str(pid)]
-            # Don't attempt to use sudo if it's not necessary
-            proc_user = psutil.Process(int(pid)).username()
-            if proc_user != getpass.getuser():
-                args.insert(0, 'sudo')
-            subprocess.call(args)
+        signal_processes(to_kill)
+
+
+def signal_processes(pids, sig=signal.SIGTERM):
+    """
+    Send a signal to each of pids. The processes we aren't allowed to signal
+    are all signalled with a single 'sudo kill'.
+    """
+    need_sudo = []
+    for pid in sorted(pids):
+        try:
+            os.kill(int(pid), sig)
+        except OSError as e:
+            if e.errno == errno.EPERM:
+                need_sudo.append(str(pid))
+            elif e.errno != errno.ESRCH:
+                raise
+    if need_sudo:
+        subprocess.call(['sudo', 'kill', '-%d' % sig] + need_sudo)
 
 
 def process_matches_run(pid, run_name):
@@ -192,23 +243,17 @@ def find_pids(run_name):
 
 
 def find_targets(run_name, owner):
-    lock_args = [
-        'teuthology-lock',
-        '--list-targets',
-        '--desc-pattern',
-        '/' + run_name + '/',
-        '--status',
-        'up',
-        '--owner',
-        owner
-    ]
-    proc = subprocess.Popen(lock_args, stdout=subprocess.PIPE)
-    stdout, stderr = proc.communicate()
-    out_obj = yaml.safe_load(stdout)
-    if not out_obj or 'targets' not in out_obj:
+    desc_pattern = '/' + run_name + '/'
+    nodes = lock.list_locks(locked=True, up=True, locked_by=owner)
+    targets = dict()
+    for node in nodes:
+        if (node['locked_by'] == owner and node['description'] and
+                desc_pattern in node['description']):
+            targets[node['name']] = node['ssh_pub_key']
+    if not targets:
         return {}
 
-    return out_obj
+    return dict(targets=targets)
 
 
 def nuke_targets(targets_dict, owner):
@@ -9,18 +9,30 @@ import collections
 import os
 import pprint
 import requests
+import time
 import urllib
 
+import gevent.pool
+
 import teuthology
+from . import lockstatus
 from . import misc
 from . import provision
 from .config import config
 from .config import set_config_attr
-from .contextutil import safe_while
+from .lock_client import get_client
 from .lockstatus import get_status
 
 log = logging.getLogger(__name__)
 
+# For how many seconds get_job_statuses() reuses what the results server
+# told it about a run
+JOB_STATUS_CACHE_TTL = 60
+# The maximum number of runs get_job_statuses() queries at once
+MAX_PARALLEL_RUN_QUERIES = 16
+
+_job_status_cache = dict()
+
 
 def is_vm(name):
     return get_status(name)['is_vm']
@@ -116,9 +128,11 @@ def validate_distro_version(version, supported_versions):
 def get_statuses(machines):
     if machines:
         statuses = []
+        machines = [misc.canonicalize_hostname(machine)
+                    for machine in machines]
+        machine_statuses = lockstatus.get_statuses(machines)
         for machine in machines:
-            machine = misc.canonicalize_hostname(machine)
-            status = get_status(machine)
+            status = machine_statuses[machine]
             if status:
                 statuses.append(status)
             else:
@@ -425,8 +439,9 @@ def lock_many(ctx, num, machine_type, user=None, description=None,
         machine_types_str = '|'.join(machine_types_list)
         machine_types = [machine_types_str, ]
 
+    client = get_client()
     for machine_type in machine_types:
-        uri = os.path.join(config.lock_server, 'nodes', 'lock_many', '')
+        uri = client.uri('nodes', 'lock_many')
         data = dict(
             locked_by=user,
             count=num,
@@ -443,11 +458,7 @@ def lock_many(ctx, num, machine_type, user=None, description=None,
         if arch:
             data['arch'] = arch
         log.debug("lock_many request: %s", repr(data))
-        response = requests.post(
-            uri,
-            data=json.dumps(data),
-            headers={'content-type': 'application/json'},
-        )
+        response = client.post(uri, data)
         if response.ok:
             machines = {misc.canonicalize_hostname(machine['name']):
                         machine['ssh_pub_key'] for machine in response.json()}
@@ -480,8 +491,8 @@ def lock_one(name, user=None, description=None):
         user = misc.get_user()
     request = dict(name=name, locked=True, locked_by=user,
                    description=description)
-    uri = os.path.join(config.lock_server, 'nodes', name, 'lock', '')
-    response = requests.put(uri, json.dumps(request))
+    client = get_client()
+    response = client.put(client.uri('nodes', name, 'lock'), request)
     success = response.ok
     if success:
         log.debug('locked %s as %s', name, user)
@@ -499,16 +510,12 @@ def unlock_many(names, user):
     fixed_names = [misc.canonicalize_hostname(name, user=None) for name in
                    names]
     names = fixed_names
-    uri = os.path.join(config.lock_server, 'nodes', 'unlock_many', '')
+    client = get_client()
     data = dict(
         locked_by=user,
         names=names,
     )
-    response = requests.post(
-        uri,
-        data=json.dumps(data),
-        headers={'content-type': 'application/json'},
-    )
+    response = client.post(client.uri('nodes', 'unlock_many'), data)
     if response.ok:
         log.debug("Unlocked: %s", ', '.join(names))
     else:
@@ -522,16 +529,10 @@ def unlock_one(ctx, name, user, description=None):
         log.error('destroy failed for %s', name)
     request = dict(name=name, locked=False, locked_by=user,
                    description=description)
-    uri = os.path.join(config.lock_server, 'nodes', name, 'lock', '')
-    with safe_while(
-            sleep=1, increment=0.5, action="unlock %s" % name) as proceed:
-        while proceed():
-            try:
-                response = requests.put(uri, json.dumps(request))
-                break
-            # Work around https://github.com/kennethreitz/requests/issues/2364
-            except requests.ConnectionError as e:
-                log.warn("Saw %s while unlocking; retrying...", str(e))
+    client = get_client()
+    # The client retries if the connection fails, e.g. when a kept-alive
+    # connection was closed by the lock server
+    response = client.put(client.uri('nodes', name, 'lock'), request)
     success = response.ok
     if success:
         log.info('unlocked %s', name)
@@ -552,7 +553,8 @@ def locked_since_seconds(node):
 
 def list_locks(keyed_by_name=False, **kwargs):
     log.debug("list_locks")
-    uri = os.path.join(config.lock_server, 'nodes', '')
+    client = get_client()
+    uri = client.uri('nodes')
     log.debug("uri is " + pprint.pformat(uri))
     for key, value in kwargs.iteritems():
         if kwargs[key] is False:
@@ -565,7 +567,7 @@ def list_locks(keyed_by_name=False, **kwargs):
         uri += '?' + urllib.urlencode(kwargs)
     log.debug("uri is " + pprint.pformat(uri))
     try:
-        response = requests.get(uri)
+        response = client.get(uri, cache=True)
     except requests.ConnectionError:
         success = False
         log.exception("Could not contact lock server: %s", config.lock_server)
@@ -613,37 +615,75 @@ def find_stale_locks(owner=None):
         nodes = [node for node in nodes if node['locked_by'] == owner]
     nodes = filter(might_be_stale, nodes)
 
-    def node_job_is_active(node, cache):
+    # Ask the results server about each run only once
+    job_statuses = get_job_statuses(
+        [node['description'].split('/')[-2] for node in nodes])
+
+    def node_job_is_active(node):
         """
         Is this node's job active (e.g. running or waiting)?
 
         :param node:  The node dict as returned from the lock server
-        :param cache: A set() used for caching results
-        :returns:     True or False
+        :returns:     True or False. Nodes whose run could not be queried are
+                      considered active.
         """
-        description = node['description']
-        if description in cache:
-            return True
-        (name, job_id) = description.split('/')[-2:]
-        url = os.path.join(config.results_server, 'runs', name, 'jobs', job_id,
-                           '')
-        resp = requests.get(url)
-        job_info = resp.json()
-        if job_info['status'] in ('running', 'waiting'):
-            cache.add(description)
+        (name, job_id) = node['description'].split('/')[-2:]
+        statuses = job_statuses[name]
+        if statuses is None:
             return True
-        return False
+        return statuses.get(job_id) in ('running', 'waiting')
 
-    result = list()
     # Here we build the list of of nodes that are locked, for a job (as opposed
     # to being locked manually for random monkeying), where the job is not
     # running
-    active_jobs = set()
-    for node in nodes:
-        if node_job_is_active(node, active_jobs):
-            continue
-        result.append(node)
-    return result
+    return [node for node in nodes if not node_job_is_active(node)]
+
+
+def get_job_statuses(run_names, max_parallel=MAX_PARALLEL_RUN_QUERIES,
+                     cache_ttl=JOB_STATUS_CACHE_TTL):
+    """
+    Query the results server for the status of every job in several runs,
+    with one request per run. Answers are cached for cache_ttl seconds.
+
+    :param run_names:    An iterable of run names; duplicates are ignored
+    :param max_parallel: The maximum number of queries to have in flight
+    :param cache_ttl:    For how many seconds to reuse earlier answers
+    :returns:            A dict mapping each run name to a dict mapping job
+                         IDs to statuses, or to None if the query failed. The
+                         jobs of runs the results server does not know are
+                         absent.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_parallel)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def get_run_statuses(run_name):
+        cached = _job_status_cache.get(run_name)
+        if cached and time.time() - cached[0] < cache_ttl:
+            return cached[1]
+        uri = os.path.join(config.results_server, 'runs', run_name, 'jobs', '')
+        try:
+            resp = session.get(uri, params=dict(fields='job_id,status'))
+        except requests.exceptions.RequestException:
+            log.exception("Failed to query results server for %s", run_name)
+            return None
+        if resp.status_code == 404:
+            statuses = dict()
+        elif resp.ok:
+            statuses = dict(
+                (str(job['job_id']), job.get('status')) for job in resp.json()
+            )
+        else:
+            log.warning("Failed to query results server for %s: %s",
+                        run_name, resp.status_code)
+            return None
+        _job_status_cache[run_name] = (time.time(), statuses)
+        return statuses
+
+    run_names = list(set(run_names))
+    pool = gevent.pool.Pool(max_parallel)
+    return dict(zip(run_names, pool.map(get_run_statuses, run_names)))
 
 
 def update_lock(name, description=None, status=None, ssh_pub_key=None):
@@ -657,10 +697,8 @@ def update_lock(name, description=None, status=None, ssh_pub_key=None):
         updated['ssh_pub_key'] = ssh_pub_key
 
     if updated:
-        uri = os.path.join(config.lock_server, 'nodes', name, '')
-        response = requests.put(
-            uri,
-            json.dumps(updated))
+        client = get_client()
+        response = client.put(client.uri('nodes', name), updated)
         return response.ok
     return True
 
@@ -675,21 +713,12 @@ def update_inventory(node_dict):
         raise ValueError("must specify name")
     if not config.lock_server:
         return
-    uri = os.path.join(config.lock_server, 'nodes', name, '')
+    client = get_client()
     log.info("Updating %s on lock server", name)
-    response = requests.put(
-        uri,
-        json.dumps(node_dict),
-        headers={'content-type': 'application/json'},
-        )
+    response = client.put(client.uri('nodes', name), node_dict)
     if response.status_code == 404:
         log.info("Creating new node %s on lock server", name)
-        uri = os.path.join(config.lock_server, 'nodes', '')
-        response = requests.post(
-            uri,
-            json.dumps(node_dict),
-            headers={'content-type': 'application/json'},
-        )
+        response = client.post(client.uri('nodes'), node_dict)
     if not response.ok:
         log.error("Node update/creation failed for %s: %s",
                   name, response.text)
@@ -717,11 +746,18 @@ def updatekeys(args):
     return do_update_keys(machines, all_)
 
 
-def do_update_keys(machines, all_=False):
+def do_update_keys(machines, all_=False, keys_dict=None):
+    """
+    Record the current SSH host keys of machines on the lock server
+
+    :param keys_dict: Host keys that were already scanned, keyed by
+                      hostname; machines is not scanned again if given
+    """
     reference = list_locks(keyed_by_name=True)
     if all_:
         machines = reference.keys()
-    keys_dict = misc.ssh_keyscan(machines)
+    if keys_dict is None:
+        keys_dict = misc.ssh_keyscan(machines)
     return push_new_keys(keys_dict, reference)
 
 
@@ -0,0 +1,117 @@
+"""
+A client for the lock server's REST API
+
+Every request made through a LockServerClient shares one requests.Session,
+so connections to the lock server are kept alive and reused. Requests that
+fail because the lock server could not be reached, or because of a gateway
+error, are retried with exponential backoff. Every request has a timeout.
+"""
+import json
+import logging
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from .config import config
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 60
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+
+# How many requests callers like lockstatus.get_statuses() make at once; the
+# connection pool is sized to match, so that no connection is thrown away
+MAX_PARALLEL_QUERIES = 16
+
+JSON_HEADERS = {'content-type': 'application/json'}
+
+
+class LockServerClient(object):
+    """
+    :param base_url:   The lock server's URL. Defaults to config.lock_server
+    :param timeout:    Seconds to wait for the lock server to respond
+    :param retries:    How many times to retry a failed request
+    :param backoff:    The backoff factor between retries; see
+                       urllib3.util.retry.Retry
+    :param cache_ttl:  For how many seconds to reuse the responses of
+                       read-only requests made with cache=True. 0 disables
+                       caching.
+    """
+    def __init__(self, base_url=None, timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 cache_ttl=0):
+        self.base_url = base_url or config.lock_server
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self._cache = dict()
+        self.session = requests.Session()
+        # POST is not retried when the lock server answers; e.g. a 503 from
+        # lock_many means that there are not enough free nodes
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            method_whitelist=frozenset(['GET', 'HEAD', 'PUT', 'DELETE']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry,
+                              pool_maxsize=MAX_PARALLEL_QUERIES)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def uri(self, *parts):
+        """
+        Build a lock server URI, e.g. uri('nodes', name)
+        """
+        return os.path.join(self.base_url, *(list(parts) + ['']))
+
+    def request(self, method, uri, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if method != 'GET':
+            self.clear_cache()
+        return self.session.request(method, uri, **kwargs)
+
+    def get(self, uri, params=None, cache=False):
+        """
+        :param cache: Reuse a previous response to the same request if it is
+                      younger than cache_ttl seconds
+        """
+        if not (cache and self.cache_ttl):
+            return self.request('GET', uri, params=params)
+        key = (uri, tuple(sorted((params or dict()).items())))
+        cached = self._cache.get(key)
+        if cached and time.time() - cached[0] < self.cache_ttl:
+            return cached[1]
+        response = self.request('GET', uri, params=params)
+        if response.ok:
+            self._cache[key] = (time.time(), response)
+        return response
+
+    def put(self, uri, data):
+        return self.request(
+            'PUT', uri, data=json.dumps(data), headers=JSON_HEADERS)
+
+    def post(self, uri, data):
+        return self.request(
+            'POST', uri, data=json.dumps(data), headers=JSON_HEADERS)
+
+    def clear_cache(self):
+        self._cache.clear()
+
+
+_client = None
+
+
+def get_client():
+    """
+    Return the LockServerClient shared by this process, creating it if it
+    does not exist or if config.lock_server has changed
+    """
+    global _client
+    if _client is None or _client.base_url != config.lock_server:
+        _client = LockServerClient(cache_ttl=config.lock_server_cache_ttl)
+    return _client
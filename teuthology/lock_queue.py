@@ -0,0 +1,146 @@
+"""
+A host-local queue of jobs waiting to lock machines
+
+Without it, every job waiting for machines polls the lock server on its own
+and whichever job happens to ask right after machines are freed gets them.
+When config.lock_queue_dir is set, each waiting job instead registers its
+demand in a per-machine-type directory below it. Only the job at the head of
+the queue - the one with the best (lowest) priority that registered first -
+queries the lock server; the others only watch the local directory, and are
+woken as soon as the jobs ahead of them have locked their machines or given
+up.
+
+Entries left behind by jobs that died are removed by the jobs still waiting.
+"""
+import errno
+import itertools
+import logging
+import os
+import re
+import time
+
+import yaml
+
+from .config import config
+
+log = logging.getLogger(__name__)
+
+# teuthology-schedule's default priority
+DEFAULT_PRIORITY = 1000
+
+# Distinguishes entries registered by one process at the same time
+_sequence = itertools.count()
+
+
+class Demand(object):
+    """
+    One job's place in the queue for a machine type
+
+    :param machine_type: The machine type(s) the job wants to lock
+    :param count:        How many machines the job wants
+    :param priority:     The job's priority; lower is better
+    :param job_id:       The job's ID, for logging
+    :param queue_dir:    Defaults to config.lock_queue_dir
+    """
+    def __init__(self, machine_type, count, priority=None, job_id=None,
+                 queue_dir=None):
+        self.machine_type = machine_type
+        self.count = count
+        self.priority = DEFAULT_PRIORITY if priority is None else priority
+        self.job_id = job_id
+        self.dir = os.path.join(
+            queue_dir or config.lock_queue_dir,
+            re.sub('[^A-Za-z0-9_.-]', '_', machine_type),
+        )
+        self.path = None
+
+    def register(self):
+        """
+        Join the end of the queue for our priority
+        """
+        if not os.path.isdir(self.dir):
+            try:
+                os.makedirs(self.dir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        # Entries sort by priority, then by registration time
+        name = '{priority:010d}-{time:017.6f}-{seq:06d}-{pid}'.format(
+            priority=self.priority, time=time.time(), seq=next(_sequence),
+            pid=os.getpid())
+        self.path = os.path.join(self.dir, name)
+        with file(self.path + '.tmp', 'w') as f:
+            yaml.safe_dump(
+                dict(job_id=self.job_id, count=self.count,
+                     machine_type=self.machine_type),
+                f, default_flow_style=False)
+        os.rename(self.path + '.tmp', self.path)
+        log.info("Waiting in line for %s machines as %s", self.machine_type,
+                 name)
+
+    def unregister(self):
+        """
+        Leave the queue, letting the next job in line go ahead
+        """
+        if self.path is None:
+            return
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        self.path = None
+
+    def ahead(self):
+        """
+        :returns: The names of the entries ahead of ours. Entries belonging
+                  to processes that no longer exist are removed.
+        """
+        entries = list()
+        for name in sorted(os.listdir(self.dir)):
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(self.dir, name)
+            if path == self.path:
+                break
+            if not _pid_exists(int(name.split('-')[-1])):
+                log.info("Removing stale lock queue entry %s", name)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            entries.append(name)
+        return entries
+
+    def wait_for_turn(self, interval=1):
+        """
+        Block until our entry is at the head of the queue. Only the local
+        queue directory is looked at while waiting.
+        """
+        last_ahead = None
+        while True:
+            ahead = self.ahead()
+            if not ahead:
+                return
+            if len(ahead) != last_ahead:
+                log.info(
+                    "%d job(s) ahead of us in line for %s machines",
+                    len(ahead), self.machine_type)
+                last_ahead = len(ahead)
+            time.sleep(interval)
+
+    def __enter__(self):
+        self.register()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.unregister()
+
+
+def _pid_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
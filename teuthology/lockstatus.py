@@ -1,7 +1,6 @@
-import requests
-import os
+import gevent.pool
 import logging
-from .config import config
+from .lock_client import MAX_PARALLEL_QUERIES, get_client
 from .misc import canonicalize_hostname
 
 log = logging.getLogger(__name__)
@@ -9,11 +8,28 @@ log = logging.getLogger(__name__)
 
 def get_status(name):
     name = canonicalize_hostname(name, user=None)
-    uri = os.path.join(config.lock_server, 'nodes', name, '')
-    response = requests.get(uri)
+    client = get_client()
+    response = client.get(client.uri('nodes', name))
     success = response.ok
     if success:
         return response.json()
     log.warning(
         "Failed to query lock server for status of {name}".format(name=name))
     return None
+
+
+def get_statuses(names, max_parallel=MAX_PARALLEL_QUERIES):
+    """
+    Query the lock server for the status of several nodes at once. The lock
+    server's nodes endpoint can't filter by name, so each node is queried on
+    its own.
+
+    :param names:        An iterable of node names, in any form that
+                         canonicalize_hostname() accepts
+    :param max_parallel: The maximum number of queries to have in flight
+    :returns:            A dict mapping each of names to its status, or to
+                         None if the query failed
+    """
+    names = list(names)
+    pool = gevent.pool.Pool(max_parallel)
+    return dict(zip(names, pool.map(get_status, names)))
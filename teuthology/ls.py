@@ -3,28 +3,48 @@ import yaml
 import errno
 import re
 
+import gevent.threadpool
+
+from . import manifest
+from .compression import CODEC_EXTENSIONS, read_tail
 from .job_status import get_status
 
+# libyaml's loader, when available, is much faster
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# How many summaries missing from a run's manifest to read at once
+MAX_PARALLEL_READS = 16
+
+# How much of the end of a log to read to find its last line
+TAIL_SIZE = 4096
+
 
 def main(args):
     return ls(args["<archive_dir>"], args["--verbose"])
 
 
 def ls(archive_dir, verbose):
-    for j in get_jobs(archive_dir):
-        job_dir = os.path.join(archive_dir, j)
-        summary = {}
+    jobs = get_jobs(archive_dir)
+    # Finished jobs are listed from the run's manifest; the summaries of the
+    # others, if any, are read in threads since that is mostly waiting on I/O
+    entries = manifest.read_manifest(archive_dir)
+    missing = [j for j in jobs if j not in entries]
+    if missing:
+        pool = gevent.threadpool.ThreadPool(
+            min(len(missing), MAX_PARALLEL_READS))
         try:
-            with file(os.path.join(job_dir, 'summary.yaml')) as f:
-                g = yaml.safe_load_all(f)
-                for new in g:
-                    summary.update(new)
-        except IOError as e:
-            if e.errno == errno.ENOENT:
-                print_debug_info(j, job_dir, archive_dir)
-                continue
-            else:
-                raise
+            summaries = pool.imap(
+                load_summary,
+                [os.path.join(archive_dir, j) for j in missing])
+            entries.update(zip(missing, summaries))
+        finally:
+            pool.kill()
+
+    for j in jobs:
+        summary = entries[j]
+        if summary is None:
+            print_debug_info(j, os.path.join(archive_dir, j), archive_dir)
+            continue
 
         print "{job} {status} {owner} {desc} {duration}s".format(
             job=j,
@@ -37,6 +57,22 @@ def ls(archive_dir, verbose):
             print '    {reason}'.format(reason=summary['failure_reason'])
 
 
+def load_summary(job_dir):
+    """
+    :returns: The job's summary dict, or None if it has no summary.yaml
+    """
+    summary = {}
+    try:
+        with file(os.path.join(job_dir, 'summary.yaml')) as f:
+            for new in yaml.load_all(f, Loader=SafeLoader):
+                summary.update(new)
+    except IOError as e:
+        if e.errno == errno.ENOENT:
+            return None
+        raise
+    return summary
+
+
 def get_jobs(archive_dir):
     dir_contents = os.listdir(archive_dir)
 
@@ -66,11 +102,23 @@ def print_debug_info(job, job_dir, archive_dir):
                     found = True
         if not found:
             print '(no process or summary.yaml)',
-        # tail
-        tail = os.popen(
-            'tail -1 %s/%s/teuthology.log' % (archive_dir, job)
-        ).read().rstrip()
-        print tail,
+        print get_last_line(job_dir),
     except IOError:
         pass
     print ''
+
+
+def get_last_line(job_dir):
+    """
+    :returns: The last line of the job's log, which may have been compressed,
+              read by seeking from its end
+    """
+    log_path = os.path.join(job_dir, 'teuthology.log')
+    for ext in [''] + sorted(CODEC_EXTENSIONS.values()):
+        if os.path.isfile(log_path + ext):
+            log_path += ext
+            break
+    else:
+        return ''
+    lines = read_tail(log_path, TAIL_SIZE).rstrip().rsplit('\n', 1)
+    return lines[-1]
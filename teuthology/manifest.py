@@ -0,0 +1,132 @@
+"""
+Per-run manifests of job outcomes
+
+When a job finishes, a line recording its ID, status, archive size, the time
+it finished and a few fields of its summary is appended to MANIFEST_FILE in
+its run's archive directory. Tools that need the outcome of every job in a
+run, like teuthology-prune-logs and teuthology-ls, read that one small file
+instead of every job's summary.yaml.
+
+Similarly, when a worker starts a job, the job's process ID is appended to
+PIDS_FILE, so that teuthology-kill can signal the processes of a run without
+looking at every process on the host.
+
+Lines are appended with a single write to a file opened with O_APPEND, while
+holding an exclusive lockf() lock on it: O_APPEND alone is not atomic across
+the clients of an NFS-hosted archive. If a job is recorded more than once,
+its last line wins. Lines that can't be parsed are ignored; jobs missing from
+the manifest are looked up in their summary.yaml instead.
+"""
+import errno
+import fcntl
+import json
+import logging
+import os
+import time
+
+from .job_status import get_status
+
+log = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.jsonl'
+PIDS_FILE = 'pids.jsonl'
+
+# Fields of a job's summary copied into its manifest entry, when present, so
+# that teuthology-ls can list finished jobs from the manifest alone
+SUMMARY_FIELDS = ('owner', 'description', 'duration', 'failure_reason')
+
+
+def record_job(job_archive, summary):
+    """
+    Record the outcome of a job in its run's manifest
+
+    :param job_archive: The job's archive directory
+    :param summary:     The job's summary dict
+    :returns:           The recorded entry
+    """
+    (run_dir, job_id) = os.path.split(job_archive.rstrip('/'))
+    entry = dict(
+        job_id=job_id,
+        status=get_status(summary),
+        size=get_size(job_archive),
+        mtime=time.time(),
+    )
+    for field in SUMMARY_FIELDS:
+        if field in summary:
+            entry[field] = summary[field]
+    _append_entry(os.path.join(run_dir, MANIFEST_FILE), entry)
+    return entry
+
+
+def read_manifest(run_dir):
+    """
+    :returns: A dict mapping the IDs of the jobs recorded in the run's
+              manifest to their entries. It is empty if there is no manifest.
+    """
+    return _read_entries(os.path.join(run_dir, MANIFEST_FILE))
+
+
+def record_pid(job_archive, pid):
+    """
+    Record the process ID of a job that was just started
+
+    :param job_archive: The job's archive directory
+    :param pid:         The job's process ID
+    """
+    (run_dir, job_id) = os.path.split(job_archive.rstrip('/'))
+    _append_entry(os.path.join(run_dir, PIDS_FILE),
+                  dict(job_id=job_id, pid=pid))
+
+
+def read_pids(run_dir):
+    """
+    :returns: A dict mapping the IDs of the jobs whose process IDs were
+              recorded for the run to those process IDs
+    """
+    entries = _read_entries(os.path.join(run_dir, PIDS_FILE))
+    return dict((job_id, entry['pid']) for (job_id, entry) in entries.items()
+                if isinstance(entry.get('pid'), int))
+
+
+def _append_entry(path, entry):
+    line = json.dumps(entry, sort_keys=True) + '\n'
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+    try:
+        # Closing the file releases the lock
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def _read_entries(path):
+    entries = dict()
+    try:
+        f = open(path)
+    except IOError as e:
+        if e.errno == errno.ENOENT:
+            return entries
+        raise
+    with f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                entries[str(entry['job_id'])] = entry
+            except (ValueError, KeyError, TypeError):
+                # e.g. a partial line written by a job that was killed
+                log.debug("Ignoring bad line in %s: %r", path, line)
+    return entries
+
+
+def get_size(path):
+    """
+    :returns: The total size of the files below path, in bytes
+    """
+    size = 0
+    for (dirpath, dirnames, filenames) in os.walk(path):
+        for name in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return size
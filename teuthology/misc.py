@@ -5,6 +5,7 @@ Used by other modules, but mostly called from tasks.
 from cStringIO import StringIO
 
 import argparse
+import gevent.pool
 import os
 import logging
 import configobj
@@ -20,15 +21,26 @@ import yaml
 import json
 import re
 import pprint
+import shutil
 
 from teuthology import safepath
 from teuthology.exceptions import (CommandCrashedError, CommandFailedError,
                                    ConnectionLostError)
-from .orchestra import run
+from .orchestra import connection, facts, run
 from .config import config
 from .contextutil import safe_while
 from .orchestra.opsys import DEFAULT_OS_VERSION
 
+# Optional; used to pull archives compressed with zstd or lz4
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
 log = logging.getLogger(__name__)
 
 import datetime
@@ -747,16 +759,89 @@ def get_file(remote, path, sudo=False, dest_dir='/tmp'):
     return file_data
 
 
-def pull_directory(remote, remotedir, localdir):
+def get_tar_codec(remote, preferred=None):
+    """
+    Pick the compression codec to use when pulling a directory from remote.
+
+    :param remote:    The teuthology.orchestra.remote.Remote to pull from
+    :param preferred: A codec name, or a list of them in order of preference.
+                      Defaults to the archive_compression setting.
+    :returns:         The first of preferred that both ends support; 'gz'
+                      if there is none
+    """
+    if preferred is None:
+        preferred = config.archive_compression
+    return pick_codec(remote, preferred, TAR_DECOMPRESSORS,
+                      builtin=('gz', 'none'))
+
+
+def pick_codec(remote, preferred, supported, builtin=('gz',)):
+    """
+    Pick a compression codec that both this host and remote support
+
+    :param remote:    The teuthology.orchestra.remote.Remote concerned
+    :param preferred: A codec name, or a list of them in order of preference
+    :param supported: A dict whose keys are the codecs we know of. Codecs
+                      mapped to None can't be used on this host, e.g. because
+                      their Python module is missing.
+    :param builtin:   Codecs that can always be used
+    :returns:         The first of preferred that can be used; 'gz' if there
+                      is none
+    """
+    if isinstance(preferred, basestring):
+        preferred = [preferred]
+    for codec in preferred:
+        if codec in builtin:
+            return codec
+        if codec not in supported:
+            log.warning("Ignoring unknown archive compression codec: %s",
+                        codec)
+        elif supported[codec] is None:
+            log.debug("Can't use %s; its Python module is missing", codec)
+        elif codec in facts.get(remote).get('compressors', []):
+            return codec
+    return 'gz'
+
+
+def _zstd_reader(fileobj):
+    return zstandard.ZstdDecompressor().stream_reader(fileobj)
+
+
+def _lz4_reader(fileobj):
+    return lz4.frame.LZ4FrameFile(fileobj, mode='rb')
+
+
+# Functions wrapping a stream compressed with each codec that
+# Remote.get_tar_stream() compresses outside of tar itself. They are None if
+# the module they need isn't installed.
+TAR_DECOMPRESSORS = dict(
+    zstd=_zstd_reader if zstandard else None,
+    lz4=_lz4_reader if lz4 else None,
+)
+
+# The buffer size used to write pulled files
+PULL_BUFSIZE = 1024 * 1024
+
+
+def pull_directory(remote, remotedir, localdir, compress=None):
     """
     Copy a remote directory to a local directory.
+
+    :param compress: The compression codec(s) to use; see get_tar_codec()
     """
-    log.debug('Transferring archived files from %s:%s to %s',
-              remote.shortname, remotedir, localdir)
+    codec = get_tar_codec(remote, compress)
+    log.debug('Transferring archived files from %s:%s to %s (%s)',
+              remote.shortname, remotedir, localdir, codec)
     if not os.path.exists(localdir):
         os.mkdir(localdir)
-    r = remote.get_tar_stream(remotedir, sudo=True)
-    tar = tarfile.open(mode='r|gz', fileobj=r.stdout)
+    r = remote.get_tar_stream(remotedir, sudo=True, compress=codec)
+    if codec in TAR_DECOMPRESSORS:
+        fileobj = TAR_DECOMPRESSORS[codec](r.stdout)
+        mode = 'r|'
+    else:
+        fileobj = r.stdout
+        mode = 'r|gz' if codec == 'gz' else 'r|'
+    tar = tarfile.open(mode=mode, fileobj=fileobj)
     while True:
         ti = tar.next()
         if ti is None:
@@ -769,7 +854,10 @@ def pull_directory(remote, remotedir, localdir):
         elif ti.isfile():
             sub = safepath.munge(ti.name)
             safepath.makedirs(root=localdir, path=os.path.dirname(sub))
-            tar.makefile(ti, targetpath=os.path.join(localdir, sub))
+            src = tar.extractfile(ti)
+            with open(os.path.join(localdir, sub), 'wb',
+                      PULL_BUFSIZE) as dst:
+                shutil.copyfileobj(src, dst, PULL_BUFSIZE)
         else:
             if ti.isdev():
                 type_ = 'device'
@@ -963,7 +1051,7 @@ def reboot(node, timeout=300, interval=30):
             host=node.hostname, time=timeout))
 
 
-def reconnect(ctx, timeout, remotes=None):
+def reconnect(ctx, timeout, remotes=None, max_parallel=32):
     """
     Connect to all the machines in ctx.cluster.
 
@@ -976,29 +1064,52 @@ def reconnect(ctx, timeout, remotes=None):
     holding the ssh keys for each of them. As long as it
     contains this data, you can construct a context
     that is a subset of your full cluster.
+
+    Up to max_parallel machines are waited for concurrently, so this returns
+    as soon as the slowest one is back.
     """
     log.info('Re-opening connections...')
     starttime = time.time()
+    deadline = starttime + timeout
 
     if remotes:
-        need_reconnect = remotes
+        need_reconnect = list(remotes)
     else:
         need_reconnect = ctx.cluster.remotes.keys()
 
-    while need_reconnect:
-        for remote in need_reconnect:
-            log.info('trying to connect to %s', remote.name)
-            success = remote.reconnect()
-            if not success:
-                if time.time() - starttime > timeout:
-                    raise RuntimeError("Could not reconnect to %s" %
-                                       remote.name)
-            else:
-                need_reconnect.remove(remote)
+    pool = gevent.pool.Pool(max_parallel)
+    results = pool.map(
+        lambda remote: _reconnect_one(remote, deadline),
+        need_reconnect,
+    )
+    log.debug('waited {elapsed}'.format(
+        elapsed=str(time.time() - starttime)))
+    failed = [remote.name for (remote, success)
+              in zip(need_reconnect, results) if not success]
+    if failed:
+        raise RuntimeError("Could not reconnect to %s" % ', '.join(failed))
 
-        log.debug('waited {elapsed}'.format(
-            elapsed=str(time.time() - starttime)))
-        time.sleep(1)
+
+def _reconnect_one(remote, deadline, max_sleep=30):
+    """
+    Try to reconnect to a remote until deadline, backing off exponentially
+    between attempts. An attempt is only made once its SSH port accepts
+    connections.
+
+    :returns: True for success; False for failure
+    """
+    host = remote.name.split('@')[-1]
+    sleep = 1
+    while True:
+        if connection.is_port_open(host):
+            log.info('trying to connect to %s', remote.name)
+            if remote.reconnect():
+                return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(sleep, remaining))
+        sleep = min(sleep * 2, max_sleep)
 
 
 def get_clients(ctx, roles):
@@ -1195,17 +1306,23 @@ def get_system_type(remote, distro=False, version=False):
     If neither, return 'deb' or 'rpm' if distro is known to be one of those
     Finally, if unknown, return the unfiltered distro (from lsb_release -is)
     """
-    r = remote.run(
-        args=[
-            'sudo', 'lsb_release', '-is',
-        ],
-        stdout=StringIO(),
-    )
-    system_value = r.stdout.getvalue().strip()
+    remote_facts = facts.get(remote)
+    system_value = remote_facts['lsb_id']
+    if not system_value:
+        r = remote.run(
+            args=[
+                'sudo', 'lsb_release', '-is',
+            ],
+            stdout=StringIO(),
+        )
+        system_value = r.stdout.getvalue().strip()
     log.debug("System to be installed: %s" % system_value)
     if version:
-        v = remote.run(args=['sudo', 'lsb_release', '-rs'], stdout=StringIO())
-        version = v.stdout.getvalue().strip()
+        version = remote_facts['lsb_version']
+        if not version:
+            v = remote.run(args=['sudo', 'lsb_release', '-rs'],
+                           stdout=StringIO())
+            version = v.stdout.getvalue().strip()
     if distro and version:
         return system_value.lower(), version
     if distro:
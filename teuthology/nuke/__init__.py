@@ -1,5 +1,6 @@
 import argparse
 import datetime
+import functools
 import json
 import logging
 import os
@@ -12,23 +13,23 @@ from ..config import config, FakeNamespace
 from ..lock import (
     list_locks, locked_since_seconds, unlock_one, find_stale_locks
 )
-from ..lockstatus import get_status
+from ..lockstatus import get_statuses
 from ..misc import (
     canonicalize_hostname, config_file, decanonicalize_hostname, merge_configs,
     get_user, sh
 )
 from ..openstack import OpenStack, OpenStackInstance, enforce_json_dictionary
+from ..orchestra import facts
 from ..orchestra.remote import Remote
 from ..parallel import parallel
 from ..task.internal import check_lock, add_remotes, connect
 
 from .actions import (
     check_console, clear_firewall, shutdown_daemons, remove_installed_packages,
-    reboot, remove_osd_mounts, remove_osd_tmpfs, kill_hadoop,
-    remove_ceph_packages, synch_clocks,
-    unlock_firmware_repo, remove_configuration_files, undo_multipath,
-    reset_syslog_dir, remove_ceph_data, remove_testing_tree,
-    remove_yum_timedhosts, kill_valgrind,
+    reboot, remove_osd_mounts, remove_osd_tmpfs,
+    remove_ceph_packages, synch_clocks, remove_leftovers,
+    reset_syslog_dir, remove_ceph_data, kill_valgrind, run_cleanup_script,
+    is_clean,
 )
 
 log = logging.getLogger(__name__)
@@ -183,6 +184,8 @@ def main(args):
             ctx.owner = info.get('owner')
             if not ctx.owner:
                 ctx.owner = open(ctx.archive + '/owner').read().rstrip('\n')
+        # Reuse what the job learned about its targets' OS and arch
+        facts.load(ctx.archive, hostnames=ctx.config.get('targets', {}).keys())
 
     if ctx.targets:
         ctx.config = merge_configs(ctx.targets)
@@ -221,41 +224,40 @@ def main(args):
         else:
             subprocess.check_call(["kill", "-9", str(ctx.pid)])
 
-    nuke(ctx, ctx.unlock, ctx.synch_clocks, ctx.reboot_all, ctx.noipmi)
+    nuke(ctx, ctx.unlock, ctx.synch_clocks, ctx.reboot_all, ctx.noipmi,
+         ctx.script, ctx.full)
 
 
-def nuke(ctx, should_unlock, sync_clocks=True, reboot_all=True, noipmi=False):
+def nuke(ctx, should_unlock, sync_clocks=True, reboot_all=True, noipmi=False,
+         script=False, full=False):
     if 'targets' not in ctx.config:
         return
-    total_unnuked = {}
-    targets = dict(ctx.config['targets'])
+    # The lock status of every target is fetched just once
+    statuses = get_statuses(ctx.config['targets'].keys())
     if ctx.name:
         log.info('Checking targets against current locks')
-        locks = list_locks()
         # Remove targets who's description doesn't match archive name.
-        for lock in locks:
-            for target in targets:
-                if target == lock['name']:
-                    if ctx.name not in lock['description']:
-                        del ctx.config['targets'][lock['name']]
-                        log.info(
-                            "Not nuking %s because description doesn't match",
-                            lock['name'])
-    with parallel() as p:
-        for target, hostkey in ctx.config['targets'].iteritems():
-            p.spawn(
-                nuke_one,
-                ctx,
-                {target: hostkey},
-                should_unlock,
-                sync_clocks,
-                reboot_all,
-                ctx.config.get('check-locks', True),
-                noipmi,
-            )
-        for unnuked in p:
-            if unnuked:
-                total_unnuked.update(unnuked)
+        for target, status in statuses.iteritems():
+            if status and ctx.name not in (status['description'] or ''):
+                del ctx.config['targets'][target]
+                log.info(
+                    "Not nuking %s because description doesn't match",
+                    target)
+    nuke_ctx = argparse.Namespace(
+        config=dict(targets=dict(ctx.config['targets'])),
+        owner=ctx.owner,
+        check_locks=ctx.config.get('check-locks', True),
+        synch_clocks=sync_clocks,
+        reboot_all=reboot_all,
+        teuthology_config=config.to_dict(),
+        name=ctx.name,
+        noipmi=noipmi,
+        script=script,
+        # Rebooting all machines means not skipping the reboot of those that
+        # look clean
+        full=full or reboot_all,
+    )
+    total_unnuked = nuke_targets(nuke_ctx, should_unlock, statuses)
     if total_unnuked:
         log.error('Could not nuke the following targets:\n' +
                   '\n  '.join(['targets:', ] +
@@ -264,48 +266,171 @@ def nuke(ctx, should_unlock, sync_clocks=True, reboot_all=True, noipmi=False):
                                   default_flow_style=False).splitlines()))
 
 
-def nuke_one(ctx, target, should_unlock, synch_clocks, reboot_all,
-             check_locks, noipmi):
-    ret = None
-    ctx = argparse.Namespace(
-        config=dict(targets=target),
-        owner=ctx.owner,
-        check_locks=check_locks,
-        synch_clocks=synch_clocks,
-        reboot_all=reboot_all,
-        teuthology_config=config.to_dict(),
-        name=ctx.name,
-        noipmi=noipmi,
-    )
+def _unless_clean(func):
+    """
+    Skip a nuke step on targets that _inspect_target() found clean
+    """
+    @functools.wraps(func)
+    def step(ctx):
+        if getattr(ctx, 'clean', False):
+            log.debug('Skipping %s on clean target', func.__name__)
+            return
+        return func(ctx)
+    return step
+
+
+@_unless_clean
+def _reboot(ctx):
+    reboot(ctx, ctx.cluster.remotes.keys())
+
+
+def _synch_clocks(ctx):
+    synch_clocks(ctx.cluster.remotes.keys())
+
+
+# What nuke_targets() does once it is connected to the targets, in order
+NUKE_STEPS = [
+    clear_firewall,
+    shutdown_daemons,
+    kill_valgrind,
+    # Try to remove packages before reboot
+    remove_installed_packages,
+    _reboot,
+    # shutdown daemons again incase of startup
+    _unless_clean(shutdown_daemons),
+    remove_osd_mounts,
+    remove_osd_tmpfs,
+    remove_ceph_packages,
+    _synch_clocks,
+    reset_syslog_dir,
+    remove_ceph_data,
+    remove_leftovers,
+    # Once again remove packages after reboot
+    _unless_clean(remove_installed_packages),
+]
+
+# The same, with most of the work done by one script per node and step; see
+# actions.run_cleanup_script()
+NUKE_SCRIPT_STEPS = [
+    functools.partial(
+        run_cleanup_script,
+        steps=['clear_firewall', 'shutdown_daemons', 'kill_valgrind'],
+    ),
+    remove_installed_packages,
+    _reboot,
+    functools.partial(
+        run_cleanup_script,
+        steps=['shutdown_daemons', 'remove_osd_mounts', 'remove_osd_tmpfs',
+               'kill_hadoop', 'synch_clocks', 'unlock_firmware_repo',
+               'remove_configuration_files', 'undo_multipath',
+               'reset_syslog_dir', 'remove_ceph_data', 'remove_testing_tree',
+               'remove_yum_timedhosts'],
+    ),
+    remove_ceph_packages,
+    _unless_clean(remove_installed_packages),
+]
+
+
+def nuke_targets(ctx, should_unlock, statuses):
+    """
+    Nuke ctx.config['targets']. Every step is run on all of the targets at
+    the same time; a target that fails a step is left out of the following
+    ones, without affecting the others. If ctx.script is set,
+    NUKE_SCRIPT_STEPS are taken instead of NUKE_STEPS. Unless ctx.full is
+    set, targets on which nothing that needs a reboot to get rid of is found
+    are neither rebooted nor cleaned up a second time.
+
+    :param statuses: The lock status of each target, as returned by
+                     get_statuses()
+    :returns:        The targets that could not be nuked, mapped to their
+                     host keys
+    """
+    targets = ctx.config['targets']
+    unnuked = dict()
+    target_ctxs = dict()
+    for target, hostkey in targets.iteritems():
+        if should_unlock and not _needs_nuke(target, statuses.get(target)):
+            continue
+        target_ctx = argparse.Namespace(**vars(ctx))
+        target_ctx.config = dict(targets={target: hostkey})
+        target_ctxs[target] = target_ctx
+
+    def run_step(func, *args):
+        for target in _on_each_target(target_ctxs, func, *args):
+            unnuked[target] = targets[target]
+            del target_ctxs[target]
+
+    run_step(_connect_target, statuses)
+    if not getattr(ctx, 'full', False):
+        run_step(_inspect_target)
+    steps = NUKE_SCRIPT_STEPS if getattr(ctx, 'script', False) else NUKE_STEPS
+    for step in steps:
+        if not target_ctxs:
+            break
+        run_step(step)
+    if target_ctxs:
+        log.info('Installed packages removed.')
+    if should_unlock:
+        with parallel() as p:
+            for target in targets:
+                if target not in unnuked:
+                    p.spawn(unlock_one, ctx, target, ctx.owner)
+    return unnuked
+
+
+def _needs_nuke(target, status):
+    """
+    Nodes that are destroyed when they are unlocked need not be nuked
+    """
+    shortname = target.split('@')[-1].split('.')[0]
+    if 'vpm' in shortname:
+        return False
+    return not (status and status['is_vm'] and
+                status['machine_type'] == 'openstack')
+
+
+def _on_each_target(target_ctxs, func, *args):
+    """
+    Call func(target_ctx, *args) for each of target_ctxs concurrently
+
+    :returns: The targets for which func raised an exception
+    """
+    with parallel() as p:
+        for target, target_ctx in target_ctxs.iteritems():
+            p.spawn(_try_on_target, target, func, target_ctx, *args)
+        return [target for target in p if target is not None]
+
+
+def _try_on_target(target, func, ctx, *args):
     try:
-        nuke_helper(ctx, should_unlock)
+        func(ctx, *args)
     except Exception:
         log.exception('Could not nuke %s' % target)
         # not re-raising the so that parallel calls aren't killed
-        ret = target
-    else:
-        if should_unlock:
-            unlock_one(ctx, target.keys()[0], ctx.owner)
-    return ret
+        return target
+
+
+def _inspect_target(ctx):
+    try:
+        ctx.clean = all(is_clean(remote) for remote in ctx.cluster.remotes)
+    except Exception:
+        log.exception('Could not inspect %s; nuking it fully',
+                      ctx.config['targets'].keys()[0])
+        ctx.clean = False
 
 
-def nuke_helper(ctx, should_unlock):
+def _connect_target(ctx, statuses):
     # ensure node is up with ipmi
     (target,) = ctx.config['targets'].keys()
     host = target.split('@')[-1]
     shortname = host.split('.')[0]
-    if should_unlock:
-        if 'vpm' in shortname:
-            return
-        status_info = get_status(host)
-        if status_info['is_vm'] and status_info['machine_type'] == 'openstack':
-            return
     log.debug('shortname: %s' % shortname)
     log.debug('{ctx}'.format(ctx=ctx))
     if ctx.check_locks:
         # does not check to ensure if the node is 'up'
         # we want to be able to nuke a downed node
-        check_lock.check_lock(ctx, None, check_up=False)
+        check_lock.check_lock(ctx, None, check_up=False,
+                              statuses={target: statuses.get(target)})
     if (not ctx.noipmi and 'ipmi_user' in config and
             'vpm' not in shortname):
         try:
@@ -317,27 +442,3 @@ def nuke_helper(ctx, should_unlock):
             remote.connect()
     add_remotes(ctx, None)
     connect(ctx, None)
-    clear_firewall(ctx)
-    shutdown_daemons(ctx)
-    kill_valgrind(ctx)
-    # Try to remove packages before reboot
-    remove_installed_packages(ctx)
-    remotes = ctx.cluster.remotes.keys()
-    reboot(ctx, remotes)
-    # shutdown daemons again incase of startup
-    shutdown_daemons(ctx)
-    remove_osd_mounts(ctx)
-    remove_osd_tmpfs(ctx)
-    kill_hadoop(ctx)
-    remove_ceph_packages(ctx)
-    synch_clocks(remotes)
-    unlock_firmware_repo(ctx)
-    remove_configuration_files(ctx)
-    undo_multipath(ctx)
-    reset_syslog_dir(ctx)
-    remove_ceph_data(ctx)
-    remove_testing_tree(ctx)
-    remove_yum_timedhosts(ctx)
-    # Once again remove packages after reboot
-    remove_installed_packages(ctx)
-    log.info('Installed packages removed.')
@@ -1,6 +1,8 @@
 import logging
 import time
 
+from cStringIO import StringIO
+
 from ..misc import get_testdir, reconnect
 from ..orchestra import run
 from ..orchestra.remote import Remote
@@ -9,6 +11,83 @@ from ..task import install as install_task
 
 log = logging.getLogger(__name__)
 
+# Shell snippets doing what the actions of the same names do, for
+# get_cleanup_script(). They run as root and may be run any number of times;
+# those that are allowed to fail end with '|| true'.
+CLEANUP_SNIPPETS = dict(
+    clear_firewall='iptables-save | grep -v teuthology | iptables-restore',
+    shutdown_daemons="""\
+timeout 180 sh -c 'stop ceph-all || service ceph stop || systemctl stop ceph.target'
+for fs in ceph-fuse rbd-fuse; do
+    grep "$fs" /etc/mtab | grep -o ' /.* fuse' | grep -o '/.* ' |
+        xargs -r -n 1 fusermount -u
+done
+killall --quiet ceph-mon ceph-osd ceph-mds ceph-mgr ceph-fuse ceph-disk \\
+    radosgw ceph_test_rados rados rbd-fuse apache2 || true""",
+    kill_valgrind='pkill -f -9 valgrind.bin || true',
+    kill_hadoop="pkill -f -KILL 'java.*hadoop' || true",
+    remove_osd_mounts="""\
+grep /var/lib/ceph/osd/ /etc/mtab | awk '{print $2}' | xargs -r umount -l
+true""",
+    remove_osd_tmpfs="""\
+egrep 'tmpfs\\s+/mnt' /etc/mtab | awk '{print $2}' | xargs -r umount
+true""",
+    synch_clocks="""\
+timeout 60 sh -c 'service ntp stop && ntpd -gq && hwclock --systohc --utc && \\
+    service ntp start' || true""",
+    unlock_firmware_repo='rm -f /lib/firmware/updates/.git/index.lock',
+    remove_configuration_files='rm -f /home/ubuntu/.cephdeploy.conf',
+    undo_multipath='multipath -F || true',
+    reset_syslog_dir="""\
+if test -e /etc/rsyslog.d/80-cephtest.conf; then
+    rm -f -- /etc/rsyslog.d/80-cephtest.conf && service rsyslog restart
+fi""",
+    remove_ceph_data="""\
+rm -rf /etc/ceph &&
+{
+    rm -rf --one-file-system -- /var/lib/ceph || true
+    test -d /var/lib/ceph &&
+        find /var/lib/ceph -mindepth 1 -maxdepth 2 -type d -exec umount {} ';'
+    rm -rf --one-file-system -- /var/lib/ceph
+}""",
+    remove_testing_tree='rm -rf "$testdir" /tmp/cephtest /home/ubuntu/cephtest',
+    remove_yum_timedhosts="""\
+if test -d /var/cache/yum; then
+    find /var/cache/yum -name timedhosts -exec rm {} ';'
+fi
+true""",
+)
+
+# Reports, one "<what> <count>" line each, what inspect_node() looks for
+INSPECT_SCRIPT = """\
+echo "daemons $(ps -e -o comm= | grep -c -x -E \\
+    'ceph-(mon|osd|mds|mgr|fuse)|radosgw|rbd-fuse|ceph_test_rados|memcheck-.*')"
+echo "mounts $(grep -c -E \\
+    '^tmpfs /mnt|/var/lib/ceph/| ceph |ceph-fuse|rbd-fuse' /proc/mounts)"
+echo "kernel_clients $( {
+    find /sys/kernel/debug/ceph -mindepth 1 -maxdepth 1 -type d
+    find /sys/bus/rbd/devices -mindepth 1 -maxdepth 1
+} 2>/dev/null | wc -l)"
+if command -v dpkg-query > /dev/null; then
+    echo "packages $(dpkg-query -W -f '${Status}\\n' %(packages)s 2>/dev/null |
+        grep -c 'ok installed')"
+else
+    echo "packages $(rpm -q %(packages)s | grep -v -c 'not installed')"
+fi
+"""
+
+# Packages whose presence means a node was used for testing
+INSPECT_PACKAGES = [
+    'ceph', 'ceph-base', 'ceph-common', 'ceph-fuse', 'ceph-mds', 'ceph-mgr',
+    'ceph-mon', 'ceph-osd', 'ceph-radosgw', 'radosgw', 'rbd-fuse',
+    'ceph-test', 'libcephfs1', 'libcephfs2', 'librados2', 'librbd1',
+    'librgw2', 'python-rados', 'python-rbd', 'python-cephfs',
+]
+
+# Marks the lines of the output of a cleanup script that report the exit
+# status of a step
+CLEANUP_STATUS_PREFIX = 'teuthology-cleanup-step:'
+
 
 def clear_firewall(ctx):
     """
@@ -399,6 +478,142 @@ def unlock_firmware_repo(ctx):
                           '/lib/firmware/updates/.git/index.lock', ])
 
 
+def remove_leftovers(ctx):
+    """
+    Do what kill_hadoop(), undo_multipath(), remove_yum_timedhosts(),
+    unlock_firmware_repo(), remove_configuration_files() and
+    remove_testing_tree() do, with a single command per node
+    """
+    log.info('Removing leftovers of earlier tests...')
+    procs = list()
+    for remote in ctx.cluster.remotes.iterkeys():
+        args = [
+            'pkill', '-f', '-KILL', 'java.*hadoop', run.Raw(';'),
+            'sudo', 'multipath', '-F', run.Raw(';'),
+        ]
+        if remote.os.package_type == 'rpm':
+            args += [
+                'sudo', 'find', '/var/cache/yum', '-name', 'timedhosts',
+                '-exec', 'rm', '{}', run.Raw('\\;'), run.Raw(';'),
+            ]
+        # Only the status of the last command of the list matters
+        args += [
+            'sudo', 'rm', '-f', '/lib/firmware/updates/.git/index.lock',
+            run.Raw('&&'),
+            'rm', '-f', '/home/ubuntu/.cephdeploy.conf',
+            run.Raw('&&'),
+            'sudo', 'rm', '-rf', get_testdir(ctx), '/tmp/cephtest',
+            '/home/ubuntu/cephtest',
+        ]
+        procs.append(remote.run(args=args, wait=False, timeout=180))
+    run.wait(procs)
+
+
+def inspect_node(remote):
+    """
+    Find what an earlier test left behind on a node, using a single command
+
+    :returns: A dict mapping 'daemons', 'mounts', 'kernel_clients' and
+              'packages' to how many of each were found
+    """
+    script = INSPECT_SCRIPT % dict(packages=' '.join(INSPECT_PACKAGES))
+    proc = remote.run(
+        args=['sudo', 'sh', '-c', script],
+        stdout=StringIO(),
+        timeout=60,
+    )
+    state = dict()
+    for line in proc.stdout.getvalue().splitlines():
+        (what, count) = line.split()
+        state[what] = int(count)
+    return state
+
+
+def is_clean(remote):
+    """
+    :returns: True if nothing that would need a reboot or a second cleanup
+              pass to get rid of was found on the node
+    """
+    state = inspect_node(remote)
+    leftovers = ['{count} {what}'.format(what=what, count=count)
+                 for (what, count) in sorted(state.items()) if count]
+    if leftovers:
+        log.info('%s is not clean: %s', remote.shortname, ', '.join(leftovers))
+        return False
+    log.info('%s is clean', remote.shortname)
+    return True
+
+
+def get_cleanup_script(steps, testdir):
+    """
+    Build a shell script doing the work of several actions
+
+    :param steps:   Names of CLEANUP_SNIPPETS, in the order to run them in
+    :param testdir: The test directory to remove
+    :returns:       The script. Every step is run even if earlier ones
+                    failed; after each one, a line made of
+                    CLEANUP_STATUS_PREFIX, the step's name and its exit
+                    status is written to stdout.
+    """
+    lines = ['testdir=' + run.quote([testdir])]
+    for step in steps:
+        lines.extend([
+            '{', CLEANUP_SNIPPETS[step], '}',
+            'echo "{prefix} {step} $?"'.format(
+                prefix=CLEANUP_STATUS_PREFIX, step=step),
+        ])
+    return '\n'.join(lines) + '\n'
+
+
+def parse_cleanup_output(output):
+    """
+    :param output: The output of a script built by get_cleanup_script()
+    :returns:      A dict mapping the names of the steps that were run to
+                   their exit statuses
+    """
+    statuses = dict()
+    for line in output.splitlines():
+        if not line.startswith(CLEANUP_STATUS_PREFIX + ' '):
+            continue
+        (step, status) = line.split()[1:3]
+        statuses[step] = int(status)
+    return statuses
+
+
+def run_cleanup_script(ctx, steps, timeout=900):
+    """
+    Do the work of the actions named in steps with a single command per node,
+    running the script built by get_cleanup_script()
+
+    :raises: RuntimeError if any step failed or did not run
+    """
+    log.info('Running cleanup script: %s', ', '.join(steps))
+    script = get_cleanup_script(steps, get_testdir(ctx))
+    procs = dict()
+    for remote in ctx.cluster.remotes.iterkeys():
+        procs[remote] = remote.run(
+            args=['sudo', 'sh', '-c', script],
+            stdout=StringIO(),
+            check_status=False,
+            wait=False,
+            timeout=timeout,
+        )
+    failed = []
+    for remote, proc in procs.iteritems():
+        proc.wait()
+        statuses = parse_cleanup_output(proc.stdout.getvalue())
+        for step in steps:
+            status = statuses.get(step)
+            log.debug('%s: %s exited with status %s', remote.shortname, step,
+                      status)
+            if status != 0:
+                failed.append('{step} on {host} ({status})'.format(
+                    step=step, host=remote.shortname,
+                    status='not run' if status is None else status))
+    if failed:
+        raise RuntimeError('Cleanup failed: ' + ', '.join(failed))
+
+
 def check_console(hostname):
     remote = Remote(hostname)
     shortname = remote.shortname
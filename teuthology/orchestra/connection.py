@@ -5,6 +5,7 @@ import base64
 import paramiko
 import os
 import logging
+import socket
 
 from ..config import config
 from ..contextutil import safe_while
@@ -25,6 +26,20 @@ def split_user(user_at_host):
     return user, host
 
 
+def is_port_open(host, port=22, timeout=5):
+    """
+    Check whether something accepts connections on host:port. This is much
+    cheaper than a failed SSH connection attempt, so it is used to find out
+    whether a rebooting host's sshd is up yet.
+    """
+    try:
+        sock = socket.create_connection((host, port), timeout=timeout)
+    except (socket.error, socket.timeout):
+        return False
+    sock.close()
+    return True
+
+
 def create_key(keytype, key):
     """
     Create an ssh-rsa or ssh-dss key.
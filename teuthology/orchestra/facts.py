@@ -0,0 +1,150 @@
+"""
+A per-hostname cache of static facts about remote hosts
+
+Facts (architecture, /etc/os-release and lsb_release output) are gathered
+with a single remote command the first time any of them is needed, then
+shared by every Remote object for the same host within this process. They
+may also be saved to, and loaded from, a job's archive directory so that
+e.g. teuthology-nuke does not need to gather them again.
+"""
+import logging
+import os
+import re
+import yaml
+
+from cStringIO import StringIO
+
+log = logging.getLogger(__name__)
+
+# The name of the file in a job's archive directory that facts are saved to
+FACTS_FILE = 'facts.yaml'
+
+# Each section's output is preceded by a '### <name>' line
+_sections = (
+    ('arch', 'uname -m'),
+    ('os_release', 'cat /etc/os-release'),
+    ('lsb_release', 'lsb_release -a'),
+    ('compressors', 'command -v zstd lz4'),
+)
+GATHER_COMMAND = '; '.join(
+    "echo '### {name}'; {cmd} 2>/dev/null".format(name=name, cmd=cmd)
+    for (name, cmd) in _sections
+) + '; true'
+
+_cache = dict()
+
+
+def _key(remote):
+    return remote.name.split('@')[-1]
+
+
+def get(remote):
+    """
+    Return the facts about a remote host, gathering them if necessary
+
+    :param remote: A teuthology.orchestra.remote.Remote object
+    :returns:      A dict; see parse()
+    """
+    key = _key(remote)
+    if key not in _cache:
+        _cache[key] = gather(remote)
+    return _cache[key]
+
+
+def gather(remote):
+    """
+    Gather facts about a remote host in one remote command
+
+    :param remote: A teuthology.orchestra.remote.Remote object
+    :returns:      A dict; see parse()
+    """
+    proc = remote.run(
+        args=GATHER_COMMAND,
+        stdout=StringIO(),
+        stderr=StringIO(),
+    )
+    return parse(proc.stdout.getvalue())
+
+
+def parse(output):
+    """
+    Parse the output of GATHER_COMMAND
+
+    :returns: A dict like::
+
+                {'arch': 'x86_64',
+                 'os_release': '<contents of /etc/os-release>',
+                 'lsb_release': '<output of lsb_release -a>',
+                 'lsb_id': 'Ubuntu',
+                 'lsb_version': '14.04',
+                 'compressors': ['zstd']}
+
+              Values are None where the corresponding command had no output.
+              'compressors' lists the optional compression tools that are
+              installed.
+    """
+    result = dict((name, None) for (name, _) in _sections)
+    for chunk in re.split('^### ', output, flags=re.M):
+        name, _, value = chunk.partition('\n')
+        name = name.strip()
+        value = value.strip()
+        if name in result and value:
+            result[name] = value
+    result['lsb_id'] = _get_value(result['lsb_release'], 'Distributor ID')
+    result['lsb_version'] = _get_value(result['lsb_release'], 'Release')
+    compressors = result['compressors'] or ''
+    result['compressors'] = [
+        os.path.basename(path) for path in compressors.split()
+    ]
+    return result
+
+
+def _get_value(str_, name):
+    if not str_:
+        return None
+    match = re.search('^%s:(.+)' % name, str_, flags=re.M)
+    if match:
+        return match.groups()[0].strip()
+    return None
+
+
+def clear(hostname=None):
+    """
+    Forget facts about one host, e.g. after it has been reimaged, or about
+    all hosts
+    """
+    if hostname is None:
+        _cache.clear()
+    else:
+        _cache.pop(hostname.split('@')[-1], None)
+
+
+def save(archive_dir):
+    """
+    Write the cached facts to FACTS_FILE in archive_dir
+    """
+    if not _cache:
+        return
+    try:
+        with file(os.path.join(archive_dir, FACTS_FILE), 'w') as f:
+            yaml.safe_dump(_cache, f, default_flow_style=False)
+    except Exception:
+        log.exception("Failed to write %s !", FACTS_FILE)
+
+
+def load(archive_dir, hostnames=None):
+    """
+    Populate the cache from FACTS_FILE in archive_dir, if it exists
+
+    :param hostnames: If given, only load facts about these hosts
+    """
+    path = os.path.join(archive_dir, FACTS_FILE)
+    if not os.path.isfile(path):
+        return
+    with file(path) as f:
+        facts = yaml.safe_load(f) or dict()
+    if hostnames is not None:
+        keys = set(name.split('@')[-1] for name in hostnames)
+        facts = dict((k, v) for (k, v) in facts.items() if k in keys)
+    for key, value in facts.items():
+        _cache.setdefault(key, value)
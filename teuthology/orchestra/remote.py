@@ -1,6 +1,7 @@
 """
 Support for paramiko remote objects.
 """
+from . import facts
 from . import run
 from .opsys import OS
 import connection
@@ -20,6 +21,13 @@ import console
 
 log = logging.getLogger(__name__)
 
+# Commands get_tar_stream() can pipe tar's output through, by codec name. Fast
+# levels are used since the goal is to spend less time on the network.
+TAR_COMPRESSORS = dict(
+    zstd=['zstd', '-1', '-q', '-c'],
+    lz4=['lz4', '-1', '-q', '-c'],
+)
+
 
 class Remote(object):
 
@@ -373,33 +381,42 @@ class Remote(object):
         self._sftp_get_file(remote_temp_path, to_path)
         self.remove(remote_temp_path)
 
-    def get_tar_stream(self, path, sudo=False):
+    def get_tar_stream(self, path, sudo=False, compress='gz'):
         """
         Tar-compress a remote directory and return the RemoteProcess
         for streaming
+
+        :param compress: 'gz', 'none', or one of the codecs in
+                         TAR_COMPRESSORS
         """
         args = []
         if sudo:
             args.append('sudo')
         args.extend([
             'tar',
-            'cz',
+            'cz' if compress == 'gz' else 'c',
             '-f', '-',
             '-C', path,
             '--',
             '.',
             ])
+        if compress in TAR_COMPRESSORS:
+            args.append(run.Raw('|'))
+            args.extend(TAR_COMPRESSORS[compress])
         return self.run(args=args, wait=False, stdout=run.PIPE)
 
     @property
     def os(self):
         if not hasattr(self, '_os'):
-            proc = self.run(args=['cat', '/etc/os-release'], stdout=StringIO(),
-                            stderr=StringIO(), check_status=False)
-            if proc.exitstatus == 0:
-                self._os = OS.from_os_release(proc.stdout.getvalue().strip())
+            remote_facts = facts.get(self)
+            if remote_facts['os_release']:
+                self._os = OS.from_os_release(remote_facts['os_release'])
+                return self._os
+            if remote_facts['lsb_release']:
+                self._os = OS.from_lsb_release(remote_facts['lsb_release'])
                 return self._os
 
+            # Neither is available; this will raise a useful exception
             proc = self.run(args=['lsb_release', '-a'], stdout=StringIO(),
                             stderr=StringIO())
             self._os = OS.from_lsb_release(proc.stdout.getvalue().strip())
@@ -408,6 +425,8 @@ class Remote(object):
     @property
     def arch(self):
         if not hasattr(self, '_arch'):
+            self._arch = facts.get(self)['arch']
+        if not self._arch:
             proc = self.run(args=['uname', '-m'], stdout=StringIO())
             proc.wait()
             self._arch = proc.stdout.getvalue().strip()
@@ -10,6 +10,7 @@ import socket
 import pipes
 import logging
 import shutil
+import time
 
 from ..contextutil import safe_while
 from ..exceptions import (CommandCrashedError, CommandFailedError,
@@ -17,6 +18,10 @@ from ..exceptions import (CommandCrashedError, CommandFailedError,
 
 log = logging.getLogger(__name__)
 
+# When set to a teuthology.timer.CommandStats object, every RemoteProcess
+# reports its timing and output volume to it once it has been waited on.
+command_stats = None
+
 
 class RemoteProcess(object):
     """
@@ -27,7 +32,8 @@ class RemoteProcess(object):
         'stdin', 'stdout', 'stderr',
         '_stdin_buf', '_stdout_buf', '_stderr_buf',
         'returncode', 'exitstatus', 'timeout',
-        'greenlets',
+        'greenlets', '_output_greenlets',
+        '_start_time', '_exec_time', '_end_time',
         '_wait', 'logger',
         # for orchestra.remote.Remote to place a backreference
         'remote',
@@ -72,8 +78,10 @@ class RemoteProcess(object):
             (self.hostname, port) = client.get_transport().getpeername()
 
         self.greenlets = []
+        self._output_greenlets = {}
         self.stdin, self.stdout, self.stderr = (None, None, None)
         self.returncode = self.exitstatus = None
+        self._start_time = self._exec_time = self._end_time = None
         self._wait = wait
         self.logger = logger or log
 
@@ -87,12 +95,14 @@ class RemoteProcess(object):
         log.getChild(self.hostname).info(u"{prefix} {cmd!r}".format(
             cmd=self.command, prefix=prefix))
 
+        self._start_time = time.time()
         if hasattr(self, 'timeout'):
             (self._stdin_buf, self._stdout_buf, self._stderr_buf) = \
                 self.client.exec_command(self.command, timeout=self.timeout)
         else:
             (self._stdin_buf, self._stdout_buf, self._stderr_buf) = \
                 self.client.exec_command(self.command)
+        self._exec_time = time.time()
         (self.stdin, self.stdout, self.stderr) = \
             (self._stdin_buf, self._stdout_buf, self._stderr_buf)
 
@@ -114,14 +124,15 @@ class RemoteProcess(object):
             # Log the stream
             host_log = self.logger.getChild(self.hostname)
             stream_log = host_log.getChild(stream_name)
-            self.add_greenlet(
-                gevent.spawn(
-                    copy_file_to,
-                    getattr(self, stream_name),
-                    stream_log,
-                    stream_obj,
-                )
+            greenlet = gevent.spawn(
+                copy_file_to,
+                getattr(self, stream_name),
+                stream_log,
+                stream_obj,
             )
+            self.add_greenlet(greenlet)
+            # copy_file_to() returns the byte count; see _record_stats()
+            self._output_greenlets[stream_name] = greenlet
             setattr(self, stream_name, stream_obj)
         elif self._wait:
             # FIXME: Is this actually true?
@@ -138,6 +149,9 @@ class RemoteProcess(object):
 
         status = self._get_exitstatus()
         self.exitstatus = self.returncode = status
+        if self._end_time is None:
+            self._end_time = time.time()
+            self._record_stats()
         for stream in ('stdout', 'stderr'):
             if hasattr(self, stream):
                 stream_obj = getattr(self, stream)
@@ -166,6 +180,33 @@ class RemoteProcess(object):
                                          label=self.label)
         return status
 
+    def _record_stats(self):
+        """
+        Feed this process' timing and output volume to command_stats, if set
+        """
+        if command_stats is None or self._start_time is None:
+            return
+        byte_counts = dict()
+        for stream_name in ('stdout', 'stderr'):
+            greenlet = self._output_greenlets.get(stream_name)
+            # Output sent to PIPE is consumed by the caller; we can't count it
+            byte_counts[stream_name] = (
+                greenlet.value if greenlet is not None else None)
+        try:
+            command_stats.record(
+                hostname=self.hostname,
+                label=self.label,
+                command=self.command,
+                start=self._start_time,
+                exec_time=self._exec_time,
+                end=self._end_time,
+                exitstatus=self.exitstatus,
+                stdout_bytes=byte_counts['stdout'],
+                stderr_bytes=byte_counts['stderr'],
+            )
+        except Exception:
+            log.exception("Failed to record command stats")
+
     def _get_exitstatus(self):
         """
         :returns: the remote command's exit status (return code). Note that
@@ -237,11 +278,18 @@ def quote(args):
 
 
 def copy_to_log(f, logger, loglevel=logging.INFO):
+    """
+    Log each line read from f
+
+    :returns: the number of bytes read
+    """
+    nbytes = 0
     # Work-around for http://tracker.ceph.com/issues/8313
     if isinstance(f, ChannelFile):
         f._flags += ChannelFile.FLAG_BINARY
 
     for line in f:
+        nbytes += len(line)
         line = line.rstrip()
         # Second part of work-around for http://tracker.ceph.com/issues/8313
         try:
@@ -249,6 +297,7 @@ def copy_to_log(f, logger, loglevel=logging.INFO):
             logger.log(loglevel, line.decode('utf-8'))
         except (UnicodeDecodeError, UnicodeEncodeError):
             logger.exception("Encountered unprintable line in command output")
+    return nbytes
 
 
 def copy_and_close(src, fdst):
@@ -269,12 +318,13 @@ def copy_file_to(src, logger, stream=None):
     :param logger: the logger object
     :param stream: an optional file-like object which will receive a copy of
                    src.
+    :returns: the number of bytes copied
     """
     if stream is not None:
         shutil.copyfileobj(src, stream)
         stream.seek(0)
         src = stream
-    copy_to_log(src, logger)
+    return copy_to_log(src, logger)
 
 
 def spawn_asyncresult(fn, *args, **kwargs):
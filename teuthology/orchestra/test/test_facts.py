@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+
+from mock import MagicMock
+
+from .. import facts
+
+
+UBUNTU_OUTPUT = """### arch
+x86_64
+### os_release
+NAME="Ubuntu"
+ID=ubuntu
+VERSION_ID="14.04"
+### lsb_release
+Distributor ID:\tUbuntu
+Description:\tUbuntu 14.04.4 LTS
+Release:\t14.04
+Codename:\ttrusty
+"""
+
+
+class TestFacts(object):
+    def setup(self):
+        facts.clear()
+
+    def teardown(self):
+        facts.clear()
+
+    def make_remote(self, name, output):
+        remote = MagicMock()
+        remote.name = name
+        remote.run.return_value.stdout.getvalue.return_value = output
+        return remote
+
+    def test_parse(self):
+        result = facts.parse(UBUNTU_OUTPUT)
+        assert result['arch'] == 'x86_64'
+        assert result['os_release'].startswith('NAME="Ubuntu"')
+        assert result['lsb_id'] == 'Ubuntu'
+        assert result['lsb_version'] == '14.04'
+
+    def test_parse_missing(self):
+        result = facts.parse("### arch\nx86_64\n### os_release\n"
+                             "### lsb_release\n")
+        assert result['arch'] == 'x86_64'
+        assert result['os_release'] is None
+        assert result['lsb_release'] is None
+        assert result['lsb_id'] is None
+
+    def test_get_caches_by_hostname(self):
+        remote = self.make_remote('ubuntu@host.example.com', UBUNTU_OUTPUT)
+        assert facts.get(remote)['arch'] == 'x86_64'
+        other = self.make_remote('host.example.com', '')
+        assert facts.get(other)['arch'] == 'x86_64'
+        assert remote.run.call_count == 1
+        assert other.run.call_count == 0
+
+    def test_clear_one(self):
+        remote = self.make_remote('ubuntu@host.example.com', UBUNTU_OUTPUT)
+        facts.get(remote)
+        facts.clear('host.example.com')
+        facts.get(remote)
+        assert remote.run.call_count == 2
+
+    def test_save_load(self):
+        archive_dir = tempfile.mkdtemp()
+        try:
+            remote = self.make_remote('ubuntu@host1', UBUNTU_OUTPUT)
+            facts.get(remote)
+            facts.save(archive_dir)
+            assert os.path.isfile(os.path.join(archive_dir, facts.FACTS_FILE))
+            facts.clear()
+            facts.load(archive_dir, hostnames=['ubuntu@host2'])
+            assert facts._cache == dict()
+            facts.load(archive_dir, hostnames=['ubuntu@host1'])
+            other = self.make_remote('ubuntu@host1', '')
+            assert facts.get(other)['lsb_id'] == 'Ubuntu'
+            assert other.run.call_count == 0
+        finally:
+            shutil.rmtree(archive_dir)
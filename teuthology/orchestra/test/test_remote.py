@@ -2,6 +2,7 @@ from mock import patch, Mock, MagicMock
 
 from cStringIO import StringIO
 
+from .. import facts
 from .. import remote
 from .. import opsys
 from ..run import RemoteProcess
@@ -11,9 +12,11 @@ class TestRemote(object):
 
     def setup(self):
         self.start_patchers()
+        facts.clear()
 
     def teardown(self):
         self.stop_patchers()
+        facts.clear()
 
     def start_patchers(self):
         self.m_ssh = MagicMock()
@@ -93,11 +96,7 @@ class TestRemote(object):
         m_transport.getpeername.return_value = ('name', 22)
         self.m_ssh.get_transport.return_value = m_transport
         m_run = MagicMock()
-        args = [
-            'uname',
-            '-m',
-            ]
-        stdout = StringIO('test_arch')
+        stdout = StringIO('### arch\ntest_arch\n### os_release\n')
         stdout.seek(0)
         proc = RemoteProcess(
             client=self.m_ssh,
@@ -111,15 +110,14 @@ class TestRemote(object):
         m_run.return_value = proc
         r = remote.Remote(name='jdoe@xyzzy.example.com', ssh=self.m_ssh)
         r._runner = m_run
-        assert m_transport.getpeername.called_once_with()
-        assert proc._stdout_buf.channel.recv_exit_status.called_once_with()
-        assert m_run.called_once_with(
-            client=self.m_ssh,
-            args=args,
-            stdout=StringIO(),
-            name=r.shortname,
-        )
         assert r.arch == 'test_arch'
+        assert m_run.call_count == 1
+        assert m_run.call_args[1]['args'] == facts.GATHER_COMMAND
+        # A fresh Remote for the same host uses the cached facts
+        r2 = remote.Remote(name='xyzzy.example.com', ssh=self.m_ssh)
+        r2._runner = m_run
+        assert r2.arch == 'test_arch'
+        assert m_run.call_count == 1
 
     def test_host_key(self):
         m_key = MagicMock()
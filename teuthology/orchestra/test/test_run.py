@@ -114,6 +114,28 @@ class TestRun(object):
         assert proc.stderr.read() == output
         assert proc.stderr.getvalue() == output
 
+    def test_command_stats(self):
+        output = 'foo\nbar'
+        set_buffer_contents(self.m_stdout_buf, output)
+        self.m_stdout_buf.channel.recv_exit_status.return_value = 0
+        m_stats = MagicMock()
+        with patch.object(run, 'command_stats', m_stats):
+            run.run(
+                client=self.m_ssh,
+                args=['foo', 'bar baz'],
+                stdout=StringIO(),
+                label='a label',
+            )
+        assert m_stats.record.call_count == 1
+        kwargs = m_stats.record.call_args[1]
+        assert kwargs['command'] == "foo 'bar baz'"
+        assert kwargs['label'] == 'a label'
+        assert kwargs['hostname'] == 'name'
+        assert kwargs['exitstatus'] == 0
+        assert kwargs['stdout_bytes'] == len(output)
+        assert kwargs['stderr_bytes'] == 0
+        assert kwargs['start'] <= kwargs['exec_time'] <= kwargs['end']
+
     def test_status_bad(self):
         self.m_stdout_buf.channel.recv_exit_status.return_value = 42
         with raises(CommandFailedError) as exc:
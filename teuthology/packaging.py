@@ -1,3 +1,4 @@
+import gevent.lock
 import logging
 import ast
 import re
@@ -383,6 +384,49 @@ def get_package_version(remote, package):
     return installed_ver
 
 
+def get_package_versions(remote, packages):
+    """
+    Look up the installed versions of several packages with one remote
+    command
+
+    :param remote:   A teuthology.orchestra.remote.Remote object
+    :param packages: A list of package names
+    :returns:        A dict mapping each package name to its installed
+                     version, or to None if it is not installed
+    """
+    versions = dict((package, None) for package in packages)
+    if not packages:
+        return versions
+    if remote.os.package_type == "deb":
+        args = ['dpkg-query', '-W', '-f',
+                '${Package}\\t${Version}\\t${Status}\\n']
+    else:
+        args = ['rpm', '-q', '--qf', '%{NAME}\\t%{VERSION}-%{RELEASE}\\n']
+    proc = remote.run(
+        args=args + list(packages),
+        stdout=StringIO(),
+        stderr=StringIO(),
+        check_status=False,
+    )
+    for line in proc.stdout.getvalue().splitlines():
+        fields = line.split('\t')
+        if len(fields) < 2 or fields[0] not in versions:
+            continue
+        # dpkg-query also lists packages that were removed but not purged
+        if len(fields) > 2 and not fields[2].endswith(' installed'):
+            continue
+        # this assumes a version string starts with non-alpha characters
+        if re.match('^[^a-zA-Z]', fields[1]):
+            versions[fields[0]] = fields[1]
+    log.info("Installed package versions on {host}: {versions}".format(
+        host=remote.shortname,
+        versions=', '.join(
+            '%s=%s' % (pkg, ver) for (pkg, ver) in sorted(versions.items())
+        ),
+    ))
+    return versions
+
+
 def _get_config_value_for_remote(ctx, remote, config, key):
     """
     Look through config, and attempt to determine the "best" value to use
@@ -412,6 +456,18 @@ def _get_config_value_for_remote(ctx, remote, config, key):
     return config.get(key)
 
 
+# Metadata looked up from gitbuilder or shaman, shared by all the
+# GitbuilderProject or ShamanProject objects describing the same build of a
+# project for the same platform; see GitbuilderProject._get_cached()
+_metadata_cache = dict()
+_metadata_locks = dict()
+
+
+def clear_metadata_cache():
+    _metadata_cache.clear()
+    _metadata_locks.clear()
+
+
 def _get_response(url, wait=False, sleep=15, tries=10):
     with safe_while(sleep=sleep, tries=tries, _raise=False) as proceed:
         while proceed():
@@ -523,7 +579,7 @@ class GitbuilderProject(object):
         if not hasattr(self, "_sha1"):
             self._sha1 = self.job_config.get('sha1')
             if not self._sha1:
-                self._sha1 = self._get_package_sha1()
+                self._sha1 = self._get_cached('sha1', self._get_package_sha1)
         return self._sha1
 
     @property
@@ -536,7 +592,8 @@ class GitbuilderProject(object):
         :returns: The version number of the project as a string.
         """
         if not hasattr(self, '_version'):
-            self._version = self._get_package_version()
+            self._version = self._get_cached(
+                'version', self._get_package_version)
         return self._version
 
     @property
@@ -568,6 +625,30 @@ class GitbuilderProject(object):
         """
         return self._get_uri_reference()
 
+    def _get_cached(self, name, func):
+        """
+        Return the value of a piece of metadata about this project's build,
+        calling func to look it up only if no other instance describing the
+        same build for the same platform has done so already in this process.
+        Concurrent lookups of the same value wait for the first one. None is
+        not cached, so failed lookups are retried.
+
+        :param name: The name of the piece of metadata, e.g. 'version'
+        :param func: A callable looking the value up
+        """
+        ref_name, ref_val = self._choose_reference().items()[0]
+        key = (self.__class__.__name__, self.project, self.pkg_type,
+               self.distro, self.arch, self.flavor, ref_name, ref_val, name)
+        if key in _metadata_cache:
+            return _metadata_cache[key]
+        with _metadata_locks.setdefault(key, gevent.lock.RLock()):
+            if key not in _metadata_cache:
+                value = func()
+                if value is None:
+                    return value
+                _metadata_cache[key] = value
+        return _metadata_cache[key]
+
     def _get_dist_release(self):
         version = self._parse_version(self.os_version)
         if self.os_type in ('centos', 'rhel'):
@@ -854,7 +935,7 @@ class ShamanProject(GitbuilderProject):
     @property
     def _result(self):
         if getattr(self, '_result_obj', None) is None:
-            self._result_obj = self._search()
+            self._result_obj = self._get_cached('search', self._search)
         return self._result_obj
 
     def _search(self):
@@ -965,6 +1046,9 @@ class ShamanProject(GitbuilderProject):
         )
 
     def _get_repo(self):
+        return self._get_cached('repo', self._fetch_repo)
+
+    def _fetch_repo(self):
         resp = requests.get(self.repo_url)
         resp.raise_for_status()
         return resp.text
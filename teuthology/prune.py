@@ -1,11 +1,26 @@
-import gzip
 import logging
+import multiprocessing
 import os
 import shutil
+import stat
 import time
 
+import yaml
+
 import teuthology
+from teuthology import compression
+from teuthology import manifest
 from teuthology.contextutil import safe_while
+from teuthology.job_status import get_status
+
+# Optional on python 2; saves a stat() call per directory entry
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 log = logging.getLogger(__name__)
 
@@ -13,6 +28,13 @@ log = logging.getLogger(__name__)
 # If we see this in any directory, we do not prune it
 PRESERVE_FILE = '.preserve'
 
+# Subdirectories of job directories removed by the 'remotes' pass, and what
+# they contain
+REMOTE_SUBDIRS = dict(
+    remote='remote logs',
+    data='mon data',
+)
+
 
 def main(args):
     """
@@ -26,9 +48,21 @@ def main(args):
     pass_days = int(args['--pass'])
     remotes_days = int(args['--remotes'])
     compress_days = int(args['--compress'])
+    processes = args.get('--processes')
+    if processes is not None:
+        processes = int(processes)
+    compress_options = dict(
+        codec=args.get('--codec') or 'gz',
+        threads=int(args.get('--threads') or 1),
+        seekable=bool(args.get('--seekable')),
+    )
+    if args.get('--level') is not None:
+        compress_options['level'] = int(args['--level'])
+    compression.check_codec(compress_options['codec'])
 
     prune_archive(
-        archive_dir, pass_days, remotes_days, compress_days, dry_run
+        archive_dir, pass_days, remotes_days, compress_days, dry_run,
+        processes, compress_options,
     )
 
 
@@ -38,64 +72,253 @@ def prune_archive(
         remotes_days,
         compress_days,
         dry_run=False,
+        processes=None,
+        compress_options=None,
 ):
     """
-    Walk through the archive_dir, calling the cleanup functions to process
-    directories that might be old enough
+    Walk through the archive_dir once, deciding what to do with each job
+    directory that is old enough, and remove or compress what needs it
+
+    :param processes:        How many removals and compressions to run at
+                             once, in separate processes. Defaults to the
+                             number of CPUs.
+    :param compress_options: Keyword arguments for
+                             compression.compress_file(). Logs are gzipped
+                             by default.
     """
-    max_days = min(pass_days, remotes_days)
+    enabled_days = [d for d in (pass_days, remotes_days, compress_days)
+                    if d >= 0]
+    if not enabled_days:
+        return
+    max_days = min(enabled_days)
+    entries = scan(archive_dir)
     log.debug("Archive {archive} has {count} children".format(
-        archive=archive_dir, count=len(os.listdir(archive_dir))))
-    # Use full paths
-    children = map(
-        lambda p: os.path.join(archive_dir, p),
-        listdir(archive_dir)
-    )
+        archive=archive_dir, count=len(entries)))
     run_dirs = list()
-    for child in children:
+    for entry in entries:
         # Ensure that the path is not a symlink, is a directory, and is old
         # enough to process
-        if (not os.path.islink(child) and os.path.isdir(child) and
-                is_old_enough(child, max_days)):
-            run_dirs.append(child)
-    run_dirs.sort(key=lambda p: os.path.getctime(p), reverse=True)
+        if (not entry.is_symlink() and entry.is_dir() and
+                is_old_enough(entry.stat().st_mtime, max_days)):
+            run_dirs.append(entry)
+    run_dirs.sort(key=lambda e: e.stat().st_ctime, reverse=True)
+    actions = plan_runs(
+        [e.path for e in run_dirs], pass_days, remotes_days, compress_days,
+        compress_options or dict())
+    if dry_run:
+        # Planning logs what would be done
+        list(actions)
+        return
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    failed = run_in_processes(execute, actions, processes)
+    if failed:
+        log.error("%d removals or compressions failed", failed)
+
+
+def plan_runs(run_dirs, pass_days, remotes_days, compress_days,
+              compress_options):
+    """
+    Decide what to do with the jobs of each run, listing every directory
+    just once. Whether jobs passed is looked up in their run's manifest.
+
+    :returns: A generator of actions for execute(); each is logged when
+              produced
+    """
     for run_dir in run_dirs:
         log.debug("Processing %s ..." % run_dir)
-        maybe_remove_passes(run_dir, pass_days, dry_run)
-        maybe_remove_remotes(run_dir, remotes_days, dry_run)
-        maybe_compress_logs(run_dir, compress_days, dry_run)
+        entries = scan(run_dir)
+        if any(e.name == PRESERVE_FILE for e in entries):
+            continue
+        jobs = manifest.read_manifest(run_dir) if pass_days >= 0 else dict()
+        for entry in entries:
+            if entry.is_symlink() or not entry.is_dir():
+                continue
+            for action in plan_job(entry, pass_days, remotes_days,
+                                   compress_days, compress_options,
+                                   jobs.get(entry.name)):
+                yield action
 
 
-def listdir(path):
-    with safe_while(sleep=1, increment=1, tries=10) as proceed:
-        while proceed():
+def plan_job(entry, pass_days, remotes_days, compress_days,
+             compress_options=None, manifest_entry=None):
+    """
+    :param entry:            The job directory's entry in its run directory,
+                             as returned by scan()
+    :param compress_options: See prune_archive()
+    :param manifest_entry:   The job's entry in its run's manifest, if any;
+                             its summary.yaml is read otherwise
+    :returns:                A list of actions for execute()
+    """
+    job_dir = entry.path
+    mtime = entry.stat().st_mtime
+    contents = dict((e.name, e) for e in scan(job_dir))
+    if PRESERVE_FILE in contents:
+        return []
+    # Is it a passed job?
+    if (pass_days >= 0 and is_old_enough(mtime, pass_days) and
+            'summary.yaml' in contents and
+            is_passed(job_dir, manifest_entry)):
+        log.info("{job} is a {days}-day old passed job; removing".format(
+            job=job_dir, days=pass_days))
+        return [('remove', job_dir, dict())]
+    actions = []
+    if remotes_days >= 0 and is_old_enough(mtime, remotes_days):
+        for (subdir, description) in sorted(REMOTE_SUBDIRS.items()):
+            sub_entry = contents.get(subdir)
+            if sub_entry is None or not sub_entry.is_dir():
+                continue
+            log.info("{job} is {days} days old; removing {desc}".format(
+                job=job_dir,
+                days=remotes_days,
+                desc=description,
+            ))
+            actions.append(('remove', sub_entry.path, dict()))
+    log_name = 'teuthology.log'
+    if (compress_days >= 0 and is_old_enough(mtime, compress_days) and
+            log_name in contents):
+        log.info("{job} is {days} days old; compressing {name}".format(
+            job=job_dir,
+            days=compress_days,
+            name=log_name,
+        ))
+        actions.append(
+            ('compress', contents[log_name].path, compress_options or dict()))
+    return actions
+
+
+def is_passed(job_dir, manifest_entry=None):
+    """
+    :param manifest_entry: The job's entry in its run's manifest, if any
+    :returns: True if the job passed
+    """
+    if manifest_entry is not None:
+        return manifest_entry.get('status') == 'pass'
+    summary = dict()
+    try:
+        with file(os.path.join(job_dir, 'summary.yaml')) as f:
+            for doc in yaml.safe_load_all(f):
+                summary.update(doc or dict())
+    except (IOError, yaml.YAMLError):
+        log.exception("Failed to read the summary of %s", job_dir)
+        return False
+    return get_status(summary) == 'pass'
+
+
+def execute(action):
+    """
+    Carry out an action produced by plan_job()
+
+    :returns: True if it succeeded
+    """
+    (what, path, kwargs) = action
+    if what == 'remove':
+        return remove(path)
+    elif what == 'compress':
+        return compress_log(path, **kwargs)
+    else:
+        raise ValueError("Unknown action: %s" % what)
+
+
+def run_in_processes(func, items, processes):
+    """
+    Call func(item) for each of items, in up to processes child processes
+    at once. multiprocessing.Pool can't be used since gevent has patched
+    threading.
+
+    :returns: How many of the calls raised an exception or returned False
+    """
+    failed = 0
+    if processes <= 1:
+        for item in items:
             try:
-                return os.listdir(path)
-            except OSError:
-                log.exception("Failed to list %s !" % path)
+                if func(item) is False:
+                    failed += 1
+            except Exception:
+                log.exception("Failed to process %s", item)
+                failed += 1
+        return failed
+    running = 0
+    for item in items:
+        if running >= processes:
+            failed += _wait_for_child()
+            running -= 1
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                if func(item) is False:
+                    status = 1
+            except Exception:
+                log.exception("Failed to process %s", item)
+                status = 1
+            finally:
+                os._exit(status)
+        running += 1
+    while running:
+        failed += _wait_for_child()
+        running -= 1
+    return failed
 
 
-def should_preserve(dir_name):
+def _wait_for_child():
+    (_, status) = os.wait()
+    return 1 if status else 0
+
+
+class _DirEntry(object):
+    """
+    A stand-in for os.DirEntry when scandir is unavailable
     """
-    Should the directory be preserved?
+    def __init__(self, dir_path, name):
+        self.name = name
+        self.path = os.path.join(dir_path, name)
+        self._stat = None
+        self._lstat = None
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def is_symlink(self):
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+        return stat.S_ISLNK(self._lstat.st_mode)
 
-    :returns: True if the directory contains a file named '.preserve'; False
-              otherwise
+    def is_dir(self):
+        try:
+            return stat.S_ISDIR(self.stat().st_mode)
+        except OSError:
+            return False
+
+
+def scan(path):
     """
-    preserve_path = os.path.join(dir_name, PRESERVE_FILE)
-    if os.path.isdir(dir_name) and os.path.exists(preserve_path):
-        return True
-    return False
+    :returns: A list of the entries of the directory at path, as returned by
+              os.scandir()
+    """
+    with safe_while(sleep=1, increment=1, tries=10) as proceed:
+        while proceed():
+            try:
+                if scandir is not None:
+                    return list(scandir(path))
+                return [_DirEntry(path, name) for name in os.listdir(path)]
+            except OSError:
+                log.exception("Failed to list %s !" % path)
 
 
-def is_old_enough(file_name, days):
+def is_old_enough(mtime, days):
     """
-    :returns: True if the file's modification date is earlier than the amount
-              of days specified
+    :param mtime: A modification time, or the path to a file
+    :returns: True if the modification time is earlier than the amount of
+              days specified
     """
+    if isinstance(mtime, basestring):
+        mtime = os.path.getmtime(mtime)
     now = time.time()
     secs_to_days = lambda s: s / (60 * 60 * 24)
-    age = now - os.path.getmtime(file_name)
+    age = now - mtime
     if secs_to_days(age) > days:
         return True
     return False
@@ -105,121 +328,34 @@ def remove(path):
     """
     Attempt to recursively remove a directory. If an OSError is encountered,
     log it and continue.
+
+    :returns: True if it succeeded
     """
     try:
         shutil.rmtree(path)
     except OSError:
         log.exception("Failed to remove %s !" % path)
+        return False
+    return True
 
 
-def maybe_remove_passes(run_dir, days, dry_run=False):
+def compress_log(log_path, **kwargs):
     """
-    Remove entire job log directories if they are old enough and the job passed
-    """
-    if days < 0:
-        return
-    contents = listdir(run_dir)
-    if PRESERVE_FILE in contents:
-        return
-    for child in contents:
-        item = os.path.join(run_dir, child)
-        # Ensure the path isn't marked for preservation, that it is a
-        # directory, and that it is old enough
-        if (should_preserve(item) or not os.path.isdir(item) or not
-                is_old_enough(item, days)):
-            continue
-        # Is it a job dir?
-        summary_path = os.path.join(item, 'summary.yaml')
-        if not os.path.exists(summary_path):
-            continue
-        # Is it a passed job?
-        summary_lines = [line.strip() for line in
-                         file(summary_path).readlines()]
-        if 'success: true' in summary_lines:
-            log.info("{job} is a {days}-day old passed job; removing".format(
-                job=item, days=days))
-            if not dry_run:
-                remove(item)
-
-
-def maybe_remove_remotes(run_dir, days, dry_run=False):
-    """
-    Remove remote logs (not teuthology logs) from job directories if they are
-    old enough
-    """
-    if days < 0:
-        return
-    contents = listdir(run_dir)
-    subdirs = dict(
-        remote='remote logs',
-        data='mon data',
-    )
-    if PRESERVE_FILE in contents:
-        return
-    for child in contents:
-        item = os.path.join(run_dir, child)
-        # Ensure the path isn't marked for preservation, that it is a
-        # directory, and that it is old enough
-        if (should_preserve(item) or not os.path.isdir(item) or not
-                is_old_enough(item, days)):
-            continue
-        for (subdir, description) in subdirs.iteritems():
-            _maybe_remove_subdir(item, subdir, days, description, dry_run)
-
-
-def _maybe_remove_subdir(job_dir, subdir, days, description, dry_run=False):
-    # Does the subdir exist?
-    subdir_path = os.path.join(job_dir, subdir)
-    if not os.path.isdir(subdir_path):
-        return
-    log.info("{job} is {days} days old; removing {desc}".format(
-        job=job_dir,
-        days=days,
-        desc=description,
-    ))
-    if not dry_run:
-        remove(subdir_path)
-
+    Replace log_path with a compressed copy
 
-def maybe_compress_logs(run_dir, days, dry_run=False):
-    if days < 0:
-        return
-    contents = listdir(run_dir)
-    if PRESERVE_FILE in contents:
-        return
-    for child in contents:
-        item = os.path.join(run_dir, child)
-        # Ensure the path isn't marked for preservation, that it is a
-        # directory, and that it is old enough
-        if (should_preserve(item) or not os.path.isdir(item) or not
-                is_old_enough(item, days)):
-            continue
-        log_name = 'teuthology.log'
-        log_path = os.path.join(item, log_name)
-        if not os.path.exists(log_path):
-            continue
-        log.info("{job} is {days} days old; compressing {name}".format(
-            job=item,
-            days=days,
-            name=log_name,
-        ))
-        if dry_run:
-            continue
-        zlog_path = log_path + '.gz'
-        try:
-            _compress(log_path, zlog_path)
-        except Exception:
-            log.exception("Failed to compress %s", log_path)
-            os.remove(zlog_path)
-        else:
-            os.remove(log_path)
-
-
-def _compress(in_path, out_path):
-    """
-    Compresses a file using gzip, preserving the original permissions, atime,
-    and mtime.  Does not remove the original.
+    :param kwargs: Passed to compression.compress_file()
+    :returns:      True if it succeeded
     """
-    with open(in_path, 'rb') as src, gzip.open(out_path, 'wb') as dest:
-        shutil.copyfileobj(src, dest)
-        shutil.copystat(in_path, out_path)
+    try:
+        compression.compress_file(log_path, **kwargs)
+    except Exception:
+        log.exception("Failed to compress %s", log_path)
+        codec = kwargs.get('codec', 'gz')
+        zlog_path = log_path + compression.CODEC_EXTENSIONS.get(codec, '')
+        for path in (zlog_path, zlog_path + compression.INDEX_EXTENSION):
+            if path != log_path and os.path.exists(path):
+                os.remove(path)
+        return False
+    else:
+        os.remove(log_path)
+        return True
@@ -7,12 +7,17 @@ import logging
 import socket
 from datetime import datetime
 
+import gevent.pool
+
 import teuthology
 from .config import config
 from .job_status import get_status, set_status
 
 report_exceptions = (requests.exceptions.RequestException, socket.error)
 
+# How many jobs try_delete_jobs() deletes at once
+MAX_PARALLEL_DELETES = 16
+
 
 def init_logging():
     """
@@ -201,7 +206,8 @@ class ResultsReporter(object):
 
     def _make_session(self, max_retries=10):
         session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(max_retries=max_retries)
+        adapter = requests.adapters.HTTPAdapter(
+            max_retries=max_retries, pool_maxsize=MAX_PARALLEL_DELETES)
         session.mount('http://', adapter)
         return session
 
@@ -510,8 +516,8 @@ def try_delete_jobs(run_name, job_ids, delete_empty_run=True):
             except report_exceptions:
                 log.exception("Job deletion failed")
 
-    for job_id in job_ids:
-        try_delete_job(job_id)
+    pool = gevent.pool.Pool(MAX_PARALLEL_DELETES)
+    pool.map(try_delete_job, job_ids)
 
 
 def try_mark_run_dead(run_name):
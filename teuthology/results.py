@@ -9,6 +9,7 @@ from textwrap import fill
 
 import teuthology
 from teuthology.config import config
+from teuthology import manifest
 from teuthology import misc
 from .report import ResultsReporter
 
@@ -16,6 +17,17 @@ log = logging.getLogger(__name__)
 
 UNFINISHED_STATUSES = ('queued', 'running', 'waiting')
 
+# The fields of each job the email is built from
+EMAIL_FIELDS = ('job_id', 'status', 'description', 'duration',
+                'failure_reason', 'sentry_event', 'log_href')
+
+# How often to look at the run's manifest for newly finished jobs
+MANIFEST_CHECK_INTERVAL = 5
+
+# How often to ask the results server anyway, for jobs that never make it
+# into the manifest
+FALLBACK_INTERVAL = 600
+
 
 def main(args):
 
@@ -36,26 +48,15 @@ def main(args):
 
 
 def results(archive_dir, name, email, timeout, dry_run):
-    starttime = time.time()
-
     if timeout:
         log.info('Waiting up to %d seconds for tests to finish...', timeout)
 
     reporter = ResultsReporter()
-    while timeout > 0:
-        if time.time() - starttime > timeout:
-            log.warn('test(s) did not finish before timeout of %d seconds',
-                     timeout)
-            break
-        jobs = reporter.get_jobs(name, fields=['job_id', 'status'])
-        unfinished_jobs = [job for job in jobs if job['status'] in
-                           UNFINISHED_STATUSES]
-        if not unfinished_jobs:
-            log.info('Tests finished! gathering results...')
-            break
-        time.sleep(60)
+    jobs = None
+    if timeout > 0:
+        jobs = wait_for_jobs(reporter, archive_dir, name, timeout)
 
-    (subject, body) = build_email_body(name)
+    (subject, body) = build_email_body(name, _reporter=reporter, _jobs=jobs)
 
     try:
         if email and dry_run:
@@ -74,6 +75,66 @@ def results(archive_dir, name, email, timeout, dry_run):
         generate_coverage(archive_dir, name)
 
 
+def wait_for_jobs(reporter, archive_dir, name, timeout):
+    """
+    Wait up to timeout seconds for every job of a run to finish.
+
+    Jobs record their outcome in the run's manifest as they finish, so rather
+    than polling the results server, we watch the manifest and only ask the
+    server for the run's jobs once every job it last told us was unfinished
+    has been recorded there - or every FALLBACK_INTERVAL seconds, in case a
+    job died without being recorded. While the server disagrees with the
+    manifest, e.g. because a job failed to report to it, it is asked less and
+    less often.
+
+    :returns: The run's jobs with EMAIL_FIELDS, as fetched from the results
+              server once they had all finished; None on timeout, since the
+              jobs last fetched may be out of date by then
+    """
+    deadline = time.time() + timeout
+    manifest_path = os.path.join(archive_dir, manifest.MANIFEST_FILE)
+    manifest_stat = None
+    finished = dict()
+    recheck_interval = MANIFEST_CHECK_INTERVAL
+    while True:
+        jobs = reporter.get_jobs(name, fields=EMAIL_FIELDS)
+        last_fetch = time.time()
+        unfinished = set(str(job['job_id']) for job in jobs
+                         if job['status'] in UNFINISHED_STATUSES)
+        if not unfinished:
+            log.info('Tests finished! gathering results...')
+            return jobs
+        log.debug('%d job(s) unfinished', len(unfinished))
+        if unfinished.issubset(finished):
+            recheck_interval = min(recheck_interval * 2, FALLBACK_INTERVAL)
+        else:
+            recheck_interval = MANIFEST_CHECK_INTERVAL
+        while True:
+            if time.time() > deadline:
+                log.warn('test(s) did not finish before timeout of %d '
+                         'seconds', timeout)
+                return None
+            time.sleep(MANIFEST_CHECK_INTERVAL)
+            since_fetch = time.time() - last_fetch
+            if since_fetch >= FALLBACK_INTERVAL:
+                break
+            stat = _stat(manifest_path)
+            if stat != manifest_stat:
+                manifest_stat = stat
+                finished = manifest.read_manifest(archive_dir)
+            if (unfinished.issubset(finished) and
+                    since_fetch >= recheck_interval):
+                break
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
 def generate_coverage(archive_dir, name):
     coverage_config_keys = ('coverage_output_dir', 'coverage_html_dir',
                             'coverage_tools_dir')
@@ -113,7 +174,7 @@ def email_results(subject, from_, to, body):
     smtp.quit()
 
 
-def build_email_body(name, _reporter=None):
+def build_email_body(name, _reporter=None, _jobs=None):
     stanzas = OrderedDict([
         ('fail', dict()),
         ('dead', dict()),
@@ -122,10 +183,11 @@ def build_email_body(name, _reporter=None):
         ('queued', dict()),
         ('pass', dict()),
     ])
-    reporter = _reporter or ResultsReporter()
-    fields = ('job_id', 'status', 'description', 'duration', 'failure_reason',
-              'sentry_event', 'log_href')
-    jobs = reporter.get_jobs(name, fields=fields)
+    if _jobs is None:
+        reporter = _reporter or ResultsReporter()
+        jobs = reporter.get_jobs(name, fields=EMAIL_FIELDS)
+    else:
+        jobs = list(_jobs)
     jobs.sort(key=lambda job: job['job_id'])
 
     for job in jobs:
@@ -7,6 +7,7 @@ import logging
 from traceback import format_tb
 
 import teuthology
+from . import manifest
 from . import report
 from .job_status import get_status
 from .misc import get_user, merge_configs
@@ -283,6 +284,14 @@ def report_outcome(config, archive, summary, fake_ctx):
 
     report.try_push_job_info(config, summary)
 
+    # teuthology-results watches the manifest, and asks the results server
+    # about the jobs recorded there; record the job once the server knows
+    if archive is not None:
+        try:
+            manifest.record_job(archive, summary)
+        except Exception:
+            log.exception("Failed to record job in the run's manifest")
+
     if passed:
         log.info(status)
     else:
@@ -9,8 +9,10 @@ from .config import config as teuth_config
 from .exceptions import ConnectionLostError
 from .job_status import set_status
 from .misc import get_http_log_path
+from .orchestra import facts
+from .orchestra import run as orchestra_run
 from .sentry import get_client as get_sentry_client
-from .timer import Timer
+from .timer import CommandStats, Timer
 
 log = logging.getLogger(__name__)
 
@@ -72,8 +74,13 @@ def run_tasks(tasks, ctx):
             path=os.path.join(archive_path, 'timing.yaml'),
             sync=True,
         )
+        command_stats = CommandStats(
+            path=os.path.join(archive_path, 'commands.yaml'),
+        )
     else:
         timer = Timer()
+        command_stats = None
+    orchestra_run.command_stats = command_stats
     stack = []
     try:
         for taskdict in tasks:
@@ -189,4 +196,8 @@ def run_tasks(tasks, ctx):
         finally:
             # be careful about cyclic references
             del exc_info
+            if command_stats:
+                command_stats.write()
+            if archive_path:
+                facts.save(archive_path)
         timer.mark("tasks complete")
@@ -6,6 +6,7 @@ from copy import deepcopy
 from mock import Mock, patch
 
 from teuthology.config import config
+from teuthology import packaging
 from teuthology.orchestra.opsys import OS
 from teuthology.suite import util
 
@@ -48,6 +49,7 @@ def git_repository(request):
 class TestUtil(object):
     def setup(self):
         config.use_shaman = False
+        packaging.clear_metadata_cache()
 
     @patch('requests.get')
     def test_get_hash_success(self, m_get):
@@ -15,18 +15,21 @@ from .util import (
     _get_builder_project, get_flavor, ship_utilities,
 )
 
-from . import rpm, deb, redhat
+from . import cache, rpm, deb, redhat
 
 log = logging.getLogger(__name__)
 
 
-def verify_package_version(ctx, config, remote):
+def verify_package_version(ctx, config, remote, pkgs=None):
     """
     Ensures that the version of package installed is what
     was asked for in the config.
 
     For most cases this is for ceph, but we also install samba
     for example.
+
+    :param pkgs: other packages whose installed versions should be looked up
+                 (and logged) in the same remote command
     """
     # Do not verify the version if the ceph-deploy task is being used to
     # install ceph. Verifying the ceph installed by ceph-deploy should work,
@@ -39,7 +42,14 @@ def verify_package_version(ctx, config, remote):
     builder = _get_builder_project(ctx, remote, config)
     version = builder.version
     pkg_to_check = builder.project
-    installed_ver = packaging.get_package_version(remote, pkg_to_check)
+    pkgs_to_query = [pkg_to_check] + [
+        pkg for pkg in (pkgs or []) if pkg != pkg_to_check]
+    installed_versions = packaging.get_package_versions(remote, pkgs_to_query)
+    installed_ver = installed_versions[pkg_to_check]
+    missing = [pkg for pkg in pkgs_to_query if not installed_versions[pkg]]
+    if missing:
+        log.warning("Packages not installed on {host}: {pkgs}".format(
+            host=remote.shortname, pkgs=', '.join(missing)))
     if installed_ver and version in installed_ver:
         msg = "The correct {pkg} version {ver} is installed.".format(
             ver=version,
@@ -110,12 +120,18 @@ def install_packages(ctx, pkgs, config):
         for remote in ctx.cluster.remotes.iterkeys():
             system_type = teuthology.get_system_type(remote)
             p.spawn(
+                _install_and_verify,
                 install_pkgs[system_type],
                 ctx, remote, pkgs[system_type], config)
 
-    for remote in ctx.cluster.remotes.iterkeys():
-        # verifies that the install worked as expected
-        verify_package_version(ctx, config, remote)
+
+def _install_and_verify(install_func, ctx, remote, pkgs, config):
+    """
+    Installs packages on one remote, then verifies that the install worked
+    as expected, so that hosts are verified as soon as each one is done.
+    """
+    install_func(ctx, remote, pkgs, config)
+    verify_package_version(ctx, config, remote, pkgs=pkgs)
 
 
 def remove_packages(ctx, config, pkgs):
@@ -238,7 +254,8 @@ def install(ctx, config):
                 'python-ceph']
         rpm = ['ceph-fuse', 'librbd1', 'librados2', 'ceph-test', 'python-ceph']
     package_list = dict(deb=debs, rpm=rpm)
-    install_packages(ctx, package_list, config)
+    with cache.package_cache(ctx, config):
+        install_packages(ctx, package_list, config)
     try:
         yield
     finally:
@@ -472,6 +489,15 @@ def task(ctx, config):
             - ceph-devel
             - rbd-fuse
 
+    Multi-node jobs may download the packages from the builder only once per
+    distro/version/arch, staging them on one of the remotes and serving them
+    from there to the others:
+
+    overrides:
+      install:
+        ceph:
+          package_cache: true
+
     When tag, branch and sha1 do not reference the same commit hash, the
     tag takes precedence over the branch and the branch takes precedence
     over the sha1.
@@ -574,6 +600,7 @@ def task(ctx, config):
                 wait_for_package=config.get('wait_for_package', False),
                 project=project,
                 packages=config.get('packages', dict()),
+                package_cache=config.get('package_cache'),
             )),
             lambda: ship_utilities(ctx=ctx, config=None),
         ):
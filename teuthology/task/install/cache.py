@@ -0,0 +1,298 @@
+"""
+An optional, job-local package cache for the install task
+
+When the install task is configured with::
+
+    - install:
+        package_cache: true
+
+one remote out of each group of remotes sharing a distro, distro version,
+architecture and build to install mirrors the project's package repository
+once and serves it over HTTP. The repo files of every remote in that group are then pointed at the
+mirror, so that the packages are only downloaded from the builder once per
+job instead of once per remote. The port may be set with::
+
+    - install:
+        package_cache:
+          port: 8089
+
+Groups containing a single remote are installed directly from the builder,
+as are groups whose mirror could not be set up.
+"""
+import contextlib
+import logging
+import re
+import urlparse
+
+from teuthology.contextutil import safe_while
+from teuthology.orchestra import run
+from teuthology.parallel import parallel
+
+from .util import _get_builder_project
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = '/var/cache/teuthology-packages'
+DEFAULT_PORT = 8089
+
+# Debug packages are only mirrored when 'debuginfo' is set
+DEBUG_PACKAGE_PATTERNS = ['*-dbg_*', '*-dbgsym_*', '*-debuginfo-*']
+
+SERVE_SCRIPT = (
+    "cd {path} && "
+    "if command -v python3 >/dev/null; then "
+    "server='python3 -m http.server'; "
+    "else server='python -m SimpleHTTPServer'; fi; "
+    "nohup $server {port} >/dev/null 2>&1 </dev/null & "
+    "echo $! > {pidfile}"
+)
+
+
+def get_cache_config(config):
+    """
+    Return the package_cache settings from the install task's config, or None
+    if the cache is disabled
+    """
+    cache_config = config.get('package_cache')
+    if not cache_config:
+        return None
+    if not isinstance(cache_config, dict):
+        cache_config = dict()
+    return dict(port=cache_config.get('port', DEFAULT_PORT))
+
+
+def group_remotes(remotes, base_urls=None):
+    """
+    Group remotes that can share a package repository
+
+    :param remotes:   An iterable of teuthology.orchestra.remote.Remote
+                      objects
+    :param base_urls: A dict mapping the names of remotes to the URL of the
+                      repository each installs from, which differs when e.g.
+                      a role overrides the sha1 or flavor
+    :returns:         A dict mapping (package_type, distro, version, arch,
+                      base_url) to a list of remotes, sorted by name
+    """
+    base_urls = base_urls or dict()
+    groups = dict()
+    for remote in remotes:
+        key = (remote.os.package_type, remote.os.name, remote.os.version,
+               remote.arch, base_urls.get(remote.name))
+        groups.setdefault(key, list()).append(remote)
+    for group in groups.values():
+        group.sort(key=lambda remote: remote.name)
+    return groups
+
+
+def get_repo_path(remote, builder):
+    """
+    Return the path of the file that install_repo() writes on remote
+    """
+    if remote.os.package_type == 'deb':
+        return '/etc/apt/sources.list.d/{proj}.list'.format(
+            proj=builder.project)
+    elif builder.dist_release in ['opensuse', 'sle']:
+        return '/etc/zypp/repos.d/ceph-rpm-under-test.repo'
+    return '/etc/yum.repos.d/{proj}.repo'.format(proj=builder.project)
+
+
+def _sed_escape(str_):
+    return re.sub(r'([.*\[\]^$\\|])', r'\\\1', str_)
+
+
+def rewrite_repo(remote, builder, old_url, new_url):
+    """
+    Replace old_url with new_url in the repo file on remote
+    """
+    repo_path = get_repo_path(remote, builder)
+    expr = 's|{old}|{new}|g'.format(
+        old=_sed_escape(old_url.rstrip('/')),
+        new=new_url.rstrip('/'),
+    )
+    remote.run(
+        args=[
+            'if', 'test', '-f', repo_path, run.Raw(';'), 'then',
+            'sudo', 'sed', '-i', '-e', expr, repo_path, run.Raw(';'), 'fi',
+        ]
+    )
+
+
+def use_cache(ctx, remote, builder):
+    """
+    If a package cache is serving remote's group, point remote's repo file at
+    it. Must be called after builder.install_repo().
+    """
+    cache_url = getattr(ctx, 'package_cache', dict()).get(remote.name)
+    if not cache_url:
+        return
+    log.info("Using package cache %s on %s", cache_url, remote.shortname)
+    rewrite_repo(remote, builder, builder.base_url, cache_url)
+
+
+def get_mirror_args(base_url, path, debuginfo=False):
+    """
+    Return the args that mirror base_url into path on a remote
+    """
+    base_url = base_url.rstrip('/') + '/'
+    url_path = urlparse.urlparse(base_url).path
+    cut_dirs = len([part for part in url_path.split('/') if part])
+    reject = ['index.html*']
+    if not debuginfo:
+        reject.extend(DEBUG_PACKAGE_PATTERNS)
+    return [
+        'sudo', 'mkdir', '-p', path, run.Raw('&&'),
+        'cd', path, run.Raw('&&'),
+        'sudo', 'wget', '--quiet', '--mirror', '--no-parent',
+        '--no-host-directories', '--cut-dirs={0}'.format(cut_dirs),
+        '-e', 'robots=off',
+        '--reject', ','.join(reject),
+        '--reject-regex', r'\?',
+        base_url,
+    ]
+
+
+def start_cache(ctx, config, remote, port):
+    """
+    Mirror the project's repository on remote and serve it over HTTP
+
+    :returns: The URL of the mirror, or None if it could not be set up
+    """
+    builder = _get_builder_project(ctx, remote, config)
+    path = '{0}/{1}'.format(CACHE_DIR, builder.project)
+    log.info("Staging %s packages from %s on %s", builder.project,
+             builder.base_url, remote.shortname)
+    proc = remote.run(
+        args=get_mirror_args(builder.base_url, path,
+                             debuginfo=config.get('debuginfo', False)),
+        check_status=False,
+    )
+    # wget exits with 8 if some (e.g. directory listing) requests failed
+    if proc.exitstatus not in (0, 8):
+        log.warning("Failed to stage packages on %s; not using a cache",
+                    remote.shortname)
+        stop_cache(remote, path)
+        return None
+    remote.run(
+        args=[
+            'sudo', 'sh', '-c',
+            SERVE_SCRIPT.format(path=path, port=port,
+                                pidfile=path + '.pid'),
+        ]
+    )
+    local_url = 'http://localhost:{0}/'.format(port)
+    with safe_while(sleep=1, tries=15, _raise=False) as proceed:
+        while proceed():
+            proc = remote.run(
+                args=['wget', '--quiet', '-O', '/dev/null', local_url],
+                check_status=False,
+            )
+            if proc.exitstatus == 0:
+                return 'http://{host}:{port}/'.format(
+                    host=remote.ip_address, port=port)
+    log.warning("Package cache on %s did not start; not using it",
+                remote.shortname)
+    stop_cache(remote, path)
+    return None
+
+
+def stop_cache(remote, path):
+    """
+    Stop the HTTP server started by start_cache() and remove the mirror
+    """
+    pidfile = path + '.pid'
+    remote.run(
+        args=[
+            'sudo', 'sh', '-c',
+            'test -f {pidfile} && kill $(cat {pidfile}); '
+            'rm -rf {path} {pidfile}'.format(pidfile=pidfile, path=path),
+        ],
+        check_status=False,
+    )
+
+
+@contextlib.contextmanager
+def package_cache(ctx, config):
+    """
+    Set up a package cache for each group of remotes for the duration of the
+    with block, if the install task's config asks for one. On exit, the repo
+    files are pointed back at the builder and the caches are removed.
+
+    :param ctx: the argparse.Namespace object
+    :param config: the install task's config dict
+    """
+    ctx.package_cache = dict()
+    cache_config = get_cache_config(config)
+    if cache_config is None:
+        yield
+        return
+
+    # (server, path) pairs of the caches that may need stopping; each is
+    # registered before its mirror is started
+    servers = list()
+
+    def get_base_url(remote):
+        try:
+            builder = _get_builder_project(ctx, remote, config)
+            return remote, builder.base_url
+        except Exception:
+            log.exception("Failed to find packages for %s; not using a cache",
+                          remote.shortname)
+            return remote, None
+
+    def start(remotes):
+        server = remotes[0]
+        try:
+            builder = _get_builder_project(ctx, server, config)
+        except Exception:
+            log.exception("Failed to find packages for %s; not using a cache",
+                          server.shortname)
+            return server, remotes, None
+        path = '{0}/{1}'.format(CACHE_DIR, builder.project)
+        servers.append((server, path))
+        try:
+            cache_url = start_cache(ctx, config, server, cache_config['port'])
+        except Exception:
+            log.exception("Failed to set up a package cache on %s; not using "
+                          "it", server.shortname)
+            stop_cache(server, path)
+            cache_url = None
+        if cache_url is None:
+            # Whatever was started has been stopped already
+            servers.remove((server, path))
+        return server, remotes, cache_url
+
+    try:
+        # Only remotes installing the same build can share a cache
+        with parallel() as p:
+            for remote in ctx.cluster.remotes.keys():
+                p.spawn(get_base_url, remote)
+            base_urls = dict((remote.name, base_url)
+                             for (remote, base_url) in p if base_url)
+        candidates = [remote for remote in ctx.cluster.remotes.keys()
+                      if remote.name in base_urls]
+        with parallel() as p:
+            for remotes in group_remotes(candidates, base_urls).values():
+                if len(remotes) < 2:
+                    continue
+                p.spawn(start, remotes)
+            for server, remotes, cache_url in p:
+                if cache_url is None:
+                    continue
+                for remote in remotes:
+                    ctx.package_cache[remote.name] = cache_url
+        yield
+    finally:
+        try:
+            with parallel() as p:
+                for remote in ctx.cluster.remotes.keys():
+                    cache_url = ctx.package_cache.get(remote.name)
+                    if not cache_url:
+                        continue
+                    builder = _get_builder_project(ctx, remote, config)
+                    p.spawn(rewrite_repo, remote, builder, cache_url,
+                            builder.base_url)
+        finally:
+            with parallel() as p:
+                for server, path in servers:
+                    p.spawn(stop_cache, server, path)
+            ctx.package_cache = dict()
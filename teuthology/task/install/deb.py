@@ -5,7 +5,10 @@ from cStringIO import StringIO
 
 from teuthology.orchestra import run
 
-from .util import _get_builder_project, _get_local_dir
+from . import cache
+from .util import (
+    _get_builder_project, _get_local_dir, _get_outdated_packages,
+)
 
 
 log = logging.getLogger(__name__)
@@ -14,7 +17,8 @@ log = logging.getLogger(__name__)
 def _update_package_list_and_install(ctx, remote, debs, config):
     """
     Runs ``apt-get update`` first, then runs ``apt-get install``, installing
-    the requested packages on the remote system.
+    the requested packages on the remote system. Both are skipped if the
+    requested versions of the packages are already installed.
 
     TODO: split this into at least two functions.
 
@@ -24,37 +28,28 @@ def _update_package_list_and_install(ctx, remote, debs, config):
     :param config: the config dict
     """
 
-    # check for ceph release key
-    r = remote.run(
-        args=[
-            'sudo', 'apt-key', 'list', run.Raw('|'), 'grep', 'Ceph',
-        ],
-        stdout=StringIO(),
-        check_status=False,
-    )
-    if r.stdout.getvalue().find('Ceph automated package') == -1:
-        # if it doesn't exist, add it
-        remote.run(
-            args=[
-                'wget', '-q', '-O-',
-                'http://git.ceph.com/?p=ceph.git;a=blob_plain;f=keys/autobuild.asc',  # noqa
-                run.Raw('|'),
-                'sudo', 'apt-key', 'add', '-',
-            ],
-            stdout=StringIO(),
-        )
-
     builder = _get_builder_project(ctx, remote, config)
+    version = builder.version
+    ldir = _get_local_dir(config, remote)
+    if not ldir and not _get_outdated_packages(remote, debs, version):
+        log.info("Packages {pkglist} are already at version {ver} on "
+                 "{host}; skipping install".format(
+                     pkglist=", ".join(debs), ver=version,
+                     host=remote.shortname))
+        builder.install_repo()
+        return
+
+    _install_release_key(remote)
+
     log.info("Installing packages: {pkglist} on remote deb {arch}".format(
         pkglist=", ".join(debs), arch=builder.arch)
     )
     # get baseurl
     log.info('Pulling from %s', builder.base_url)
-
-    version = builder.version
     log.info('Package version is %s', version)
 
     builder.install_repo()
+    cache.use_cache(ctx, remote, builder)
 
     remote.run(args=['sudo', 'apt-get', 'update'], check_status=False)
     remote.run(
@@ -66,11 +61,37 @@ def _update_package_list_and_install(ctx, remote, debs, config):
             'install',
         ] + ['%s=%s' % (d, version) for d in debs],
     )
-    ldir = _get_local_dir(config, remote)
     if ldir:
-        for fyle in os.listdir(ldir):
-            fname = "%s/%s" % (ldir, fyle)
-            remote.run(args=['sudo', 'dpkg', '-i', fname],)
+        fnames = ["%s/%s" % (ldir, fyle) for fyle in sorted(os.listdir(ldir))]
+        if fnames:
+            remote.run(args=['sudo', 'dpkg', '-i'] + fnames)
+
+
+def _install_release_key(remote):
+    """
+    Adds the Ceph automated package signing key on remote, if it isn't
+    already there
+
+    :param remote: the teuthology.orchestra.remote.Remote object
+    """
+    r = remote.run(
+        args=[
+            'sudo', 'apt-key', 'list', run.Raw('|'), 'grep', 'Ceph',
+        ],
+        stdout=StringIO(),
+        check_status=False,
+    )
+    if r.stdout.getvalue().find('Ceph automated package') == -1:
+        # if it doesn't exist, add it
+        remote.run(
+            args=[
+                'wget', '-q', '-O-',
+                'http://git.ceph.com/?p=ceph.git;a=blob_plain;f=keys/autobuild.asc',  # noqa
+                run.Raw('|'),
+                'sudo', 'apt-key', 'add', '-',
+            ],
+            stdout=StringIO(),
+        )
 
 
 def _remove(ctx, config, remote, debs):
@@ -153,25 +174,7 @@ def _upgrade_packages(ctx, config, remote, debs):
     :param debs: the Debian packages to be installed
     :param branch: the branch of the project to be used
     """
-    # check for ceph release key
-    r = remote.run(
-        args=[
-            'sudo', 'apt-key', 'list', run.Raw('|'), 'grep', 'Ceph',
-        ],
-        stdout=StringIO(),
-        check_status=False,
-    )
-    if r.stdout.getvalue().find('Ceph automated package') == -1:
-        # if it doesn't exist, add it
-        remote.run(
-            args=[
-                'wget', '-q', '-O-',
-                'http://git.ceph.com/?p=ceph.git;a=blob_plain;f=keys/autobuild.asc',  # noqa
-                run.Raw('|'),
-                'sudo', 'apt-key', 'add', '-',
-            ],
-            stdout=StringIO(),
-        )
+    _install_release_key(remote)
 
     builder = _get_builder_project(ctx, remote, config)
     base_url = builder.base_url
@@ -1,10 +1,14 @@
 import logging
+import os
 
 from teuthology.config import config as teuth_config
 from teuthology.orchestra import run
 from teuthology import packaging
 
-from .util import _get_builder_project, _get_local_dir
+from . import cache
+from .util import (
+    _get_builder_project, _get_local_dir, _get_outdated_packages,
+)
 
 log = logging.getLogger(__name__)
 
@@ -84,7 +88,8 @@ def _package_overrides(pkgs, os):
 def _update_package_list_and_install(ctx, remote, rpm, config):
     """
     Installs the repository for the relevant branch, then installs
-    the requested packages on the remote system.
+    the requested packages on the remote system, unless the requested
+    versions of the packages are already installed.
 
     TODO: split this into at least two functions.
 
@@ -109,6 +114,15 @@ def _update_package_list_and_install(ctx, remote, rpm, config):
         _yum_fix_repo_priority(remote, project, uri)
         _yum_fix_repo_host(remote, project)
         _yum_set_check_obsoletes(remote)
+    cache.use_cache(ctx, remote, builder)
+
+    ldir = _get_local_dir(config, remote)
+    if not ldir and not _get_outdated_packages(remote, rpm, builder.version):
+        log.info("Packages {pkglist} are already at version {ver} on "
+                 "{host}; skipping install".format(
+                     pkglist=", ".join(rpm), ver=builder.version,
+                     host=remote.shortname))
+        return
 
     if dist_release in ['opensuse', 'sle']:
         remote.run(
@@ -121,8 +135,6 @@ def _update_package_list_and_install(ctx, remote, rpm, config):
                 'sudo', 'yum', 'clean', 'all',
             ])
 
-    ldir = _get_local_dir(config, remote)
-
     if dist_release in ['opensuse', 'sle']:
         pkg_mng_cmd = 'zypper'
         pkg_mng_opts = '-n'
@@ -132,34 +144,27 @@ def _update_package_list_and_install(ctx, remote, rpm, config):
         pkg_mng_opts = '-y'
         pkg_mng_subcommand_opts = ''
 
+    # Packages found in the local directory replace those from the repo;
+    # everything is installed in a single transaction
+    local_pkgs = list()
+    repo_pkgs = list()
     for cpack in rpm:
-        pkg = None
-        if ldir:
-            pkg = "{ldir}/{cpack}".format(
+        if ldir and os.path.exists(os.path.join(ldir, cpack)):
+            local_pkgs.append("{ldir}/{cpack}".format(
                 ldir=ldir,
                 cpack=cpack,
-            )
-            remote.run(
-                args=['if', 'test', '-e',
-                      run.Raw(pkg), run.Raw(';'), 'then',
-                      'sudo', pkg_mng_cmd, pkg_mng_opts, 'remove',
-                      pkg_mng_subcommand_opts, pkg, run.Raw(';'),
-                      'sudo', pkg_mng_cmd, pkg_mng_opts, 'install',
-                      pkg_mng_subcommand_opts, pkg, run.Raw(';'),
-                      'fi']
-            )
-        if pkg is None:
-            remote.run(args=[
-                'sudo', pkg_mng_cmd, pkg_mng_opts, 'install',
-                pkg_mng_subcommand_opts, cpack
-            ])
+            ))
         else:
-            remote.run(
-                args=['if', 'test', run.Raw('!'), '-e',
-                      run.Raw(pkg), run.Raw(';'), 'then',
-                      'sudo', pkg_mng_cmd, pkg_mng_opts, 'install',
-                      pkg_mng_subcommand_opts, cpack, run.Raw(';'),
-                      'fi'])
+            repo_pkgs.append(cpack)
+    if local_pkgs:
+        remote.run(args=[
+            'sudo', pkg_mng_cmd, pkg_mng_opts, 'remove',
+            pkg_mng_subcommand_opts,
+        ] + local_pkgs)
+    remote.run(args=[
+        'sudo', pkg_mng_cmd, pkg_mng_opts, 'install',
+        pkg_mng_subcommand_opts,
+    ] + local_pkgs + repo_pkgs)
 
 
 def _yum_fix_repo_priority(remote, project, uri):
@@ -33,6 +33,16 @@ def _get_local_dir(config, remote):
     return ldir
 
 
+def _get_outdated_packages(remote, pkgs, version):
+    """
+    Return those of pkgs that are not installed at the given version on
+    remote, using a single remote command.
+    """
+    installed = packaging.get_package_versions(remote, pkgs)
+    return [pkg for pkg in pkgs
+            if not installed[pkg] or version not in installed[pkg]]
+
+
 def get_flavor(config):
     """
     Determine the flavor to use.
@@ -19,6 +19,7 @@ from teuthology.config import config as teuth_config
 from teuthology.exceptions import VersionNotFoundError
 from teuthology.job_status import get_status, set_status
 from teuthology.orchestra import cluster, remote, run
+from teuthology.parallel import parallel
 
 log = logging.getLogger(__name__)
 
@@ -329,6 +330,139 @@ def fetch_binaries_for_coredumps(path, remote):
             remote.get_file(debug_path, coredump_path)
 
 
+# Extensions of files that are already compressed and won't be recompressed
+COMPRESSED_EXTENSIONS = ('.gz', '.zst', '.lz4', '.xz', '.bz2')
+
+# Commands, and the extensions they use, available to compress archived files
+# on the remote end
+ARCHIVE_FILE_COMPRESSORS = dict(
+    gz=(['gzip', '-1', '-c'], '.gz'),
+    zstd=(remote.TAR_COMPRESSORS['zstd'], '.zst'),
+    lz4=(remote.TAR_COMPRESSORS['lz4'], '.lz4'),
+)
+
+
+def get_archive_filter(ctx):
+    """
+    Return the settings for filtering remote archive directories before they
+    are transferred; the job's archive-filter overrides the site-wide
+    archive_filter, key by key. Recognized keys are:
+
+        exclude:           Globs of files to remove. Globs without a '/' match
+                           file names anywhere; others match paths relative to
+                           the archive directory.
+        max_size:          Files bigger than this many bytes are truncated...
+        tail_size:         ...to their last tail_size bytes (default:
+                           max_size)
+        compress:          Compress files bigger than compress_min_size with
+                           this codec: gz, zstd or lz4, or a list of those in
+                           order of preference. gz is the fallback.
+        compress_min_size: Defaults to 4096.
+
+    Core dumps are never touched.
+    """
+    settings = dict(teuth_config.archive_filter or dict())
+    settings.update(ctx.config.get('archive-filter') or dict())
+    return settings
+
+
+def get_archive_filter_script(archive_dir, settings, codec=None):
+    """
+    Build a shell script implementing the archive filter settings
+
+    :param archive_dir: The remote archive directory
+    :param settings:    See get_archive_filter()
+    :param codec:       The codec to compress files with, if any; one of
+                        ARCHIVE_FILE_COMPRESSORS
+    :returns:           The script, or None if there is nothing to do
+    """
+    def quote(args):
+        return run.quote(list(args))
+
+    find = "find . -path ./coredump -prune -o -type f {tests} -print0"
+    lines = []
+    exclude = settings.get('exclude') or []
+    if exclude:
+        tests = []
+        for glob in exclude:
+            if glob.startswith('./'):
+                glob = glob[2:]
+            if '/' in glob:
+                tests.append(quote(['-path', './' + glob]))
+            else:
+                tests.append(quote(['-name', glob]))
+        lines.append(find.format(tests='\\( %s \\)' % ' -o '.join(tests)) +
+                     ' | xargs -0 -r rm -f')
+    max_size = settings.get('max_size')
+    if max_size:
+        tail_size = int(settings.get('tail_size') or max_size)
+        truncate = (
+            '{{ echo "[truncated by teuthology; last {tail} bytes follow]"; '
+            'tail -c {tail} "$0"; }} > "$0.tail" && mv "$0.tail" "$0"'
+        ).format(tail=tail_size)
+        lines.append(
+            find.format(tests='-size +%dc' % int(max_size)) +
+            ' | xargs -0 -r -n 1 sh -c ' + quote([truncate]))
+    if codec:
+        (cmd, ext) = ARCHIVE_FILE_COMPRESSORS[codec]
+        compress = '{cmd} "$0" > "$0{ext}" && rm -f "$0"'.format(
+            cmd=quote(cmd), ext=ext)
+        tests = ['-size +%dc' % int(settings.get('compress_min_size', 4096))]
+        tests.extend(quote(['!', '-name', '*' + e])
+                     for e in COMPRESSED_EXTENSIONS)
+        lines.append(
+            find.format(tests=' '.join(tests)) +
+            ' | xargs -0 -r -n 1 -P "$(getconf _NPROCESSORS_ONLN)" sh -c ' +
+            quote([compress]))
+    if not lines:
+        return None
+    lines.insert(0, 'cd %s || exit 0' % quote([archive_dir]))
+    return '\n'.join(lines) + '\n'
+
+
+def get_archive_filter_codec(remote, settings):
+    """
+    Pick the codec to compress archived files with on remote; see
+    get_archive_filter()
+
+    :returns: A key of ARCHIVE_FILE_COMPRESSORS, or None
+    """
+    preferred = settings.get('compress')
+    if not preferred:
+        return None
+    return misc.pick_codec(remote, preferred, ARCHIVE_FILE_COMPRESSORS)
+
+
+def filter_archive(remote, archive_dir, settings):
+    """
+    Filter and compress a remote archive directory in place, before it is
+    transferred
+
+    :returns: The codec used to compress files, if any
+    """
+    codec = get_archive_filter_codec(remote, settings)
+    script = get_archive_filter_script(archive_dir, settings, codec)
+    if script:
+        log.info('Filtering archived files on %s...', remote.shortname)
+        remote.run(args=['sudo', 'sh', '-c', script])
+    return codec
+
+
+def _pull_archive(remote, archive_dir, path, filter_settings=None):
+    compress = None
+    if filter_settings:
+        try:
+            if filter_archive(remote, archive_dir, filter_settings):
+                # The big files are compressed already
+                compress = 'none'
+        except Exception:
+            log.exception('Failed to filter archived files on %s; '
+                          'transferring them as-is', remote.shortname)
+    misc.pull_directory(remote, archive_dir, path, compress=compress)
+    # Check for coredumps and pull binaries
+    fetch_binaries_for_coredumps(path, remote)
+
+
 @contextlib.contextmanager
 def archive(ctx, config):
     """
@@ -357,11 +491,12 @@ def archive(ctx, config):
             logdir = os.path.join(ctx.archive, 'remote')
             if (not os.path.exists(logdir)):
                 os.mkdir(logdir)
-            for rem in ctx.cluster.remotes.iterkeys():
-                path = os.path.join(logdir, rem.shortname)
-                misc.pull_directory(rem, archive_dir, path)
-                # Check for coredumps and pull binaries
-                fetch_binaries_for_coredumps(path, rem)
+            filter_settings = get_archive_filter(ctx)
+            with parallel() as p:
+                for rem in ctx.cluster.remotes.iterkeys():
+                    path = os.path.join(logdir, rem.shortname)
+                    p.spawn(_pull_archive, rem, archive_dir, path,
+                            filter_settings)
 
         log.info('Removing archive directory...')
         run.wait(
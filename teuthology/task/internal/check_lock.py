@@ -7,16 +7,20 @@ from teuthology.config import config as teuth_config
 log = logging.getLogger(__name__)
 
 
-def check_lock(ctx, config, check_up=True):
+def check_lock(ctx, config, check_up=True, statuses=None):
     """
     Check lock status of remote machines.
+
+    :param statuses: The machines' lock statuses, if they were already
+                     fetched, as returned by lockstatus.get_statuses()
     """
     if not teuth_config.lock_server or ctx.config.get('check-locks') is False:
         log.info('Lock checking disabled.')
         return
     log.info('Checking locks...')
-    for machine in ctx.config['targets'].iterkeys():
-        status = lockstatus.get_status(machine)
+    if statuses is None:
+        statuses = lockstatus.get_statuses(ctx.config['targets'].keys())
+    for machine, status in statuses.iteritems():
         log.debug('machine status is %s', repr(status))
         assert status is not None, \
             'could not read lock status for {name}'.format(name=machine)
@@ -4,11 +4,13 @@ import time
 import yaml
 
 from teuthology import lock
-from teuthology import lockstatus
+from teuthology import lock_queue
 from teuthology import misc
 from teuthology import provision
 from teuthology import report
 
+from teuthology.parallel import parallel
+
 from teuthology.config import config as teuth_config
 from teuthology.job_status import get_status, set_status
 
@@ -43,106 +45,110 @@ def lock_machines(ctx, config):
 
     all_locked = dict()
     requested = total_requested
-    while True:
-        # get a candidate list of machines
-        machines = lock.list_locks(machine_type=machine_type, up=True,
-                                   locked=False, count=requested + reserved)
-        if machines is None:
-            if ctx.block:
-                log.error('Error listing machines, trying again')
-                time.sleep(20)
-                continue
-            else:
-                raise RuntimeError('Error listing machines')
-
-        # make sure there are machines for non-automated jobs to run
-        if len(machines) < reserved + requested and ctx.owner.startswith('scheduled'):
-            if ctx.block:
-                log.info(
-                    'waiting for more %s machines to be free (need %s + %s, have %s)...',
-                    machine_type,
-                    reserved,
-                    requested,
-                    len(machines),
-                )
-                time.sleep(10)
-                continue
-            else:
-                assert 0, ('not enough machines free; need %s + %s, have %s' %
-                           (reserved, requested, len(machines)))
-
-        try:
-            newly_locked = lock.lock_many(ctx, requested, machine_type,
-                                          ctx.owner, ctx.archive, os_type,
-                                          os_version, arch)
-        except Exception:
-            # Lock failures should map to the 'dead' status instead of 'fail'
-            set_status(ctx.summary, 'dead')
-            raise
-        all_locked.update(newly_locked)
-        log.info(
-            '{newly_locked} {mtype} machines locked this try, '
-            '{total_locked}/{total_requested} locked so far'.format(
-                newly_locked=len(newly_locked),
-                mtype=machine_type,
-                total_locked=len(all_locked),
-                total_requested=total_requested,
-            )
+    # In fair allocation mode, only the job at the head of the local queue
+    # asks the lock server for machines
+    demand = None
+    if teuth_config.lock_queue_dir and ctx.block:
+        demand = lock_queue.Demand(
+            machine_type,
+            total_requested,
+            priority=ctx.config.get('priority'),
+            job_id=ctx.config.get('job_id'),
         )
-        if len(all_locked) == total_requested:
-            vmlist = []
-            for lmach in all_locked:
-                if misc.is_vm(lmach):
-                    vmlist.append(lmach)
-            if vmlist:
-                log.info('Waiting for virtual machines to come up')
-                keys_dict = dict()
-                loopcount = 0
-                while len(keys_dict) != len(vmlist):
-                    loopcount += 1
+        demand.register()
+    try:
+        while True:
+            if demand:
+                demand.wait_for_turn()
+            # get a candidate list of machines
+            machines = lock.list_locks(machine_type=machine_type, up=True,
+                                       locked=False,
+                                       count=requested + reserved)
+            if machines is None:
+                if ctx.block:
+                    log.error('Error listing machines, trying again')
+                    time.sleep(20)
+                    continue
+                else:
+                    raise RuntimeError('Error listing machines')
+
+            # make sure there are machines for non-automated jobs to run
+            if len(machines) < reserved + requested and ctx.owner.startswith('scheduled'):
+                if ctx.block:
+                    log.info(
+                        'waiting for more %s machines to be free (need %s + %s, have %s)...',
+                        machine_type,
+                        reserved,
+                        requested,
+                        len(machines),
+                    )
                     time.sleep(10)
-                    keys_dict = misc.ssh_keyscan(vmlist)
-                    log.info('virtual machine is still unavailable')
-                    if loopcount == 40:
-                        loopcount = 0
-                        log.info('virtual machine(s) still not up, ' +
-                                 'recreating unresponsive ones.')
-                        for guest in vmlist:
-                            if guest not in keys_dict.keys():
-                                log.info('recreating: ' + guest)
-                                full_name = misc.canonicalize_hostname(guest)
-                                provision.destroy_if_vm(ctx, full_name)
-                                provision.create_if_vm(ctx, full_name)
-                if lock.do_update_keys(keys_dict):
-                    log.info("Error in virtual machine keys")
-                newscandict = {}
-                for dkey in all_locked.iterkeys():
-                    stats = lockstatus.get_status(dkey)
-                    newscandict[dkey] = stats['ssh_pub_key']
-                ctx.config['targets'] = newscandict
+                    continue
+                else:
+                    assert 0, ('not enough machines free; need %s + %s, have %s' %
+                               (reserved, requested, len(machines)))
+
+            try:
+                newly_locked = lock.lock_many(ctx, requested, machine_type,
+                                              ctx.owner, ctx.archive, os_type,
+                                              os_version, arch)
+            except Exception:
+                # Lock failures should map to the 'dead' status instead of 'fail'
+                set_status(ctx.summary, 'dead')
+                raise
+            all_locked.update(newly_locked)
+            log.info(
+                '{newly_locked} {mtype} machines locked this try, '
+                '{total_locked}/{total_requested} locked so far'.format(
+                    newly_locked=len(newly_locked),
+                    mtype=machine_type,
+                    total_locked=len(all_locked),
+                    total_requested=total_requested,
+                )
+            )
+            if len(all_locked) == total_requested:
+                # let the next job in line go ahead while our VMs boot
+                if demand:
+                    demand.unregister()
+                vmlist = []
+                for lmach in all_locked:
+                    if misc.is_vm(lmach):
+                        vmlist.append(lmach)
+                if vmlist:
+                    keys_dict = wait_for_vms(ctx, vmlist)
+                    if lock.do_update_keys(vmlist, keys_dict=keys_dict):
+                        log.info("Error in virtual machine keys")
+                    targets = dict(all_locked)
+                    for vm in vmlist:
+                        name = misc.canonicalize_hostname(vm, user=None)
+                        targets[vm] = keys_dict[name]
+                    ctx.config['targets'] = targets
+                else:
+                    ctx.config['targets'] = all_locked
+                locked_targets = yaml.safe_dump(
+                    ctx.config['targets'],
+                    default_flow_style=False
+                ).splitlines()
+                log.info('\n  '.join(['Locked targets:', ] + locked_targets))
+                # successfully locked machines, change status back to running
+                report.try_push_job_info(ctx.config, dict(status='running'))
+                break
+            elif not ctx.block:
+                assert 0, 'not enough machines are available'
             else:
-                ctx.config['targets'] = all_locked
-            locked_targets = yaml.safe_dump(
-                ctx.config['targets'],
-                default_flow_style=False
-            ).splitlines()
-            log.info('\n  '.join(['Locked targets:', ] + locked_targets))
-            # successfully locked machines, change status back to running
-            report.try_push_job_info(ctx.config, dict(status='running'))
-            break
-        elif not ctx.block:
-            assert 0, 'not enough machines are available'
-        else:
-            requested = requested - len(newly_locked)
-            assert requested > 0, "lock_machines: requested counter went" \
-                                  "negative, this shouldn't happen"
-
-        log.info(
-            "{total} machines locked ({new} new); need {more} more".format(
-                total=len(all_locked), new=len(newly_locked), more=requested)
-        )
-        log.warn('Could not lock enough machines, waiting...')
-        time.sleep(10)
+                requested = requested - len(newly_locked)
+                assert requested > 0, "lock_machines: requested counter went" \
+                                      "negative, this shouldn't happen"
+
+            log.info(
+                "{total} machines locked ({new} new); need {more} more".format(
+                    total=len(all_locked), new=len(newly_locked), more=requested)
+            )
+            log.warn('Could not lock enough machines, waiting...')
+            time.sleep(10)
+    finally:
+        if demand:
+            demand.unregister()
     try:
         yield
     finally:
@@ -156,3 +162,54 @@ def lock_machines(ctx, config):
             log.info('Unlocking machines...')
             for machine in ctx.config['targets'].iterkeys():
                 lock.unlock_one(ctx, machine, ctx.owner, ctx.archive)
+
+
+def wait_for_vms(ctx, vmlist, interval=10, recreate_after=400):
+    """
+    Wait for virtual machines to accept SSH connections
+
+    Each scan only looks at the machines that have not answered yet. A
+    machine that has not answered within recreate_after seconds of being
+    created is destroyed and created again; all such machines are recreated
+    at the same time.
+
+    :param vmlist:         The locked names of the virtual machines
+    :param interval:       Seconds to wait between scans
+    :param recreate_after: Seconds to wait for a machine before recreating it
+    :returns:              A dict mapping the canonical hostname of each
+                           machine to its SSH host key, as returned by
+                           misc.ssh_keyscan()
+    """
+    log.info('Waiting for virtual machines to come up')
+    keys_dict = dict()
+    pending = dict(
+        (misc.canonicalize_hostname(vm, user=None), time.time())
+        for vm in vmlist
+    )
+    while True:
+        for name, key in misc.ssh_keyscan(pending.keys()).iteritems():
+            keys_dict[name] = key
+            pending.pop(name, None)
+        if not pending:
+            return keys_dict
+        log.info('virtual machine(s) still unavailable: %s',
+                 ', '.join(sorted(pending)))
+        now = time.time()
+        stragglers = [name for name, since in pending.iteritems()
+                      if now - since >= recreate_after]
+        if stragglers:
+            log.info('recreating unresponsive virtual machine(s): %s',
+                     ', '.join(sorted(stragglers)))
+            with parallel() as p:
+                for name in stragglers:
+                    p.spawn(_recreate_vm, ctx, name)
+            now = time.time()
+            for name in stragglers:
+                pending[name] = now
+        time.sleep(interval)
+
+
+def _recreate_vm(ctx, name):
+    full_name = misc.canonicalize_hostname(name)
+    provision.destroy_if_vm(ctx, full_name)
+    provision.create_if_vm(ctx, full_name)
@@ -7,10 +7,12 @@ import logging
 import os
 import re
 import shlex
+import time
 import urlparse
 
 from teuthology import misc as teuthology
 from teuthology.config import config as teuth_config
+from teuthology.parallel import parallel
 from ..orchestra import run
 from ..exceptions import (
     UnsupportedPackageTypeError,
@@ -214,66 +216,78 @@ def install_firmware(ctx, config):
     :param ctx: Context
     :param config: Configuration
     """
+    for src in config.itervalues():
+        if isinstance(src, str) and src.find('distro') >= 0:
+            log.info('Skipping firmware on distro kernel');
+            return
+    with parallel() as p:
+        for role in config.iterkeys():
+            p.spawn(_install_firmware_one, ctx, role)
+
+
+def _install_firmware_one(ctx, role):
+    """
+    Install the latest firmware on the remote for role.
+
+    :param ctx: Context
+    :param role: Role
+    """
     linux_firmware_git_upstream = 'git://git.kernel.org/pub/scm/linux/kernel/git/firmware/linux-firmware.git'
     uri = teuth_config.linux_firmware_git_url or linux_firmware_git_upstream
     fw_dir = '/lib/firmware/updates'
 
-    for role in config.iterkeys():
-        if isinstance(config[role], str) and config[role].find('distro') >= 0:
-            log.info('Skipping firmware on distro kernel');
-            return
-        (role_remote,) = ctx.cluster.only(role).remotes.keys()
-        package_type = role_remote.os.package_type
-        if package_type == 'rpm':
-            role_remote.run(args=[
-                'sudo', 'yum', 'upgrade', '-y', 'linux-firmware',
-            ])
-            continue
-        log.info('Installing linux-firmware on {role}...'.format(role=role))
-        role_remote.run(
-            args=[
-                # kludge around mysterious 0-byte .git/HEAD files
-                'cd', fw_dir,
-                run.Raw('&&'),
-                'test', '-d', '.git',
-                run.Raw('&&'),
-                'test', '!', '-s', '.git/HEAD',
-                run.Raw('&&'),
-                'sudo', 'rm', '-rf', '.git',
-                run.Raw(';'),
-                # init
-                'sudo', 'install', '-d', '-m0755', fw_dir,
-                run.Raw('&&'),
-                'cd', fw_dir,
-                run.Raw('&&'),
-                'sudo', 'git', 'init',
-                ],
-            )
-        role_remote.run(
-            args=[
-                'sudo', 'git', '--git-dir=%s/.git' % fw_dir, 'config',
-                '--get', 'remote.origin.url', run.Raw('>/dev/null'),
-                run.Raw('||'),
-                'sudo', 'git', '--git-dir=%s/.git' % fw_dir,
-                'remote', 'add', 'origin', uri,
-                ],
-            )
-        # In case the remote already existed, set its url
-        role_remote.run(
-                args=[
-                    'sudo', 'git', '--git-dir=%s/.git' % fw_dir, 'remote',
-                    'set-url', 'origin', uri, run.Raw('>/dev/null')
-                    ]
-                )
-        role_remote.run(
+    (role_remote,) = ctx.cluster.only(role).remotes.keys()
+    package_type = role_remote.os.package_type
+    if package_type == 'rpm':
+        role_remote.run(args=[
+            'sudo', 'yum', 'upgrade', '-y', 'linux-firmware',
+        ])
+        return
+    log.info('Installing linux-firmware on {role}...'.format(role=role))
+    role_remote.run(
+        args=[
+            # kludge around mysterious 0-byte .git/HEAD files
+            'cd', fw_dir,
+            run.Raw('&&'),
+            'test', '-d', '.git',
+            run.Raw('&&'),
+            'test', '!', '-s', '.git/HEAD',
+            run.Raw('&&'),
+            'sudo', 'rm', '-rf', '.git',
+            run.Raw(';'),
+            # init
+            'sudo', 'install', '-d', '-m0755', fw_dir,
+            run.Raw('&&'),
+            'cd', fw_dir,
+            run.Raw('&&'),
+            'sudo', 'git', 'init',
+            ],
+        )
+    role_remote.run(
+        args=[
+            'sudo', 'git', '--git-dir=%s/.git' % fw_dir, 'config',
+            '--get', 'remote.origin.url', run.Raw('>/dev/null'),
+            run.Raw('||'),
+            'sudo', 'git', '--git-dir=%s/.git' % fw_dir,
+            'remote', 'add', 'origin', uri,
+            ],
+        )
+    # In case the remote already existed, set its url
+    role_remote.run(
             args=[
-                'cd', fw_dir,
-                run.Raw('&&'),
-                'sudo', 'git', 'fetch', 'origin',
-                run.Raw('&&'),
-                'sudo', 'git', 'reset', '--hard', 'origin/master'
-                ],
+                'sudo', 'git', '--git-dir=%s/.git' % fw_dir, 'remote',
+                'set-url', 'origin', uri, run.Raw('>/dev/null')
+                ]
             )
+    role_remote.run(
+        args=[
+            'cd', fw_dir,
+            run.Raw('&&'),
+            'sudo', 'git', 'fetch', 'origin',
+            run.Raw('&&'),
+            'sudo', 'git', 'reset', '--hard', 'origin/master'
+            ],
+        )
 
 
 def gitbuilder_pkg_name(remote):
@@ -305,119 +319,124 @@ def download_kernel(ctx, config):
     :param ctx: Context
     :param config: Configuration
     """
-    procs = {}
-    for role, src in config.iteritems():
-        needs_download = False
+    with parallel() as p:
+        for role, src in config.iteritems():
+            p.spawn(_download_kernel_one, ctx, role, src)
 
-        if src == 'distro':
-            # don't need to download distro kernels
-            log.debug("src is distro, skipping download");
-            continue
 
-        (role_remote,) = ctx.cluster.only(role).remotes.keys()
-        if isinstance(src, dict):
-            # we're downloading a kernel from koji, the src dict here
-            # is the build_info retrieved from koji using get_koji_build_info
-            if src.get("id"):
-                build_id = src["id"]
-                log.info("Downloading kernel with build_id {build_id} on {role}...".format(
-                    build_id=build_id,
-                    role=role
-                ))
-                needs_download = True
-                baseurl = get_kojiroot_base_url(src)
-                pkg_name = get_koji_package_name("kernel", src)
-            elif src.get("task_id"):
-                needs_download = True
-                log.info("Downloading kernel with task_id {task_id} on {role}...".format(
-                    task_id=src["task_id"],
-                    role=role
-                ))
-                baseurl = src["base_url"]
-                # this var is also poorly named as it's not the package name,
-                # but the full name of the rpm file to download.
-                pkg_name = src["rpm_name"]
-        elif src.find('/') >= 0:
-            # local package - src is path
-            log.info('Copying kernel package {path} to {role}...'.format(
-                path=src, role=role))
-            f = open(src, 'r')
-            proc = role_remote.run(
+def _download_kernel_one(ctx, role, src):
+    """
+    Supply the remote for role with a kernel package, as download_kernel()
+    does. Downloads go straight from the builder to the remote.
+
+    :param ctx: Context
+    :param role: Role
+    :param src: The kernel to install, as in download_kernel()'s config
+    """
+    needs_download = False
+
+    if src == 'distro':
+        # don't need to download distro kernels
+        log.debug("src is distro, skipping download");
+        return
+
+    (role_remote,) = ctx.cluster.only(role).remotes.keys()
+    if isinstance(src, dict):
+        # we're downloading a kernel from koji, the src dict here
+        # is the build_info retrieved from koji using get_koji_build_info
+        if src.get("id"):
+            build_id = src["id"]
+            log.info("Downloading kernel with build_id {build_id} on {role}...".format(
+                build_id=build_id,
+                role=role
+            ))
+            needs_download = True
+            baseurl = get_kojiroot_base_url(src)
+            pkg_name = get_koji_package_name("kernel", src)
+        elif src.get("task_id"):
+            needs_download = True
+            log.info("Downloading kernel with task_id {task_id} on {role}...".format(
+                task_id=src["task_id"],
+                role=role
+            ))
+            baseurl = src["base_url"]
+            # this var is also poorly named as it's not the package name,
+            # but the full name of the rpm file to download.
+            pkg_name = src["rpm_name"]
+    elif src.find('/') >= 0:
+        # local package - src is path
+        log.info('Copying kernel package {path} to {role}...'.format(
+            path=src, role=role))
+        with open(src, 'r') as f:
+            role_remote.run(
                 args=[
                     'python', '-c',
                     'import shutil, sys; shutil.copyfileobj(sys.stdin, file(sys.argv[1], "wb"))',
                     remote_pkg_path(role_remote),
                     ],
-                wait=False,
                 stdin=f
                 )
-            procs[role_remote.name] = proc
+    else:
+        # gitbuilder package - src is sha1
+        log.info('Downloading kernel {sha1} on {role}...'.format(
+            sha1=src,
+            role=role,
+        ))
+        needs_download = True
+
+        builder = get_builder_project()(
+            'kernel',
+            {'sha1': src},
+            ctx=ctx,
+            remote=role_remote,
+        )
+        if teuth_config.use_shaman:
+            if role_remote.os.package_type == 'rpm':
+                arch = builder.arch
+                baseurl = urlparse.urljoin(
+                    builder.base_url,
+                    '/'.join([arch, ''])
+                )
+                pkg_name = "kernel-%s.%s.rpm" % (
+                    builder.version,
+                    arch,
+                )
+            elif role_remote.os.package_type == 'deb':
+                arch = 'amd64'  # FIXME
+                baseurl = urlparse.urljoin(
+                    builder.base_url,
+                    '/'.join([
+                        'pool', 'main', 'l',
+                        'linux-%s' % builder.scm_version, ''
+                    ])
+                )
+                pkg_name = 'linux-image-%s_%s_%s.deb' % (
+                    builder.scm_version,
+                    builder.version,
+                    arch,
+                )
         else:
-            # gitbuilder package - src is sha1
-            log.info('Downloading kernel {sha1} on {role}...'.format(
-                sha1=src,
-                role=role,
-            ))
-            needs_download = True
+            baseurl = builder.base_url + "/"
+            pkg_name = gitbuilder_pkg_name(role_remote)
 
-            builder = get_builder_project()(
-                'kernel',
-                {'sha1': src},
-                ctx=ctx,
-                remote=role_remote,
-            )
-            if teuth_config.use_shaman:
-                if role_remote.os.package_type == 'rpm':
-                    arch = builder.arch
-                    baseurl = urlparse.urljoin(
-                        builder.base_url,
-                        '/'.join([arch, ''])
-                    )
-                    pkg_name = "kernel-%s.%s.rpm" % (
-                        builder.version,
-                        arch,
-                    )
-                elif role_remote.os.package_type == 'deb':
-                    arch = 'amd64'  # FIXME
-                    baseurl = urlparse.urljoin(
-                        builder.base_url,
-                        '/'.join([
-                            'pool', 'main', 'l',
-                            'linux-%s' % builder.scm_version, ''
-                        ])
-                    )
-                    pkg_name = 'linux-image-%s_%s_%s.deb' % (
-                        builder.scm_version,
-                        builder.version,
-                        arch,
-                    )
-            else:
-                baseurl = builder.base_url + "/"
-                pkg_name = gitbuilder_pkg_name(role_remote)
-
-            log.info("fetching, builder baseurl is %s", baseurl)
-
-        if needs_download:
-            proc = role_remote.run(
-                args=[
-                    'rm', '-f', remote_pkg_path(role_remote),
-                    run.Raw('&&'),
-                    'echo',
-                    pkg_name,
-                    run.Raw('|'),
-                    'wget',
-                    '-nv',
-                    '-O',
-                    remote_pkg_path(role_remote),
-                    '--base={url}'.format(url=baseurl),
-                    '--input-file=-',
-                    ],
-                wait=False)
-            procs[role_remote.name] = proc
+        log.info("fetching, builder baseurl is %s", baseurl)
 
-    for name, proc in procs.iteritems():
-        log.debug('Waiting for download/copy to %s to complete...', name)
-        proc.wait()
+    if needs_download:
+        role_remote.run(
+            args=[
+                'rm', '-f', remote_pkg_path(role_remote),
+                run.Raw('&&'),
+                'echo',
+                pkg_name,
+                run.Raw('|'),
+                'wget',
+                '-nv',
+                '-O',
+                remote_pkg_path(role_remote),
+                '--base={url}'.format(url=baseurl),
+                '--input-file=-',
+                ],
+            )
 
 
 def _no_grub_link(in_file, remote, kernel_ver):
@@ -453,152 +472,161 @@ def install_and_reboot(ctx, config):
     :param ctx: Context
     :param config: Configuration
     """
-    procs = {}
+    with parallel() as p:
+        for role, src in config.iteritems():
+            p.spawn(_install_and_reboot_one, ctx, role, src)
+
+
+def _install_and_reboot_one(ctx, role, src):
+    """
+    Install the kernel on the remote for role and reboot it, as
+    install_and_reboot() does.
+
+    :param ctx: Context
+    :param role: Role
+    :param src: The kernel to install, as in install_and_reboot()'s config
+    """
     kernel_title = ''
-    for role, src in config.iteritems():
-        (role_remote,) = ctx.cluster.only(role).remotes.keys()
-        if isinstance(src, str) and src.find('distro') >= 0:
-            log.info('Installing distro kernel on {role}...'.format(role=role))
-            install_kernel(role_remote, version=src)
-            continue
-
-        log.info('Installing kernel {src} on {role}...'.format(src=src,
-                                                               role=role))
-        package_type = role_remote.os.package_type
-        if package_type == 'rpm':
-            proc = role_remote.run(
-                args=[
-                    'sudo',
-                    'rpm',
-                    '-ivh',
-                    '--oldpackage',
-                    '--replacefiles',
-                    '--replacepkgs',
-                    remote_pkg_path(role_remote),
-                ])
-            install_kernel(role_remote, remote_pkg_path(role_remote))
-            continue
+    (role_remote,) = ctx.cluster.only(role).remotes.keys()
+    if isinstance(src, str) and src.find('distro') >= 0:
+        log.info('Installing distro kernel on {role}...'.format(role=role))
+        install_kernel(role_remote, version=src)
+        return
 
-        # TODO: Refactor this into install_kernel() so that it handles all
-        # cases for both rpm and deb packages.
+    log.info('Installing kernel {src} on {role}...'.format(src=src,
+                                                           role=role))
+    package_type = role_remote.os.package_type
+    if package_type == 'rpm':
         proc = role_remote.run(
             args=[
-                # install the kernel deb
                 'sudo',
-                'dpkg',
-                '-i',
+                'rpm',
+                '-ivh',
+                '--oldpackage',
+                '--replacefiles',
+                '--replacepkgs',
                 remote_pkg_path(role_remote),
-                ],
-            )
-
-        # collect kernel image name from the .deb
-        kernel_title = get_image_version(role_remote,
-                                         remote_pkg_path(role_remote))
-        log.info('searching for kernel {}'.format(kernel_title))
-
-        if kernel_title.endswith("-highbank"):
-            _no_grub_link('vmlinuz', role_remote, kernel_title)
-            _no_grub_link('initrd.img', role_remote, kernel_title)
-            proc = role_remote.run(
-                args=[
-                    'sudo',
-                    'shutdown',
-                    '-r',
-                    'now',
-                    ],
-                wait=False,
-            )
-            procs[role_remote.name] = proc
-            continue
+            ])
+        install_kernel(role_remote, remote_pkg_path(role_remote))
+        return
 
-        # look for menuentry for our kernel, and collect any
-        # submenu entries for their titles.  Assume that if our
-        # kernel entry appears later in the file than a submenu entry,
-        # it's actually nested under that submenu.  If it gets more
-        # complex this will totally break.
+    # TODO: Refactor this into install_kernel() so that it handles all
+    # cases for both rpm and deb packages.
+    proc = role_remote.run(
+        args=[
+            # install the kernel deb
+            'sudo',
+            'dpkg',
+            '-i',
+            remote_pkg_path(role_remote),
+            ],
+        )
 
-        cmdout = StringIO()
-        proc = role_remote.run(
-            args=[
-                'egrep',
-                '(submenu|menuentry.*' + kernel_title + ').*{',
-                '/boot/grub/grub.cfg'
-               ],
-            stdout = cmdout,
-            )
-        submenu_title = ''
-        default_title = ''
-        for l in cmdout.getvalue().split('\n'):
-            fields = shlex.split(l)
-            if len(fields) >= 2:
-                command, title = fields[:2]
-                if command == 'submenu':
-                    submenu_title = title + '>'
-                if command == 'menuentry':
-                    if title.endswith(kernel_title):
-                        default_title = title
-                        break
-        cmdout.close()
-        log.info('submenu_title:{}'.format(submenu_title))
-        log.info('default_title:{}'.format(default_title))
+    # collect kernel image name from the .deb
+    kernel_title = get_image_version(role_remote,
+                                     remote_pkg_path(role_remote))
+    log.info('searching for kernel {}'.format(kernel_title))
 
+    if kernel_title.endswith("-highbank"):
+        _no_grub_link('vmlinuz', role_remote, kernel_title)
+        _no_grub_link('initrd.img', role_remote, kernel_title)
         proc = role_remote.run(
             args=[
-                # use the title(s) to construct the content of
-                # the grub menu entry, so we can default to it.
-                '/bin/echo',
-                '-e',
-                r'cat <<EOF\nset default="' + submenu_title + \
-                    default_title + r'"\nEOF\n',
-                # make it look like an emacs backup file so
-                # unfortunately timed update-grub runs don't pick it
-                # up yet; use sudo tee so we are able to write to /etc
-                run.Raw('|'),
-                'sudo',
-                'tee',
-                '--',
-                '/etc/grub.d/01_ceph_kernel.tmp~',
-                run.Raw('>/dev/null'),
-                run.Raw('&&'),
-                'sudo',
-                'chmod',
-                'a+x',
-                '--',
-                '/etc/grub.d/01_ceph_kernel.tmp~',
-                run.Raw('&&'),
-                'sudo',
-                'mv',
-                '--',
-                '/etc/grub.d/01_ceph_kernel.tmp~',
-                '/etc/grub.d/01_ceph_kernel',
-                # update grub again so it accepts our default
-                run.Raw('&&'),
-                'sudo',
-                'update-grub',
-                run.Raw('&&'),
-                'rm',
-                remote_pkg_path(role_remote),
-                run.Raw('&&'),
-                # work around a systemd issue, where network gets shut down
-                # before ssh can close its session
-                run.Raw('('),
-                'sleep',
-                '1',
-                run.Raw('&&'),
                 'sudo',
                 'shutdown',
                 '-r',
                 'now',
-                run.Raw('&'),
-                run.Raw(')'),
                 ],
             wait=False,
-            )
-        procs[role_remote.name] = proc
-
-    for name, proc in procs.iteritems():
-        log.debug('Waiting for install on %s to complete...', name)
+        )
         proc.wait()
+        return
+
+    # look for menuentry for our kernel, and collect any
+    # submenu entries for their titles.  Assume that if our
+    # kernel entry appears later in the file than a submenu entry,
+    # it's actually nested under that submenu.  If it gets more
+    # complex this will totally break.
+
+    cmdout = StringIO()
+    proc = role_remote.run(
+        args=[
+            'egrep',
+            '(submenu|menuentry.*' + kernel_title + ').*{',
+            '/boot/grub/grub.cfg'
+           ],
+        stdout = cmdout,
+        )
+    submenu_title = ''
+    default_title = ''
+    for l in cmdout.getvalue().split('\n'):
+        fields = shlex.split(l)
+        if len(fields) >= 2:
+            command, title = fields[:2]
+            if command == 'submenu':
+                submenu_title = title + '>'
+            if command == 'menuentry':
+                if title.endswith(kernel_title):
+                    default_title = title
+                    break
+    cmdout.close()
+    log.info('submenu_title:{}'.format(submenu_title))
+    log.info('default_title:{}'.format(default_title))
+
+    proc = role_remote.run(
+        args=[
+            # use the title(s) to construct the content of
+            # the grub menu entry, so we can default to it.
+            '/bin/echo',
+            '-e',
+            r'cat <<EOF\nset default="' + submenu_title + \
+                default_title + r'"\nEOF\n',
+            # make it look like an emacs backup file so
+            # unfortunately timed update-grub runs don't pick it
+            # up yet; use sudo tee so we are able to write to /etc
+            run.Raw('|'),
+            'sudo',
+            'tee',
+            '--',
+            '/etc/grub.d/01_ceph_kernel.tmp~',
+            run.Raw('>/dev/null'),
+            run.Raw('&&'),
+            'sudo',
+            'chmod',
+            'a+x',
+            '--',
+            '/etc/grub.d/01_ceph_kernel.tmp~',
+            run.Raw('&&'),
+            'sudo',
+            'mv',
+            '--',
+            '/etc/grub.d/01_ceph_kernel.tmp~',
+            '/etc/grub.d/01_ceph_kernel',
+            # update grub again so it accepts our default
+            run.Raw('&&'),
+            'sudo',
+            'update-grub',
+            run.Raw('&&'),
+            'rm',
+            remote_pkg_path(role_remote),
+            run.Raw('&&'),
+            # work around a systemd issue, where network gets shut down
+            # before ssh can close its session
+            run.Raw('('),
+            'sleep',
+            '1',
+            run.Raw('&&'),
+            'sudo',
+            'shutdown',
+            '-r',
+            'now',
+            run.Raw('&'),
+            run.Raw(')'),
+            ],
+        wait=False,
+        )
+    log.debug('Waiting for install on %s to complete...', role_remote.name)
+    proc.wait()
 
 
 def enable_disable_kdb(ctx, config):
@@ -643,36 +671,48 @@ def enable_disable_kdb(ctx, config):
 
 def wait_for_reboot(ctx, need_install, timeout, distro=False):
     """
-    Loop reconnecting and checking kernel versions until
-    they're all correct or the timeout is exceeded.
+    Wait for each of the remotes to come back up and check their kernel
+    versions, until they're all correct or the timeout is exceeded. All
+    remotes are waited for at once.
 
     :param ctx: Context
-    :param need_install: list of packages that we need to reinstall.
+    :param need_install: dict mapping roles to the kernel versions they
+                         should be running
     :param timeout: number of second before we timeout.
     """
-    import time
-    starttime = time.time()
-    while need_install:
-        teuthology.reconnect(ctx, timeout)
-        for client in need_install.keys():
-            if 'distro' in str(need_install[client]):
-                 distro = True
+    with parallel() as p:
+        for client, version in need_install.iteritems():
+            p.spawn(_wait_for_reboot_one, ctx, client, version, timeout,
+                    distro=distro)
+
+
+def _wait_for_reboot_one(ctx, client, version, timeout, distro=False):
+    """
+    Loop reconnecting to the remote for client and checking its kernel
+    version, until it is correct or the timeout is exceeded. Reconnection
+    attempts are only made once the remote's SSH port accepts connections.
+    """
+    if 'distro' in str(version):
+        distro = True
+    (remote,) = ctx.cluster.only(client).remotes.keys()
+    deadline = time.time() + timeout
+    while True:
+        try:
+            teuthology.reconnect(ctx, max(deadline - time.time(), 0),
+                                 remotes=[remote])
             log.info('Checking client {client} for new kernel version...'.format(client=client))
-            try:
-                if distro:
-                    (remote,) = ctx.cluster.only(client).remotes.keys()
-                    assert not need_to_install_distro(remote), \
-                            'failed to install new distro kernel version within timeout'
-
-                else:
-                    assert not need_to_install(ctx, client, need_install[client]), \
-                            'failed to install new kernel version within timeout'
-                del need_install[client]
-            except Exception:
-                log.exception("Saw exception")
-                # ignore connection resets and asserts while time is left
-                if time.time() - starttime > timeout:
-                    raise
+            if distro:
+                assert not need_to_install_distro(remote), \
+                        'failed to install new distro kernel version within timeout'
+            else:
+                assert not need_to_install(ctx, client, version), \
+                        'failed to install new kernel version within timeout'
+            return
+        except Exception:
+            log.exception("Saw exception")
+            # ignore connection resets and asserts while time is left
+            if time.time() > deadline:
+                raise
         time.sleep(1)
 
 
@@ -1067,12 +1107,128 @@ def get_sha1_from_pkg_name(path):
 
 
 def remove_old_kernels(ctx):
-    for remote in ctx.cluster.remotes.keys():
-        package_type = remote.os.package_type
-        if package_type == 'rpm':
-            log.info("Removing old kernels from %s", remote)
-            args = ['sudo', 'package-cleanup', '-y', '--oldkernels']
-            remote.run(args=args)
+    with parallel() as p:
+        for remote in ctx.cluster.remotes.keys():
+            package_type = remote.os.package_type
+            if package_type == 'rpm':
+                log.info("Removing old kernels from %s", remote)
+                args = ['sudo', 'package-cleanup', '-y', '--oldkernels']
+                p.spawn(remote.run, args=args)
+
+
+def _get_install_info(ctx, role, role_config):
+    """
+    Work out whether the remote for role needs a new kernel.
+
+    :param ctx: Context
+    :param role: Role
+    :param role_config: The role's normalized kernel config
+    :returns: A (role, src, version) tuple. src is what to install (a sha1,
+              a path to a local package, 'distro' or a koji build_info dict)
+              and version is the utsrelease or sha1 to expect after the
+              reboot; both are None if no install is needed.
+    """
+    install_src = None
+    install_version = None
+    # gather information about this remote
+    (role_remote,) = ctx.cluster.only(role).remotes.keys()
+    system_type = role_remote.os.name
+    if role_config.get('rpm') or role_config.get('deb'):
+        # We only care about path - deb: vs rpm: is meaningless,
+        # rpm: just happens to be parsed first.  Nothing is stopping
+        # 'deb: /path/to/foo.rpm' and it will work provided remote's
+        # os.package_type is 'rpm' and vice versa.
+        path = role_config.get('rpm')
+        if not path:
+            path = role_config.get('deb')
+        sha1 = get_sha1_from_pkg_name(path)
+        assert sha1, "failed to extract commit hash from path %s" % path
+        if need_to_install(ctx, role, sha1):
+            install_src = path
+            install_version = sha1
+    elif role_config.get('sha1') == 'distro':
+        version = need_to_install_distro(role_remote)
+        if version:
+            install_src = 'distro'
+            install_version = version
+    elif role_config.get("koji") or role_config.get('koji_task'):
+        # installing a kernel from koji
+        build_id = role_config.get("koji")
+        task_id = role_config.get("koji_task")
+        if role_remote.os.package_type != "rpm":
+            msg = (
+                "Installing a kernel from koji is only supported "
+                "on rpm based systems. System type is {system_type}."
+            )
+            msg = msg.format(system_type=system_type)
+            log.error(msg)
+            ctx.summary["failure_reason"] = msg
+            ctx.summary["status"] = "dead"
+            raise ConfigError(msg)
+
+        # FIXME: this install should probably happen somewhere else
+        # but I'm not sure where, so we'll leave it here for now.
+        install_package('koji', role_remote)
+
+        if build_id:
+            # get information about this build from koji
+            build_info = get_koji_build_info(build_id, role_remote, ctx)
+            version = "{ver}-{rel}.x86_64".format(
+                ver=build_info["version"],
+                rel=build_info["release"]
+            )
+        elif task_id:
+            # get information about results of this task from koji
+            task_result = get_koji_task_result(task_id, role_remote, ctx)
+            # this is not really 'build_info', it's a dict of information
+            # about the kernel rpm from the task results, but for the sake
+            # of reusing the code below I'll still call it that.
+            build_info = get_koji_task_rpm_info(
+                'kernel',
+                task_result['rpms']
+            )
+            # add task_id so we can know later that we're installing
+            # from a task and not a build.
+            build_info["task_id"] = task_id
+            version = build_info["version"]
+
+        if need_to_install(ctx, role, version):
+            install_src = build_info
+            install_version = version
+    else:
+        builder = get_builder_project()(
+            "kernel",
+            role_config,
+            ctx=ctx,
+            remote=role_remote,
+        )
+        sha1 = builder.sha1
+        log.debug('sha1 for {role} is {sha1}'.format(role=role, sha1=sha1))
+        ctx.summary['{role}-kernel-sha1'.format(role=role)] = sha1
+
+        if need_to_install(ctx, role, sha1):
+            if teuth_config.use_shaman:
+                version = builder.scm_version
+            else:
+                version = builder.version
+            if not version:
+                raise VersionNotFoundError(builder.base_url)
+            install_src = sha1
+            install_version = version
+    return (role, install_src, install_version)
+
+
+def _install_role(ctx, role, src, version, timeout, firmware=True):
+    """
+    Install the kernel for one role, reboot into it and wait for it to come
+    back, so that each remote moves on to its next step as soon as it is
+    ready instead of waiting for the slowest remote at every step.
+    """
+    if firmware:
+        _install_firmware_one(ctx, role)
+    _download_kernel_one(ctx, role, src)
+    _install_and_reboot_one(ctx, role, src)
+    _wait_for_reboot_one(ctx, role, version, timeout)
 
 
 def task(ctx, config):
@@ -1181,101 +1337,31 @@ def task(ctx, config):
 
     remove_old_kernels(ctx)
 
-    for role, role_config in config.iteritems():
-        # gather information about this remote
-        (role_remote,) = ctx.cluster.only(role).remotes.keys()
-        system_type = role_remote.os.name
-        if role_config.get('rpm') or role_config.get('deb'):
-            # We only care about path - deb: vs rpm: is meaningless,
-            # rpm: just happens to be parsed first.  Nothing is stopping
-            # 'deb: /path/to/foo.rpm' and it will work provided remote's
-            # os.package_type is 'rpm' and vice versa.
-            path = role_config.get('rpm')
-            if not path:
-                path = role_config.get('deb')
-            sha1 = get_sha1_from_pkg_name(path)
-            assert sha1, "failed to extract commit hash from path %s" % path
-            if need_to_install(ctx, role, sha1):
-                need_install[role] = path
-                need_version[role] = sha1
-        elif role_config.get('sha1') == 'distro':
-            version = need_to_install_distro(role_remote)
-            if version:
-                need_install[role] = 'distro'
-                need_version[role] = version
-        elif role_config.get("koji") or role_config.get('koji_task'):
-            # installing a kernel from koji
-            build_id = role_config.get("koji")
-            task_id = role_config.get("koji_task")
-            if role_remote.os.package_type != "rpm":
-                msg = (
-                    "Installing a kernel from koji is only supported "
-                    "on rpm based systems. System type is {system_type}."
-                )
-                msg = msg.format(system_type=system_type)
-                log.error(msg)
-                ctx.summary["failure_reason"] = msg
-                ctx.summary["status"] = "dead"
-                raise ConfigError(msg)
-
-            # FIXME: this install should probably happen somewhere else
-            # but I'm not sure where, so we'll leave it here for now.
-            install_package('koji', role_remote)
-
-            if build_id:
-                # get information about this build from koji
-                build_info = get_koji_build_info(build_id, role_remote, ctx)
-                version = "{ver}-{rel}.x86_64".format(
-                    ver=build_info["version"],
-                    rel=build_info["release"]
-                )
-            elif task_id:
-                # get information about results of this task from koji
-                task_result = get_koji_task_result(task_id, role_remote, ctx)
-                # this is not really 'build_info', it's a dict of information
-                # about the kernel rpm from the task results, but for the sake
-                # of reusing the code below I'll still call it that.
-                build_info = get_koji_task_rpm_info(
-                    'kernel',
-                    task_result['rpms']
-                )
-                # add task_id so we can know later that we're installing
-                # from a task and not a build.
-                build_info["task_id"] = task_id
-                version = build_info["version"]
-
-            if need_to_install(ctx, role, version):
-                need_install[role] = build_info
-                need_version[role] = version
-        else:
-            builder = get_builder_project()(
-                "kernel",
-                role_config,
-                ctx=ctx,
-                remote=role_remote,
-            )
-            sha1 = builder.sha1
-            log.debug('sha1 for {role} is {sha1}'.format(role=role, sha1=sha1))
-            ctx.summary['{role}-kernel-sha1'.format(role=role)] = sha1
-
-            if need_to_install(ctx, role, sha1):
-                if teuth_config.use_shaman:
-                    version = builder.scm_version
-                else:
-                    version = builder.version
-                if not version:
-                    raise VersionNotFoundError(builder.base_url)
-                need_install[role] = sha1
+    # Resolve the kernel for every role at once; this involves querying the
+    # builders as well as the remotes
+    with parallel() as p:
+        for role, role_config in config.iteritems():
+            p.spawn(_get_install_info, ctx, role, role_config)
+        for role, src, version in p:
+            if src is not None:
+                need_install[role] = src
                 need_version[role] = version
 
+    for role, role_config in config.iteritems():
         # enable or disable kdb if specified, otherwise do not touch
         if role_config.get('kdb') is not None:
             kdb[role] = role_config.get('kdb')
 
     if need_install:
-        install_firmware(ctx, need_install)
-        download_kernel(ctx, need_install)
-        install_and_reboot(ctx, need_install)
-        wait_for_reboot(ctx, need_version, timeout)
+        firmware = not any(
+            isinstance(src, str) and src.find('distro') >= 0
+            for src in need_install.itervalues()
+        )
+        if not firmware:
+            log.info('Skipping firmware on distro kernel')
+        with parallel() as p:
+            for role, src in need_install.iteritems():
+                p.spawn(_install_role, ctx, role, src, need_version[role],
+                        timeout, firmware=firmware)
 
     enable_disable_kdb(ctx, kdb)
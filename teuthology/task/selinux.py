@@ -7,7 +7,7 @@ from teuthology.exceptions import SELinuxError
 from teuthology.misc import get_archive_dir
 from teuthology.orchestra.cluster import Cluster
 from teuthology.orchestra import run
-from teuthology.lockstatus import get_status
+from teuthology.lockstatus import get_statuses
 
 from . import Task
 
@@ -50,8 +50,10 @@ class SELinux(Task):
         """
         super(SELinux, self).filter_hosts()
         new_cluster = Cluster()
+        statuses = get_statuses(
+            [remote.name for remote in self.cluster.remotes.keys()])
         for (remote, roles) in self.cluster.remotes.iteritems():
-            status_info = get_status(remote.name)
+            status_info = statuses[remote.name]
             if status_info and status_info.get('is_vm', False):
                 msg = "Excluding {host}: VMs are not yet supported"
                 log.info(msg.format(host=remote.shortname))
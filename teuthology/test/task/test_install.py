@@ -47,25 +47,25 @@ class TestInstall(object):
         assert result['deb'] == default_pkgs['deb']
 
     @patch("teuthology.task.install._get_builder_project")
-    @patch("teuthology.task.install.packaging.get_package_version")
-    def test_verify_ceph_version_success(self, m_get_package_version,
+    @patch("teuthology.task.install.packaging.get_package_versions")
+    def test_verify_ceph_version_success(self, m_get_package_versions,
                                          m_gitbuilder_project):
         gb = Mock()
         gb.version = "0.89.0"
         gb.project = "ceph"
         m_gitbuilder_project.return_value = gb
-        m_get_package_version.return_value = "0.89.0"
+        m_get_package_versions.return_value = dict(ceph="0.89.0")
         install.verify_package_version(Mock(), Mock(), Mock())
 
     @patch("teuthology.task.install._get_builder_project")
-    @patch("teuthology.task.install.packaging.get_package_version")
-    def test_verify_ceph_version_failed(self, m_get_package_version,
+    @patch("teuthology.task.install.packaging.get_package_versions")
+    def test_verify_ceph_version_failed(self, m_get_package_versions,
                                         m_gitbuilder_project):
         gb = Mock()
         gb.version = "0.89.0"
         gb.project = "ceph"
         m_gitbuilder_project.return_value = gb
-        m_get_package_version.return_value = "0.89.1"
+        m_get_package_versions.return_value = dict(ceph="0.89.1")
         config = Mock()
         # when it looks for config.get('extras') it won't find it
         config.get.return_value = False
@@ -73,19 +73,54 @@ class TestInstall(object):
             install.verify_package_version(Mock(), config, Mock())
 
     @patch("teuthology.task.install._get_builder_project")
-    @patch("teuthology.task.install.packaging.get_package_version")
-    def test_skip_when_using_ceph_deploy(self, m_get_package_version,
+    @patch("teuthology.task.install.packaging.get_package_versions")
+    def test_skip_when_using_ceph_deploy(self, m_get_package_versions,
                                          m_gitbuilder_project):
         gb = Mock()
         gb.version = "0.89.0"
         gb.project = "ceph"
         m_gitbuilder_project.return_value = gb
         # ceph isn't installed because ceph-deploy would install it
-        m_get_package_version.return_value = None
+        m_get_package_versions.return_value = dict(ceph=None)
         config = Mock()
         config.extras = True
         install.verify_package_version(Mock(), config, Mock())
 
+    @patch("teuthology.task.install._get_builder_project")
+    @patch("teuthology.task.install.packaging.get_package_versions")
+    def test_verify_queries_all_packages_once(self, m_get_package_versions,
+                                              m_gitbuilder_project):
+        gb = Mock()
+        gb.version = "0.89.0"
+        gb.project = "ceph"
+        m_gitbuilder_project.return_value = gb
+        m_get_package_versions.return_value = dict(
+            ceph="0.89.0-1", librados2="0.89.0-1")
+        remote = Mock()
+        install.verify_package_version(
+            Mock(), dict(), remote, pkgs=['librados2', 'ceph'])
+        m_get_package_versions.assert_called_once_with(
+            remote, ['ceph', 'librados2'])
+
+    @patch("teuthology.task.install.verify_package_version")
+    @patch("teuthology.task.install.teuthology.get_system_type")
+    def test_install_packages_verifies_each_remote(self, m_get_system_type,
+                                                   m_verify_package_version):
+        m_get_system_type.return_value = 'deb'
+        remotes = [Mock(), Mock()]
+        ctx = Mock()
+        ctx.cluster.remotes = dict((r, []) for r in remotes)
+        config = dict()
+        pkgs = dict(deb=['ceph'], rpm=['ceph'])
+        with patch.object(install.deb,
+                          '_update_package_list_and_install') as m_install:
+            install.install_packages(ctx, pkgs, config)
+        assert m_install.call_count == 2
+        assert m_verify_package_version.call_count == 2
+        for remote in remotes:
+            m_verify_package_version.assert_any_call(
+                ctx, config, remote, pkgs=['ceph'])
+
     def test_get_flavor_default(self):
         config = dict()
         assert install.get_flavor(config) == 'basic'
@@ -297,3 +332,250 @@ class TestInstall(object):
         with pytest.raises(RuntimeError) as e:
             install.redhat.install_pkgs(ctx, remote, version, rh_ds_yaml)
         assert "Version check failed" in str(e)
+
+
+class TestPackageCache(object):
+    def _make_remote(self, name, os_name='ubuntu', version='16.04'):
+        remote = Mock()
+        remote.name = 'user@' + name
+        remote.os.package_type = 'deb'
+        remote.os.name = os_name
+        remote.os.version = version
+        remote.arch = 'x86_64'
+        return remote
+
+    def test_get_cache_config(self):
+        assert install.cache.get_cache_config(dict()) is None
+        assert install.cache.get_cache_config(
+            dict(package_cache=True)) == dict(port=8089)
+        assert install.cache.get_cache_config(
+            dict(package_cache=dict(port=80))) == dict(port=80)
+
+    def test_group_remotes(self):
+        remotes = [
+            self._make_remote('b'),
+            self._make_remote('a'),
+            self._make_remote('c', version='14.04'),
+        ]
+        groups = install.cache.group_remotes(remotes)
+        assert len(groups) == 2
+        group = groups[('deb', 'ubuntu', '16.04', 'x86_64', None)]
+        assert [r.name for r in group] == ['user@a', 'user@b']
+        groups = install.cache.group_remotes(
+            remotes, {'user@a': 'http://host/sha1/abc/',
+                      'user@b': 'http://host/sha1/def/'})
+        assert len(groups) == 3
+
+    def test_get_mirror_args(self):
+        args = install.cache.get_mirror_args(
+            'http://host/ceph-deb-xenial-x86_64-basic/sha1/abc', '/cache')
+        assert '--cut-dirs=3' in args
+        assert 'http://host/ceph-deb-xenial-x86_64-basic/sha1/abc/' in args
+        reject = args[args.index('--reject') + 1]
+        assert '*-dbg_*' in reject
+        args = install.cache.get_mirror_args(
+            'http://host/repo/', '/cache', debuginfo=True)
+        assert '--cut-dirs=1' in args
+        assert '*-dbg_*' not in args[args.index('--reject') + 1]
+
+    def test_use_cache(self):
+        ctx = Mock()
+        remote = self._make_remote('a')
+        builder = Mock()
+        builder.project = 'ceph'
+        builder.base_url = 'http://host/ceph/sha1/abc/'
+        ctx.package_cache = dict()
+        install.cache.use_cache(ctx, remote, builder)
+        assert not remote.run.called
+        ctx.package_cache = {remote.name: 'http://1.2.3.4:8089/'}
+        install.cache.use_cache(ctx, remote, builder)
+        args = remote.run.call_args[1]['args']
+        assert 's|http://host/ceph/sha1/abc|http://1.2.3.4:8089|g' in args
+        assert '/etc/apt/sources.list.d/ceph.list' in args
+
+    @patch("teuthology.task.install.cache.stop_cache")
+    @patch("teuthology.task.install.cache.rewrite_repo")
+    @patch("teuthology.task.install.cache.start_cache")
+    @patch("teuthology.task.install.cache._get_builder_project")
+    def test_package_cache(self, m_get_builder, m_start_cache,
+                           m_rewrite_repo, m_stop_cache):
+        remotes = [
+            self._make_remote('a'),
+            self._make_remote('b'),
+            self._make_remote('c', version='14.04'),
+        ]
+        ctx = Mock()
+        ctx.cluster.remotes = dict((r, []) for r in remotes)
+        m_start_cache.return_value = 'http://cache:8089/'
+        m_get_builder.return_value.project = 'ceph'
+        with install.cache.package_cache(ctx, dict(package_cache=True)):
+            assert ctx.package_cache == {
+                'user@a': 'http://cache:8089/',
+                'user@b': 'http://cache:8089/',
+            }
+        assert m_start_cache.call_count == 1
+        assert m_start_cache.call_args[0][2] is remotes[0]
+        assert m_rewrite_repo.call_count == 2
+        m_stop_cache.assert_called_once_with(
+            remotes[0], '/var/cache/teuthology-packages/ceph')
+        assert ctx.package_cache == dict()
+
+    @patch("teuthology.task.install.cache.stop_cache")
+    @patch("teuthology.task.install.cache.rewrite_repo")
+    @patch("teuthology.task.install.cache.start_cache")
+    @patch("teuthology.task.install.cache._get_builder_project")
+    def test_package_cache_failures(self, m_get_builder, m_start_cache,
+                                    m_rewrite_repo, m_stop_cache):
+        remotes = [
+            self._make_remote('a'),
+            self._make_remote('b'),
+            self._make_remote('c', version='14.04'),
+            self._make_remote('d', version='14.04'),
+        ]
+        ctx = Mock()
+        ctx.cluster.remotes = dict((r, []) for r in remotes)
+
+        def start_cache(ctx, config, remote, port):
+            if remote is remotes[0]:
+                raise RuntimeError("serving failed")
+            return 'http://cache:8089/'
+        m_start_cache.side_effect = start_cache
+        m_get_builder.return_value.project = 'ceph'
+        with install.cache.package_cache(ctx, dict(package_cache=True)):
+            assert ctx.package_cache == {
+                'user@c': 'http://cache:8089/',
+                'user@d': 'http://cache:8089/',
+            }
+        path = '/var/cache/teuthology-packages/ceph'
+        assert sorted(c[0] for c in m_stop_cache.call_args_list) == \
+            sorted([(remotes[0], path), (remotes[2], path)])
+
+    @patch("teuthology.task.install.cache.stop_cache")
+    @patch("teuthology.task.install.cache.rewrite_repo")
+    @patch("teuthology.task.install.cache.start_cache")
+    @patch("teuthology.task.install.cache._get_builder_project")
+    def test_package_cache_per_role_sha1(self, m_get_builder, m_start_cache,
+                                         m_rewrite_repo, m_stop_cache):
+        # Same distro, but b's role overrides the sha1
+        remotes = [
+            self._make_remote('a'),
+            self._make_remote('b'),
+            self._make_remote('c'),
+        ]
+        ctx = Mock()
+        ctx.cluster.remotes = dict((r, []) for r in remotes)
+        sha1s = {'user@a': 'abc', 'user@b': 'def', 'user@c': 'abc'}
+
+        def get_builder(ctx, remote, config):
+            builder = Mock()
+            builder.project = 'ceph'
+            builder.base_url = 'http://host/sha1/%s/' % sha1s[remote.name]
+            return builder
+        m_get_builder.side_effect = get_builder
+        m_start_cache.return_value = 'http://cache:8089/'
+        with install.cache.package_cache(ctx, dict(package_cache=True)):
+            assert ctx.package_cache == {
+                'user@a': 'http://cache:8089/',
+                'user@c': 'http://cache:8089/',
+            }
+        assert m_start_cache.call_count == 1
+        assert m_start_cache.call_args[0][2] is remotes[0]
+
+    @patch("teuthology.task.install.cache.start_cache")
+    @patch("teuthology.task.install.cache._get_builder_project")
+    def test_package_cache_no_builder(self, m_get_builder, m_start_cache):
+        remotes = [self._make_remote('a'), self._make_remote('b')]
+        ctx = Mock()
+        ctx.cluster.remotes = dict((r, []) for r in remotes)
+        m_get_builder.side_effect = RuntimeError("no builder")
+        with install.cache.package_cache(ctx, dict(package_cache=True)):
+            assert ctx.package_cache == dict()
+        assert not m_start_cache.called
+
+    @patch("teuthology.task.install.cache.start_cache")
+    def test_package_cache_disabled(self, m_start_cache):
+        ctx = Mock()
+        with install.cache.package_cache(ctx, dict()):
+            assert ctx.package_cache == dict()
+        assert not m_start_cache.called
+
+
+class TestInstallPackages(object):
+    def _make_builder(self, m_get_builder_project):
+        builder = Mock()
+        builder.version = '10.2.0-1'
+        builder.project = 'ceph'
+        builder.dist_release = 'el7'
+        m_get_builder_project.return_value = builder
+        return builder
+
+    def _make_ctx(self):
+        ctx = Mock()
+        ctx.package_cache = dict()
+        return ctx
+
+    @patch("teuthology.task.install.deb._get_outdated_packages")
+    @patch("teuthology.task.install.deb._get_builder_project")
+    def test_deb_skip_installed(self, m_get_builder_project,
+                                m_get_outdated_packages):
+        builder = self._make_builder(m_get_builder_project)
+        m_get_outdated_packages.return_value = []
+        remote = Mock()
+        install.deb._update_package_list_and_install(
+            self._make_ctx(), remote, ['ceph', 'librados2'], dict())
+        m_get_outdated_packages.assert_called_once_with(
+            remote, ['ceph', 'librados2'], '10.2.0-1')
+        assert builder.install_repo.called
+        assert not remote.run.called
+
+    @patch("teuthology.task.install.deb._get_outdated_packages")
+    @patch("teuthology.task.install.deb._get_builder_project")
+    def test_deb_install_outdated(self, m_get_builder_project,
+                                  m_get_outdated_packages):
+        self._make_builder(m_get_builder_project)
+        m_get_outdated_packages.return_value = ['librados2']
+        remote = Mock()
+        install.deb._update_package_list_and_install(
+            self._make_ctx(), remote, ['ceph', 'librados2'], dict())
+        args = remote.run.call_args[1]['args']
+        assert 'install' in args
+        assert args[-2:] == ['ceph=10.2.0-1', 'librados2=10.2.0-1']
+
+    @patch("teuthology.task.install.rpm._get_outdated_packages")
+    @patch("teuthology.task.install.rpm._get_builder_project")
+    def test_rpm_single_transaction(self, m_get_builder_project,
+                                    m_get_outdated_packages):
+        self._make_builder(m_get_builder_project)
+        m_get_outdated_packages.return_value = ['ceph']
+        remote = Mock()
+        remote.os.name = 'centos'
+        install.rpm._update_package_list_and_install(
+            self._make_ctx(), remote, ['ceph', 'librados2'], dict())
+        installs = [
+            c[1]['args'] for c in remote.run.call_args_list
+            if 'install' in c[1].get('args', [])
+        ]
+        assert installs == [
+            ['sudo', 'yum', '-y', 'install', '', 'ceph', 'librados2'],
+        ]
+
+    @patch("teuthology.task.install.rpm._get_local_dir")
+    @patch("teuthology.task.install.rpm._get_outdated_packages")
+    @patch("teuthology.task.install.rpm._get_builder_project")
+    def test_rpm_local_packages(self, m_get_builder_project,
+                                m_get_outdated_packages, m_get_local_dir):
+        self._make_builder(m_get_builder_project)
+        m_get_local_dir.return_value = '/tmp/local'
+        remote = Mock()
+        remote.os.name = 'centos'
+        with patch("teuthology.task.install.rpm.os.path.exists") as m_exists:
+            m_exists.side_effect = lambda path: path.endswith('librados2')
+            install.rpm._update_package_list_and_install(
+                self._make_ctx(), remote, ['ceph', 'librados2'], dict())
+        assert not m_get_outdated_packages.called
+        args = [c[1]['args'] for c in remote.run.call_args_list[-2:]]
+        assert args == [
+            ['sudo', 'yum', '-y', 'remove', '', '/tmp/local/librados2'],
+            ['sudo', 'yum', '-y', 'install', '', '/tmp/local/librados2',
+             'ceph'],
+        ]
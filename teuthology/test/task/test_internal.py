@@ -1,5 +1,8 @@
+from mock import Mock, patch
+
 from teuthology.config import FakeNamespace
 from teuthology.task import internal
+from teuthology.task.internal import lock_machines
 
 
 class TestInternal(object):
@@ -55,3 +58,103 @@ class TestInternal(object):
         assert internal.buildpackages_prep(self.ctx,
                                            self.ctx.config) == internal.BUILDPACKAGES_REMOVED
         assert self.ctx.config == {'tasks': []}
+
+    def test_get_archive_filter(self):
+        with patch.dict(internal.teuth_config._conf,
+                        archive_filter=dict(max_size=100, compress='gz')):
+            self.ctx.config = {'archive-filter': {'compress': 'zstd'}}
+            assert internal.get_archive_filter(self.ctx) == dict(
+                max_size=100, compress='zstd')
+
+    def test_get_archive_filter_script_empty(self):
+        assert internal.get_archive_filter_script('/archive', dict()) is None
+
+    def test_get_archive_filter_script(self):
+        script = internal.get_archive_filter_script(
+            '/archive',
+            dict(exclude=['*.asok', './sub/dir/*'], max_size=100,
+                 tail_size=10, compress_min_size=20),
+            'gz',
+        )
+        lines = script.splitlines()
+        assert lines[0] == 'cd /archive || exit 0'
+        assert "-name '*.asok' -o -path './sub/dir/*'" in lines[1]
+        assert lines[1].endswith('rm -f')
+        assert '-size +100c' in lines[2]
+        assert 'tail -c 10' in lines[2]
+        assert '-size +20c' in lines[3]
+        assert 'gzip -1 -c' in lines[3]
+        assert "'!' -name '*.gz'" in lines[3]
+        for line in lines[1:]:
+            assert line.startswith('find . -path ./coredump -prune -o')
+
+    @patch('teuthology.misc.facts.get')
+    def test_get_archive_filter_codec(self, m_get_facts):
+        m_get_facts.return_value = dict(compressors=['lz4'])
+        remote = Mock()
+        get_codec = internal.get_archive_filter_codec
+        assert get_codec(remote, dict()) is None
+        assert get_codec(remote, dict(compress=['zstd', 'lz4'])) == 'lz4'
+        assert get_codec(remote, dict(compress='zstd')) == 'gz'
+
+
+
+class TestWaitForVMs(object):
+    klass = 'teuthology.task.internal.lock_machines'
+
+    def setup(self):
+        self.ctx = FakeNamespace()
+        self.now = 0
+        self.patchers = dict(
+            keyscan=patch(self.klass + '.misc.ssh_keyscan'),
+            sleep=patch(self.klass + '.time.sleep'),
+            time=patch(self.klass + '.time.time'),
+            destroy=patch(self.klass + '.provision.destroy_if_vm'),
+            create=patch(self.klass + '.provision.create_if_vm'),
+            canonicalize=patch(self.klass + '.misc.canonicalize_hostname'),
+        )
+        self.mocks = dict(
+            (name, patcher.start())
+            for name, patcher in self.patchers.items()
+        )
+        self.mocks['time'].side_effect = lambda: self.now
+        self.mocks['sleep'].side_effect = self.sleep
+        self.mocks['canonicalize'].side_effect = \
+            lambda name, user='ubuntu': name.split('@')[-1] if user is None \
+            else '%s@%s' % (user, name.split('@')[-1])
+
+    def teardown(self):
+        for patcher in self.patchers.values():
+            patcher.stop()
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def test_only_pending_rescanned(self):
+        self.mocks['keyscan'].side_effect = [
+            dict(vm1='key1'),
+            dict(vm2='key2'),
+        ]
+        keys = lock_machines.wait_for_vms(self.ctx, ['ubuntu@vm1', 'vm2'])
+        assert keys == dict(vm1='key1', vm2='key2')
+        scanned = [sorted(c[0][0])
+                   for c in self.mocks['keyscan'].call_args_list]
+        assert scanned == [['vm1', 'vm2'], ['vm2']]
+        assert self.mocks['sleep'].call_count == 1
+        assert not self.mocks['create'].called
+
+    def test_stragglers_recreated(self):
+        self.mocks['keyscan'].side_effect = [
+            dict(vm1='key1'),
+            dict(),
+            dict(),
+            dict(vm2='key2', vm3='key3'),
+        ]
+        keys = lock_machines.wait_for_vms(
+            self.ctx, ['vm1', 'vm2', 'vm3'], interval=300,
+            recreate_after=400)
+        assert keys == dict(vm1='key1', vm2='key2', vm3='key3')
+        recreated = sorted(c[0][1]
+                           for c in self.mocks['create'].call_args_list)
+        assert recreated == ['ubuntu@vm2', 'ubuntu@vm3']
+        assert self.mocks['destroy'].call_count == 2
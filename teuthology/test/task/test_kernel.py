@@ -1,6 +1,9 @@
+from mock import patch
+
 from teuthology.config import FakeNamespace
 from teuthology.orchestra.cluster import Cluster
 from teuthology.orchestra.remote import Remote
+from teuthology.task import kernel
 from teuthology.task.kernel import (
     normalize_and_apply_overrides,
     CONFIG_DEFAULT,
@@ -241,3 +244,64 @@ class TestKernelNormalizeAndApplyOverrides(object):
             'client.1': {'koji': 1234, 'kdb': True},
         }
         assert t == TIMEOUT_DEFAULT
+
+
+class TestKernelInstall(object):
+
+    def setup(self):
+        self.ctx = FakeNamespace()
+        self.ctx.cluster = Cluster()
+        self.ctx.cluster.add(Remote('remote1'), ['mon.a', 'client.0'])
+        self.ctx.cluster.add(Remote('remote2'), ['osd.0', 'osd.1', 'osd.2'])
+
+    @patch('teuthology.task.kernel.time.sleep')
+    @patch('teuthology.task.kernel.need_to_install')
+    @patch('teuthology.task.kernel.teuthology.reconnect')
+    def test_wait_for_reboot(self, m_reconnect, m_need_to_install, m_sleep):
+        # mon.a comes back on the old kernel first
+        results = {'mon.a': [True, False], 'osd.0': [False]}
+        m_need_to_install.side_effect = \
+            lambda ctx, role, version: results[role].pop(0)
+        kernel.wait_for_reboot(
+            self.ctx, {'mon.a': 'abcdef', 'osd.0': 'abcdef'}, 60)
+        assert m_need_to_install.call_count == 3
+        reconnected = [c[1]['remotes'] for c in m_reconnect.call_args_list]
+        assert sorted(r[0].name for r in reconnected) == \
+            ['remote1', 'remote1', 'remote2']
+
+    @patch('teuthology.task.kernel.time.sleep')
+    @patch('teuthology.task.kernel.need_to_install')
+    @patch('teuthology.task.kernel.teuthology.reconnect')
+    def test_wait_for_reboot_timeout(self, m_reconnect, m_need_to_install,
+                                     m_sleep):
+        m_need_to_install.return_value = True
+        try:
+            kernel.wait_for_reboot(self.ctx, {'mon.a': 'abcdef'}, 0)
+        except AssertionError:
+            pass
+        else:
+            assert False, "wait_for_reboot() should have timed out"
+
+    @patch('teuthology.task.kernel._wait_for_reboot_one')
+    @patch('teuthology.task.kernel._install_and_reboot_one')
+    @patch('teuthology.task.kernel._download_kernel_one')
+    @patch('teuthology.task.kernel._install_firmware_one')
+    @patch('teuthology.task.kernel._get_install_info')
+    @patch('teuthology.task.kernel.remove_old_kernels')
+    def test_task_pipeline(self, m_remove_old_kernels, m_get_install_info,
+                           m_install_firmware_one, m_download_kernel_one,
+                           m_install_and_reboot_one, m_wait_for_reboot_one):
+        self.ctx.config = dict()
+        m_get_install_info.side_effect = lambda ctx, role, role_config: (
+            (role, 'abcdef', 'abcdef') if role == 'mon.a'
+            else (role, None, None)
+        )
+        kernel.task(self.ctx, dict(sha1='abcdef'))
+        assert m_get_install_info.call_count == 2
+        m_install_firmware_one.assert_called_once_with(self.ctx, 'mon.a')
+        m_download_kernel_one.assert_called_once_with(
+            self.ctx, 'mon.a', 'abcdef')
+        m_install_and_reboot_one.assert_called_once_with(
+            self.ctx, 'mon.a', 'abcdef')
+        m_wait_for_reboot_one.assert_called_once_with(
+            self.ctx, 'mon.a', 'abcdef', TIMEOUT_DEFAULT)
@@ -11,9 +11,10 @@ class TestSELinux(object):
         self.ctx = FakeNamespace()
         self.ctx.config = dict()
 
-    @patch('teuthology.task.selinux.get_status')
-    def test_host_exclusion(self, mock_get_status):
-        mock_get_status.return_value = None
+    @patch('teuthology.task.selinux.get_statuses')
+    def test_host_exclusion(self, mock_get_statuses):
+        mock_get_statuses.side_effect = \
+            lambda names: dict((name, None) for name in names)
         with patch.multiple(
             Remote,
             os=DEFAULT,
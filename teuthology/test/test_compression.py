@@ -0,0 +1,72 @@
+import os
+import pytest
+import shutil
+import tempfile
+
+from teuthology import compression
+
+
+class TestCompression(object):
+    data = ''.join('line %d of the log\n' % i for i in range(20000))
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'teuthology.log')
+        with file(self.path, 'w') as f:
+            f.write(self.data)
+        os.utime(self.path, (1000000000, 1000000000))
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check_codec(self, codec):
+        if codec == 'zstd' and compression.zstandard is None:
+            pytest.skip('zstandard is not installed')
+
+    @pytest.mark.parametrize('codec', ['gz', 'zstd'])
+    def test_compress_file(self, codec):
+        self.check_codec(codec)
+        out_path = compression.compress_file(self.path, codec, level=1)
+        assert out_path == self.path + compression.CODEC_EXTENSIONS[codec]
+        assert os.path.getmtime(out_path) == 1000000000
+        assert not os.path.exists(out_path + compression.INDEX_EXTENSION)
+        assert compression.open_log(out_path).read() == self.data
+        assert compression.read_tail(out_path, 100) == self.data[-100:]
+
+    @pytest.mark.parametrize('codec', ['gz', 'zstd'])
+    @pytest.mark.parametrize('threads', [1, 3])
+    def test_compress_seekable(self, codec, threads):
+        self.check_codec(codec)
+        out_path = compression.compress_file(
+            self.path, codec, threads=threads, seekable=True,
+            chunk_size=10000)
+        index = compression.read_index(out_path)
+        assert index['size'] == len(self.data)
+        assert len(index['chunks']) == len(self.data) / 10000 + 1
+        assert compression.open_log(out_path).read() == self.data
+        for size in (0, 100, 10000, 25000, len(self.data) * 2):
+            assert compression.read_tail(out_path, size) == \
+                self.data[len(self.data) - min(size, len(self.data)):]
+
+    def test_read_tail_uses_index(self):
+        out_path = compression.compress_file(
+            self.path, seekable=True, chunk_size=10000)
+        # Corrupt the first chunk; reading the tail must not touch it
+        with file(out_path, 'r+b') as f:
+            f.seek(20)
+            f.write('garbage')
+        assert compression.read_tail(out_path, 100) == self.data[-100:]
+
+    def test_stale_index_ignored(self):
+        out_path = compression.compress_file(
+            self.path, seekable=True, chunk_size=10000)
+        with file(out_path, 'ab') as f:
+            f.write('garbage')
+        assert compression.read_index(out_path) is None
+
+    def test_read_tail_plain(self):
+        assert compression.read_tail(self.path, 100) == self.data[-100:]
+
+    def test_unknown_codec(self):
+        with pytest.raises(ValueError):
+            compression.compress_file(self.path, 'rar')
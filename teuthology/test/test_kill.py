@@ -0,0 +1,161 @@
+import errno
+import os
+import shutil
+import signal
+import tempfile
+
+from mock import patch, Mock
+
+from teuthology import kill
+from teuthology import manifest
+from teuthology.report import ResultsSerializer
+
+
+class TestKill(object):
+    @patch("teuthology.kill.subprocess.call")
+    @patch("teuthology.kill.os.kill")
+    def test_signal_processes(self, m_kill, m_call):
+        def fake_kill(pid, sig):
+            if pid == 2:
+                raise OSError(errno.ESRCH, "No such process")
+            elif pid > 2:
+                raise OSError(errno.EPERM, "Operation not permitted")
+        m_kill.side_effect = fake_kill
+        kill.signal_processes([4, 1, 2, 3])
+        assert m_kill.call_count == 4
+        m_kill.assert_any_call(1, signal.SIGTERM)
+        m_call.assert_called_once_with(['sudo', 'kill', '-15', '3', '4'])
+
+    @patch("teuthology.kill.signal_processes")
+    @patch("teuthology.kill.process_matches_run")
+    @patch("teuthology.kill.psutil.pid_exists")
+    def test_kill_processes(self, m_pid_exists, m_matches, m_signal):
+        m_pid_exists.side_effect = lambda pid: pid != 3
+        m_matches.side_effect = lambda pid, run_name: pid != 2
+        kill.kill_processes('the_run', [1, 2, 3])
+        m_signal.assert_called_once_with(set([1]))
+
+    @patch("teuthology.kill.lock.list_locks")
+    def test_find_targets(self, m_list_locks):
+        m_list_locks.return_value = [
+            dict(name='a', locked_by='me', ssh_pub_key='key_a',
+                 description='/archive/the_run/1'),
+            dict(name='b', locked_by='me', ssh_pub_key='key_b',
+                 description='/archive/other_run/1'),
+            dict(name='c', locked_by='me', ssh_pub_key='key_c',
+                 description=None),
+        ]
+        assert kill.find_targets('the_run', 'me') == \
+            dict(targets=dict(a='key_a'))
+        m_list_locks.assert_called_once_with(
+            locked=True, up=True, locked_by='me')
+        m_list_locks.return_value = []
+        assert kill.find_targets('the_run', 'me') == {}
+
+
+class TestKillRun(object):
+    def setup(self):
+        self.patchers = dict()
+        for name in ('find_run_info', 'remove_beanstalk_jobs',
+                     'remove_paddles_jobs', 'kill_processes', 'find_targets',
+                     'nuke_targets'):
+            self.patchers[name] = patch('teuthology.kill.%s' % name)
+        self.mocks = dict((name, patcher.start())
+                          for (name, patcher) in self.patchers.items())
+        self.archive = tempfile.mkdtemp()
+
+    def teardown(self):
+        for patcher in self.patchers.values():
+            patcher.stop()
+        shutil.rmtree(self.archive)
+
+    def test_enqueued(self):
+        self.mocks['find_targets'].return_value = dict(targets=dict(a='key'))
+        kill.kill_run('the_run', self.archive, 'me', 'smithi')
+        self.mocks['remove_beanstalk_jobs'].assert_called_once_with(
+            'the_run', 'smithi')
+        self.mocks['remove_paddles_jobs'].assert_called_once_with('the_run')
+        self.mocks['kill_processes'].assert_called_once_with('the_run', None)
+        self.mocks['nuke_targets'].assert_called_once_with(
+            dict(targets=dict(a='key')), 'me')
+
+    def test_preserve_queue(self):
+        kill.kill_run('the_run', owner='me', machine_type='smithi',
+                      preserve_queue=True)
+        assert not self.mocks['remove_beanstalk_jobs'].called
+        assert not self.mocks['remove_paddles_jobs'].called
+        assert self.mocks['kill_processes'].called
+
+    def test_late_processes(self):
+        run_dir = os.path.join(self.archive, 'the_run')
+        os.mkdir(run_dir)
+        manifest.record_pid(os.path.join(run_dir, '1'), 101)
+        self.mocks['find_run_info'].return_value = dict(
+            machine_type='smithi', owner='me', pids=[101])
+
+        def remove_beanstalk_jobs(run_name, machine_type):
+            # A worker started a job before it could be removed
+            manifest.record_pid(os.path.join(run_dir, '2'), 102)
+        self.mocks['remove_beanstalk_jobs'].side_effect = \
+            remove_beanstalk_jobs
+        kill.kill_run('the_run', self.archive)
+        assert self.mocks['kill_processes'].call_args_list[-1][0] == \
+            ('the_run', set([102]))
+
+    def test_late_processes_enqueued(self):
+        run_dir = os.path.join(self.archive, 'the_run')
+
+        def remove_beanstalk_jobs(run_name, machine_type):
+            # A worker started the run's first job before it could be removed
+            os.mkdir(run_dir)
+            manifest.record_pid(os.path.join(run_dir, '1'), 101)
+        self.mocks['remove_beanstalk_jobs'].side_effect = \
+            remove_beanstalk_jobs
+        kill.kill_run('the_run', self.archive, 'me', 'smithi')
+        assert self.mocks['kill_processes'].call_args_list[-1][0] == \
+            ('the_run', set([101]))
+
+
+class TestFindRunInfo(object):
+    def setup(self):
+        self.archive = tempfile.mkdtemp()
+        self.serializer = ResultsSerializer(self.archive, log=Mock())
+        for job_id in ('1', '2', '3'):
+            job_dir = os.path.join(self.archive, 'the_run', job_id)
+            os.makedirs(job_dir)
+            with file(os.path.join(job_dir, 'info.yaml'), 'w') as f:
+                f.write('owner: me\nmachine_type: smithi\npid: 10%s\n' %
+                        job_id)
+
+    def teardown(self):
+        shutil.rmtree(self.archive)
+
+    def test_without_registry(self):
+        run_info = kill.find_run_info(self.serializer, 'the_run')
+        assert run_info['owner'] == 'me'
+        assert run_info['machine_type'] == 'smithi'
+        assert sorted(run_info['pids']) == [101, 102, 103]
+
+    def test_with_registry(self):
+        for job_id in ('1', '2', '3'):
+            manifest.record_pid(
+                os.path.join(self.archive, 'the_run', job_id),
+                200 + int(job_id))
+        with patch.object(self.serializer, 'job_info',
+                          wraps=self.serializer.job_info) as m_job_info:
+            run_info = kill.find_run_info(self.serializer, 'the_run')
+            assert m_job_info.call_count == 1
+        assert run_info['owner'] == 'me'
+        assert sorted(run_info['pids']) == [201, 202, 203]
+
+    def test_with_partial_registry(self):
+        # Job 3's worker failed to record its PID
+        for job_id in ('1', '2'):
+            manifest.record_pid(
+                os.path.join(self.archive, 'the_run', job_id),
+                200 + int(job_id))
+        with patch.object(self.serializer, 'job_info',
+                          wraps=self.serializer.job_info) as m_job_info:
+            run_info = kill.find_run_info(self.serializer, 'the_run')
+            assert m_job_info.call_count <= 2
+        assert sorted(run_info['pids']) == [103, 201, 202]
@@ -1,3 +1,5 @@
+from mock import patch, Mock
+
 from teuthology import lock
 
 
@@ -6,3 +8,69 @@ class TestLock(object):
     def test_locked_since_seconds(self):
         node = { "locked_since": "2013-02-07 19:33:55.000000" }
         assert lock.locked_since_seconds(node) > 3600
+
+
+class TestFindStaleLocks(object):
+    def setup(self):
+        lock._job_status_cache.clear()
+        self.session_patcher = patch('teuthology.lock.requests.Session')
+        self.m_session = self.session_patcher.start().return_value
+        self.responses = dict()
+        self.m_session.get.side_effect = \
+            lambda uri, params: self.responses[uri.split('/')[-3]]
+
+    def teardown(self):
+        self.session_patcher.stop()
+
+    def response(self, jobs, status_code=200):
+        resp = Mock()
+        resp.status_code = status_code
+        resp.ok = status_code == 200
+        resp.json.return_value = jobs
+        return resp
+
+    def node(self, name, description, locked=True):
+        return dict(name=name, description=description, locked=locked,
+                    locked_by='owner')
+
+    def test_get_job_statuses(self):
+        self.responses['run1'] = self.response(
+            [dict(job_id=1, status='running'), dict(job_id='2', status='dead')])
+        self.responses['run2'] = self.response(None, status_code=404)
+        self.responses['run3'] = self.response(None, status_code=500)
+        result = lock.get_job_statuses(['run1', 'run2', 'run1', 'run3'])
+        assert result == dict(
+            run1={'1': 'running', '2': 'dead'},
+            run2=dict(),
+            run3=None,
+        )
+        assert self.m_session.get.call_count == 3
+
+    def test_get_job_statuses_cached(self):
+        self.responses['run1'] = self.response(
+            [dict(job_id='1', status='pass')])
+        self.responses['run2'] = self.response(None, status_code=404)
+        lock.get_job_statuses(['run1', 'run2'])
+        result = lock.get_job_statuses(['run1', 'run2'])
+        assert result == dict(run1={'1': 'pass'}, run2=dict())
+        assert self.m_session.get.call_count == 2
+        lock.get_job_statuses(['run1'], cache_ttl=0)
+        assert self.m_session.get.call_count == 3
+
+    @patch('teuthology.lock.list_locks')
+    def test_find_stale_locks(self, m_list_locks):
+        m_list_locks.return_value = [
+            self.node('n1', '/archive/run1/1'),
+            self.node('n2', '/archive/run1/2'),
+            self.node('n3', '/archive/run2/3'),
+            self.node('n4', '/archive/run3/4'),
+            self.node('n5', 'manually locked'),
+        ]
+        self.responses['run1'] = self.response(
+            [dict(job_id='1', status='running'),
+             dict(job_id='2', status='fail')])
+        self.responses['run2'] = self.response(None, status_code=404)
+        self.responses['run3'] = self.response(None, status_code=502)
+        stale = lock.find_stale_locks()
+        assert [node['name'] for node in stale] == ['n2', 'n3']
+        assert self.m_session.get.call_count == 3
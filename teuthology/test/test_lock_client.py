@@ -0,0 +1,79 @@
+import json
+
+from mock import patch, Mock
+
+from teuthology import lock_client
+from teuthology.lock_client import LockServerClient
+
+
+class TestLockServerClient(object):
+    def setup(self):
+        self.client = LockServerClient(base_url='http://lock/', cache_ttl=60)
+        self.m_session = self.client.session = Mock()
+
+    def test_uri(self):
+        assert self.client.uri('nodes') == 'http://lock/nodes/'
+        assert self.client.uri('nodes', 'foo', 'lock') == \
+            'http://lock/nodes/foo/lock/'
+
+    def test_timeout(self):
+        self.client.get('http://lock/nodes/')
+        self.m_session.request.assert_called_once_with(
+            'GET', 'http://lock/nodes/', params=None,
+            timeout=lock_client.DEFAULT_TIMEOUT)
+
+    def test_put(self):
+        self.client.put('http://lock/nodes/foo/', dict(up=True))
+        args, kwargs = self.m_session.request.call_args
+        assert args == ('PUT', 'http://lock/nodes/foo/')
+        assert json.loads(kwargs['data']) == dict(up=True)
+        assert kwargs['headers'] == lock_client.JSON_HEADERS
+
+    def test_retry_policy(self):
+        client = LockServerClient(base_url='http://lock/', retries=3)
+        retry = client.session.get_adapter('http://lock/').max_retries
+        assert retry.total == 3
+        assert 'GET' in retry.method_whitelist
+        assert 'POST' not in retry.method_whitelist
+
+    def test_pool_size(self):
+        client = LockServerClient(base_url='http://lock/')
+        adapter = client.session.get_adapter('http://lock/')
+        assert adapter._pool_maxsize == lock_client.MAX_PARALLEL_QUERIES
+
+    def test_cache(self):
+        self.client.get('http://lock/nodes/', cache=True)
+        self.client.get('http://lock/nodes/', cache=True)
+        assert self.m_session.request.call_count == 1
+        self.client.get('http://lock/nodes/')
+        assert self.m_session.request.call_count == 2
+
+    def test_cache_expires(self):
+        self.client.get('http://lock/nodes/', cache=True)
+        with patch.object(lock_client.time, 'time') as m_time:
+            m_time.return_value = 2 ** 40
+            self.client.get('http://lock/nodes/', cache=True)
+        assert self.m_session.request.call_count == 2
+
+    def test_cache_cleared_by_writes(self):
+        self.client.get('http://lock/nodes/', cache=True)
+        self.client.put('http://lock/nodes/foo/', dict(up=False))
+        self.client.get('http://lock/nodes/', cache=True)
+        assert self.m_session.request.call_count == 3
+
+    def test_cache_disabled(self):
+        client = LockServerClient(base_url='http://lock/')
+        client.session = Mock()
+        client.get('http://lock/nodes/', cache=True)
+        client.get('http://lock/nodes/', cache=True)
+        assert client.session.request.call_count == 2
+
+    def test_get_client(self):
+        with patch.object(lock_client, 'config') as m_config:
+            m_config.lock_server = 'http://lock1/'
+            m_config.lock_server_cache_ttl = 5
+            client = lock_client.get_client()
+            assert client is lock_client.get_client()
+            assert client.base_url == 'http://lock1/'
+            m_config.lock_server = 'http://lock2/'
+            assert lock_client.get_client().base_url == 'http://lock2/'
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+
+from mock import patch
+
+from teuthology import lock_queue
+
+
+class TestDemand(object):
+    def setup(self):
+        self.queue_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.queue_dir)
+
+    def make_demand(self, priority=None, machine_type='smithi'):
+        return lock_queue.Demand(machine_type, 2, priority=priority,
+                                 queue_dir=self.queue_dir)
+
+    def test_register_unregister(self):
+        demand = self.make_demand()
+        with demand:
+            assert os.listdir(demand.dir) == [os.path.basename(demand.path)]
+        assert os.listdir(demand.dir) == []
+        # unregistering twice is harmless
+        demand.unregister()
+
+    def test_machine_type_dir(self):
+        demand = self.make_demand(machine_type='smithi|mira')
+        assert demand.dir == os.path.join(self.queue_dir, 'smithi_mira')
+
+    def test_order(self):
+        first = self.make_demand()
+        second = self.make_demand()
+        urgent = self.make_demand(priority=10)
+        with first, second:
+            assert first.ahead() == []
+            assert len(second.ahead()) == 1
+            with urgent:
+                assert urgent.ahead() == []
+                assert len(first.ahead()) == 1
+                assert len(second.ahead()) == 2
+            assert len(second.ahead()) == 1
+        assert second.ahead() == []
+
+    def test_stale_entries(self):
+        first = self.make_demand()
+        second = self.make_demand()
+        with first, second:
+            with patch.object(lock_queue, '_pid_exists', return_value=False):
+                assert second.ahead() == []
+            assert not os.path.exists(first.path)
+
+    @patch('teuthology.lock_queue.time.sleep')
+    def test_wait_for_turn(self, m_sleep):
+        first = self.make_demand()
+        second = self.make_demand()
+        with first, second:
+            m_sleep.side_effect = lambda interval: first.unregister()
+            second.wait_for_turn()
+        assert m_sleep.call_count == 1
@@ -0,0 +1,42 @@
+from mock import patch, Mock
+
+from teuthology import lockstatus
+from teuthology.lock_client import LockServerClient
+
+
+class TestLockStatus(object):
+    def setup(self):
+        self.client = LockServerClient(base_url='http://lock')
+        self.patcher_get_client = patch.object(
+            lockstatus, 'get_client', return_value=self.client)
+        self.patcher_get_client.start()
+        self.m_session = self.client.session = Mock()
+
+    def teardown(self):
+        self.patcher_get_client.stop()
+
+    def _get(self, method, uri, **kwargs):
+        name = uri.rstrip('/').split('/')[-1]
+        resp = Mock()
+        resp.ok = name != 'unknown.front.sepia.ceph.com'
+        resp.json.return_value = dict(name=name)
+        return resp
+
+    def test_get_status(self):
+        self.m_session.request.side_effect = self._get
+        status = lockstatus.get_status('ubuntu@node1.front.sepia.ceph.com')
+        assert status == dict(name='node1.front.sepia.ceph.com')
+        self.m_session.request.assert_called_once_with(
+            'GET', 'http://lock/nodes/node1.front.sepia.ceph.com/',
+            params=None, timeout=self.client.timeout)
+
+    def test_get_statuses(self):
+        self.m_session.request.side_effect = self._get
+        names = ['node%d.front.sepia.ceph.com' % i for i in range(20)]
+        names.append('unknown.front.sepia.ceph.com')
+        statuses = lockstatus.get_statuses(names, max_parallel=4)
+        assert sorted(statuses.keys()) == sorted(names)
+        assert statuses['unknown.front.sepia.ceph.com'] is None
+        assert statuses['node3.front.sepia.ceph.com'] == \
+            dict(name='node3.front.sepia.ceph.com')
+        assert self.m_session.request.call_count == len(names)
@@ -1,8 +1,14 @@
+import gzip
+import os
+import shutil
+import tempfile
+
 import pytest
 
 from mock import patch, Mock
 
 from teuthology import ls
+from teuthology import manifest
 
 
 class TestLs(object):
@@ -16,13 +22,26 @@ class TestLs(object):
         results = ls.get_jobs("some/archive/dir")
         assert results == ["1", "3"]
 
-    @patch("yaml.safe_load_all")
+    @patch("yaml.load_all")
     @patch("__builtin__.file")
     @patch("teuthology.ls.get_jobs")
-    def test_ls(self, m_get_jobs, m_file, m_safe_load_all):
+    def test_ls(self, m_get_jobs, m_file, m_load_all):
         m_get_jobs.return_value = ["1", "2"]
-        m_safe_load_all.return_value = [{"failure_reason": "reasons"}]
+        m_load_all.return_value = [{"failure_reason": "reasons"}]
         ls.ls("some/archive/div", True)
+        assert m_load_all.call_count == 2
+
+    @patch("teuthology.ls.load_summary")
+    @patch("teuthology.manifest.read_manifest")
+    @patch("teuthology.ls.get_jobs")
+    def test_ls_manifest(self, m_get_jobs, m_read_manifest, m_load_summary):
+        m_get_jobs.return_value = ["1", "2"]
+        m_read_manifest.return_value = {
+            "1": dict(job_id="1", status="pass", owner="me", duration=10),
+        }
+        m_load_summary.return_value = dict(success=False)
+        ls.ls("some/archive/dir", True)
+        m_load_summary.assert_called_once_with("some/archive/dir/2")
 
     @patch("__builtin__.file")
     @patch("teuthology.ls.get_jobs")
@@ -33,14 +52,61 @@ class TestLs(object):
             ls.ls("some/archive/dir", True)
 
     @patch("__builtin__.open")
-    @patch("os.popen")
+    @patch("teuthology.ls.read_tail")
     @patch("os.path.isdir")
     @patch("os.path.isfile")
-    def test_print_debug_info(self, m_isfile, m_isdir, m_popen, m_open):
+    def test_print_debug_info(self, m_isfile, m_isdir, m_read_tail, m_open):
         m_isfile.return_value = True
         m_isdir.return_value = True
-        m_popen.return_value = Mock()
+        m_read_tail.return_value = "line 1\nline 2\n"
         cmdline = Mock()
         cmdline.find.return_value = True
         m_open.return_value = cmdline
         ls.print_debug_info("the_job", "job/dir", "some/archive/dir")
+        m_read_tail.assert_called_once_with(
+            "job/dir/teuthology.log", ls.TAIL_SIZE)
+
+
+class TestLsArchive(object):
+    """ Tests for teuthology.ls that use a real archive directory """
+
+    def setup(self):
+        self.archive = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.archive)
+
+    def make_job(self, job_id, summary=None):
+        job_dir = os.path.join(self.archive, job_id)
+        os.mkdir(job_dir)
+        if summary is not None:
+            with file(os.path.join(job_dir, 'summary.yaml'), 'w') as f:
+                f.write(summary)
+        return job_dir
+
+    def test_load_summary(self):
+        job_dir = self.make_job('1', 'success: true\n---\nduration: 5\n')
+        assert ls.load_summary(job_dir) == dict(success=True, duration=5)
+        assert ls.load_summary(self.make_job('2')) is None
+
+    def test_ls(self, capsys):
+        job_dir = self.make_job('1', 'owner: me\n')
+        manifest.record_job(job_dir, dict(status='fail', owner='you'))
+        self.make_job('2', 'owner: them\nsuccess: true\nduration: 3.5\n')
+        ls.ls(self.archive, False)
+        (out, _) = capsys.readouterr()
+        assert out.splitlines() == [
+            '1 fail you - 0s',
+            '2 pass them - 3s',
+        ]
+
+    def test_get_last_line(self):
+        job_dir = self.make_job('1')
+        assert ls.get_last_line(job_dir) == ''
+        lines = ''.join('line %d\n' % i for i in range(10000))
+        with gzip.open(os.path.join(job_dir, 'teuthology.log.gz'), 'w') as f:
+            f.write(lines)
+        assert ls.get_last_line(job_dir) == 'line 9999'
+        with file(os.path.join(job_dir, 'teuthology.log'), 'w') as f:
+            f.write(lines + 'last')
+        assert ls.get_last_line(job_dir) == 'last'
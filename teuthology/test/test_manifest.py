@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+
+from teuthology import manifest
+
+
+class TestManifest(object):
+    def setup(self):
+        self.run_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.run_dir)
+
+    def make_job(self, job_id, size):
+        job_dir = os.path.join(self.run_dir, job_id)
+        os.makedirs(os.path.join(job_dir, 'remote'))
+        with file(os.path.join(job_dir, 'remote', 'log'), 'w') as f:
+            f.write('x' * size)
+        return job_dir
+
+    def test_record_and_read(self):
+        job1 = self.make_job('1', 100)
+        job2 = self.make_job('2', 10)
+        manifest.record_job(job1, dict(success=True, owner='me', foo='bar'))
+        manifest.record_job(job2 + '/', dict(status='dead'))
+        entries = manifest.read_manifest(self.run_dir)
+        assert sorted(entries) == ['1', '2']
+        assert entries['1']['status'] == 'pass'
+        assert entries['1']['size'] == 100
+        assert entries['1']['owner'] == 'me'
+        assert 'foo' not in entries['1']
+        assert entries['2']['status'] == 'dead'
+        assert entries['2']['mtime'] > 0
+
+    def test_last_entry_wins(self):
+        job = self.make_job('1', 1)
+        manifest.record_job(job, dict(status='fail'))
+        manifest.record_job(job, dict(status='pass'))
+        assert manifest.read_manifest(self.run_dir)['1']['status'] == 'pass'
+
+    def test_bad_lines_ignored(self):
+        job = self.make_job('1', 1)
+        manifest.record_job(job, dict(status='fail'))
+        with file(os.path.join(self.run_dir, manifest.MANIFEST_FILE),
+                  'a') as f:
+            f.write('{"job_id": "2", "sta')
+        assert sorted(manifest.read_manifest(self.run_dir)) == ['1']
+
+    def test_no_manifest(self):
+        assert manifest.read_manifest(self.run_dir) == dict()
+
+    def test_pids(self):
+        assert manifest.read_pids(self.run_dir) == dict()
+        manifest.record_pid(os.path.join(self.run_dir, '1'), 100)
+        manifest.record_pid(os.path.join(self.run_dir, '2'), 200)
+        manifest.record_pid(os.path.join(self.run_dir, '1'), 101)
+        assert manifest.read_pids(self.run_dir) == {'1': 101, '2': 200}
@@ -1,5 +1,10 @@
 import argparse
+import os
+import shutil
+import tarfile
+import tempfile
 from datetime import datetime
+from io import BytesIO
 
 from mock import Mock, patch
 from ..orchestra import cluster
@@ -366,3 +371,100 @@ class TestIsInDict(object):
 
     def test_nonmembership_with_presence_at_lower_level(self):
         assert not misc.is_in_dict('a', 'foo', {'a':{'a': 'foo'}})
+
+
+class TestPullDirectory(object):
+    def setup(self):
+        self.remote = Mock()
+        self.remote.name = 'ubuntu@host'
+        self.remote.shortname = 'host'
+
+    def make_tarball(self, files, mode='w|gz'):
+        buf = BytesIO()
+        tar = tarfile.open(mode=mode, fileobj=buf)
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, BytesIO(data))
+        tar.close()
+        buf.seek(0)
+        return buf
+
+    @patch('teuthology.misc.facts.get')
+    def test_get_tar_codec(self, m_get_facts):
+        m_get_facts.return_value = dict(compressors=['lz4'])
+        with patch.dict(misc.TAR_DECOMPRESSORS,
+                        dict(zstd=Mock(), lz4=Mock())):
+            assert misc.get_tar_codec(
+                self.remote, ['zstd', 'lz4', 'gz']) == 'lz4'
+            assert misc.get_tar_codec(self.remote, ['zstd']) == 'gz'
+            assert misc.get_tar_codec(self.remote, 'none') == 'none'
+            assert misc.get_tar_codec(self.remote, ['bogus', 'lz4']) == 'lz4'
+        with patch.dict(misc.TAR_DECOMPRESSORS, dict(lz4=None)):
+            assert misc.get_tar_codec(self.remote, ['lz4', 'none']) == 'none'
+
+    def check_pull(self, codec, tar_mode):
+        files = {'./a.log': 'a' * 10, './sub/b.log': 'b' * 3000000}
+        self.remote.get_tar_stream.return_value.stdout = self.make_tarball(
+            files, mode=tar_mode)
+        localdir = tempfile.mkdtemp()
+        try:
+            misc.pull_directory(self.remote, '/remote/dir',
+                                os.path.join(localdir, 'host'),
+                                compress=codec)
+            self.remote.get_tar_stream.assert_called_once_with(
+                '/remote/dir', sudo=True, compress=codec)
+            for name, data in files.items():
+                with open(os.path.join(localdir, 'host', name)) as f:
+                    assert f.read() == data
+        finally:
+            shutil.rmtree(localdir)
+
+    def test_pull_directory_gz(self):
+        self.check_pull('gz', 'w|gz')
+
+    def test_pull_directory_uncompressed(self):
+        self.check_pull('none', 'w|')
+
+
+class TestReconnect(object):
+    def make_remote(self, name, attempts_needed):
+        remote = Mock()
+        remote.name = name
+        remote.reconnect.side_effect = \
+            [False] * attempts_needed + [True] * 10
+        return remote
+
+    @patch('teuthology.misc.time.sleep')
+    @patch('teuthology.misc.connection.is_port_open')
+    def test_reconnect(self, m_is_port_open, m_sleep):
+        m_is_port_open.return_value = True
+        remotes = [self.make_remote('ubuntu@host%d' % i, i) for i in range(3)]
+        ctx = argparse.Namespace()
+        ctx.cluster = cluster.Cluster()
+        for remote in remotes:
+            ctx.cluster.add(remote, [])
+        misc.reconnect(ctx, 60)
+        for i, remote in enumerate(remotes):
+            assert remote.reconnect.call_count == i + 1
+
+    @patch('teuthology.misc.time.sleep')
+    @patch('teuthology.misc.connection.is_port_open')
+    def test_reconnect_waits_for_port(self, m_is_port_open, m_sleep):
+        m_is_port_open.side_effect = [False, False, True]
+        remote = self.make_remote('ubuntu@host', 0)
+        misc.reconnect(None, 60, remotes=[remote])
+        assert remote.reconnect.call_count == 1
+        assert [c[0][0] for c in m_sleep.call_args_list] == [1, 2]
+
+    @patch('teuthology.misc.time.time')
+    @patch('teuthology.misc.time.sleep')
+    @patch('teuthology.misc.connection.is_port_open')
+    def test_reconnect_timeout(self, m_is_port_open, m_sleep, m_time):
+        m_is_port_open.return_value = False
+        m_time.side_effect = [0, 10, 100, 100]
+        remotes = [self.make_remote('ubuntu@host', 0)]
+        with pytest.raises(RuntimeError) as excinfo:
+            misc.reconnect(None, 60, remotes=remotes)
+        assert 'ubuntu@host' in str(excinfo.value)
+        assert remotes[0].reconnect.call_count == 0
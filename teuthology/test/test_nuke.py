@@ -1,3 +1,4 @@
+import argparse
 import datetime
 import json
 import os
@@ -7,6 +8,7 @@ import subprocess
 from mock import patch, Mock, DEFAULT
 
 from teuthology import nuke
+from teuthology.nuke import actions
 from teuthology import misc
 from teuthology.config import config
 
@@ -230,3 +232,213 @@ class TestNuke(object):
                 misc.canonicalize_hostname(name, user=None): {},
             })
             m['destroy'].assert_not_called()
+
+
+class TestNukeTargets(object):
+    def setup(self):
+        self.ctx = argparse.Namespace(
+            config=dict(targets={
+                'ubuntu@node1': 'key1',
+                'ubuntu@node2': 'key2',
+                'ubuntu@vpm003': 'key3',
+            }),
+            owner='owner',
+        )
+        self.statuses = dict(
+            (target, dict(is_vm=False, machine_type='smithi'))
+            for target in self.ctx.config['targets']
+        )
+        self.steps = list()
+
+    def step(self, name, fail_on=None):
+        def func(ctx, *args):
+            (target,) = ctx.config['targets'].keys()
+            self.steps.append((name, target))
+            if target == fail_on:
+                raise RuntimeError('failed')
+        return func
+
+    @patch('teuthology.nuke.unlock_one')
+    @patch('teuthology.nuke._connect_target')
+    def test_nuke_targets(self, m_connect, m_unlock_one):
+        steps = [
+            self.step('first', fail_on='ubuntu@node2'),
+            self.step('second'),
+        ]
+        with patch.object(nuke, 'NUKE_STEPS', steps):
+            unnuked = nuke.nuke_targets(self.ctx, True, self.statuses)
+        assert unnuked == {'ubuntu@node2': 'key2'}
+        assert sorted(self.steps) == [
+            ('first', 'ubuntu@node1'),
+            ('first', 'ubuntu@node2'),
+            ('second', 'ubuntu@node1'),
+        ]
+        assert m_connect.call_count == 2
+        unlocked = sorted(c[0][1] for c in m_unlock_one.call_args_list)
+        assert unlocked == ['ubuntu@node1', 'ubuntu@vpm003']
+
+    @patch('teuthology.nuke.unlock_one')
+    @patch('teuthology.nuke._connect_target')
+    def test_nuke_targets_no_unlock(self, m_connect, m_unlock_one):
+        m_connect.side_effect = self.step('connect', fail_on='ubuntu@node1')
+        with patch.object(nuke, 'NUKE_STEPS', [self.step('first')]):
+            unnuked = nuke.nuke_targets(self.ctx, False, self.statuses)
+        assert unnuked == {'ubuntu@node1': 'key1'}
+        assert sorted(t for (name, t) in self.steps if name == 'first') == \
+            ['ubuntu@node2', 'ubuntu@vpm003']
+        m_unlock_one.assert_not_called()
+
+    @patch('teuthology.nuke.nuke_targets')
+    @patch('teuthology.nuke.get_statuses')
+    def test_nuke_fetches_statuses_once(self, m_get_statuses,
+                                        m_nuke_targets):
+        self.ctx.name = 'run1'
+        self.ctx.config['check-locks'] = False
+        m_get_statuses.return_value = {
+            'ubuntu@node1': dict(description='/archive/run1/1'),
+            'ubuntu@node2': dict(description='/archive/run2/2'),
+            'ubuntu@vpm003': None,
+        }
+        m_nuke_targets.return_value = dict()
+        nuke.nuke(self.ctx, True)
+        assert m_get_statuses.call_count == 1
+        nuke_ctx, should_unlock, statuses = m_nuke_targets.call_args[0]
+        assert sorted(nuke_ctx.config['targets']) == \
+            ['ubuntu@node1', 'ubuntu@vpm003']
+        assert nuke_ctx.check_locks is False
+        assert statuses is m_get_statuses.return_value
+
+    @patch('teuthology.nuke.nuke_targets')
+    @patch('teuthology.nuke.get_statuses')
+    def test_nuke_reboot_all_implies_full(self, m_get_statuses,
+                                          m_nuke_targets):
+        self.ctx.name = None
+        m_get_statuses.return_value = dict()
+        m_nuke_targets.return_value = dict()
+        nuke.nuke(self.ctx, True)
+        assert m_nuke_targets.call_args[0][0].full is True
+        nuke.nuke(self.ctx, True, reboot_all=False)
+        assert m_nuke_targets.call_args[0][0].full is False
+        nuke.nuke(self.ctx, True, reboot_all=False, full=True)
+        assert m_nuke_targets.call_args[0][0].full is True
+
+    def connect(self, ctx, statuses):
+        ctx.cluster = Mock()
+        ctx.cluster.remotes = {Mock(): ['role']}
+
+    @patch('teuthology.nuke.is_clean')
+    @patch('teuthology.nuke.reboot')
+    @patch('teuthology.nuke._connect_target')
+    def test_clean_targets_not_rebooted(self, m_connect, m_reboot,
+                                        m_is_clean):
+        m_connect.side_effect = self.connect
+        m_is_clean.return_value = True
+        steps = [self.step('first'), nuke._reboot,
+                 nuke._unless_clean(self.step('second'))]
+        with patch.object(nuke, 'NUKE_STEPS', steps):
+            unnuked = nuke.nuke_targets(self.ctx, False, self.statuses)
+        assert unnuked == dict()
+        assert m_is_clean.call_count == 3
+        m_reboot.assert_not_called()
+        assert sorted(set(name for (name, t) in self.steps)) == ['first']
+
+    @patch('teuthology.nuke.is_clean')
+    @patch('teuthology.nuke.reboot')
+    @patch('teuthology.nuke._connect_target')
+    def test_full(self, m_connect, m_reboot, m_is_clean):
+        m_connect.side_effect = self.connect
+        m_is_clean.return_value = True
+        self.ctx.full = True
+        steps = [nuke._reboot, nuke._unless_clean(self.step('second'))]
+        with patch.object(nuke, 'NUKE_STEPS', steps):
+            nuke.nuke_targets(self.ctx, False, self.statuses)
+        m_is_clean.assert_not_called()
+        assert m_reboot.call_count == 3
+        assert len(self.steps) == 3
+
+    @patch('teuthology.nuke.is_clean')
+    @patch('teuthology.nuke._connect_target')
+    def test_inspection_failure(self, m_connect, m_is_clean):
+        m_connect.side_effect = self.connect
+        m_is_clean.side_effect = RuntimeError('failed')
+        steps = [nuke._unless_clean(self.step('second'))]
+        with patch.object(nuke, 'NUKE_STEPS', steps):
+            unnuked = nuke.nuke_targets(self.ctx, False, self.statuses)
+        assert unnuked == dict()
+        assert len(self.steps) == 3
+
+
+class TestCleanupScript(object):
+    def test_get_cleanup_script(self):
+        script = actions.get_cleanup_script(
+            ['kill_valgrind', 'remove_testing_tree'], '/home/ubuntu/cephtest')
+        lines = script.splitlines()
+        assert lines[0] == 'testdir=/home/ubuntu/cephtest'
+        assert actions.CLEANUP_SNIPPETS['kill_valgrind'] in script
+        assert lines[-1] == \
+            'echo "teuthology-cleanup-step: remove_testing_tree $?"'
+        assert subprocess.call(['sh', '-n', '-c', script]) == 0
+
+    def test_all_snippets_parse(self):
+        script = actions.get_cleanup_script(
+            sorted(actions.CLEANUP_SNIPPETS), "/tmp/it's")
+        assert subprocess.call(['sh', '-n', '-c', script]) == 0
+
+    def test_parse_cleanup_output(self):
+        output = '\n'.join([
+            'some output',
+            'teuthology-cleanup-step: clear_firewall 0',
+            'teuthology-cleanup-step: shutdown_daemons 1',
+        ])
+        assert actions.parse_cleanup_output(output) == dict(
+            clear_firewall=0, shutdown_daemons=1)
+
+    def make_ctx(self, output):
+        remote = Mock(shortname='node1')
+        remote.run.return_value.stdout.getvalue.return_value = output
+        ctx = Mock()
+        ctx.cluster.remotes = {remote: ['node1']}
+        return ctx
+
+    def test_run_cleanup_script(self):
+        ctx = self.make_ctx('teuthology-cleanup-step: kill_valgrind 0\n')
+        actions.run_cleanup_script(ctx, ['kill_valgrind'])
+        (remote,) = ctx.cluster.remotes.keys()
+        args = remote.run.call_args[1]['args']
+        assert args[:3] == ['sudo', 'sh', '-c']
+        assert remote.run.call_count == 1
+
+    def test_run_cleanup_script_failed(self):
+        ctx = self.make_ctx('teuthology-cleanup-step: clear_firewall 1\n')
+        with pytest.raises(RuntimeError) as excinfo:
+            actions.run_cleanup_script(
+                ctx, ['clear_firewall', 'kill_valgrind'])
+        assert 'clear_firewall on node1 (1)' in str(excinfo.value)
+        assert 'kill_valgrind on node1 (not run)' in str(excinfo.value)
+
+
+class TestInspectNode(object):
+    def make_remote(self, output):
+        remote = Mock(shortname='node1')
+        remote.run.return_value.stdout.getvalue.return_value = output
+        return remote
+
+    def test_inspect_node(self):
+        remote = self.make_remote(
+            'daemons 2\nmounts 0\nkernel_clients 1\npackages 0\n')
+        assert actions.inspect_node(remote) == dict(
+            daemons=2, mounts=0, kernel_clients=1, packages=0)
+        assert remote.run.call_count == 1
+
+    def test_inspect_script_parses(self):
+        script = actions.INSPECT_SCRIPT % dict(
+            packages=' '.join(actions.INSPECT_PACKAGES))
+        assert subprocess.call(['sh', '-n', '-c', script]) == 0
+
+    def test_is_clean(self):
+        remote = self.make_remote(
+            'daemons 0\nmounts 0\nkernel_clients 0\npackages 0\n')
+        assert actions.is_clean(remote) is True
+        remote = self.make_remote(
+            'daemons 0\nmounts 0\nkernel_clients 0\npackages 3\n')
+        assert actions.is_clean(remote) is False
@@ -273,6 +273,45 @@ class TestPackaging(object):
         result = packaging.get_package_version(remote, "httpd")
         assert result is None
 
+    def test_get_package_versions_deb(self):
+        remote = Mock()
+        remote.os.package_type = "deb"
+        proc = Mock()
+        proc.stdout.getvalue.return_value = '\n'.join([
+            "ceph\t10.2.0-1xenial\tinstall ok installed",
+            "librados2\t10.1.0-1xenial\tdeinstall ok config-files",
+        ])
+        remote.run.return_value = proc
+        result = packaging.get_package_versions(
+            remote, ["ceph", "librados2", "ceph-test"])
+        assert result == {
+            "ceph": "10.2.0-1xenial",
+            "librados2": None,
+            "ceph-test": None,
+        }
+        assert remote.run.call_count == 1
+        args = remote.run.call_args[1]['args']
+        assert args[:2] == ['dpkg-query', '-W']
+        assert args[-3:] == ["ceph", "librados2", "ceph-test"]
+
+    def test_get_package_versions_rpm(self):
+        remote = Mock()
+        remote.os.package_type = "rpm"
+        proc = Mock()
+        proc.stdout.getvalue.return_value = '\n'.join([
+            "ceph\t10.2.0-1.el7",
+            "package ceph-test is not installed",
+        ])
+        remote.run.return_value = proc
+        result = packaging.get_package_versions(remote, ["ceph", "ceph-test"])
+        assert result == {"ceph": "10.2.0-1.el7", "ceph-test": None}
+        assert remote.run.call_args[1]['args'][:2] == ['rpm', '-q']
+
+    def test_get_package_versions_empty(self):
+        remote = Mock()
+        assert packaging.get_package_versions(remote, []) == dict()
+        assert not remote.run.called
+
     @pytest.mark.parametrize("input, expected", KOJI_TASK_RPMS_MATRIX)
     def test_get_koji_task_result_package_name(self, input, expected):
         assert packaging._get_koji_task_result_package_name(input) == expected
@@ -526,6 +565,7 @@ class TestGitbuilderProject(TestBuilderProject):
     klass = packaging.GitbuilderProject
 
     def setup(self):
+        packaging.clear_metadata_cache()
         self.p_config = patch('teuthology.packaging.config')
         self.m_config = self.p_config.start()
         self.m_config.baseurl_template = \
@@ -616,6 +656,7 @@ class TestShamanProject(TestBuilderProject):
     klass = packaging.ShamanProject
 
     def setup(self):
+        packaging.clear_metadata_cache()
         self.p_config = patch('teuthology.packaging.config')
         self.m_config = self.p_config.start()
         self.m_config.use_shaman = True
@@ -757,3 +798,52 @@ class TestShamanProject(TestBuilderProject):
         ('ubuntu', None, None, 'ubuntu/14.04'),
         ('debian', None, None, 'debian/7.0'),
     ]
+
+
+class TestMetadataCache(object):
+    def setup(self):
+        packaging.clear_metadata_cache()
+        self.p_config = patch('teuthology.packaging.config')
+        self.m_config = self.p_config.start()
+        self.m_config.baseurl_template = \
+            'http://{host}/{proj}-{pkg_type}-{dist}-{arch}-{flavor}/{uri}'
+        self.m_config.gitbuilder_host = "gitbuilder.ceph.com"
+        self.p_get_response = patch("teuthology.packaging._get_response")
+        self.m_get_response = self.p_get_response.start()
+        resp = Mock()
+        resp.ok = True
+        resp.text = "0.90.0"
+        self.m_get_response.return_value = resp
+
+    def teardown(self):
+        self.p_config.stop()
+        self.p_get_response.stop()
+        packaging.clear_metadata_cache()
+
+    def _get_project(self, **kwargs):
+        config = dict(os_type='ubuntu', os_version='14.04', sha1='sha1',
+                      flavor='basic')
+        config.update(kwargs)
+        return packaging.GitbuilderProject('ceph', config)
+
+    def test_version_shared(self):
+        assert self._get_project().version == '0.90.0'
+        assert self._get_project().version == '0.90.0'
+        assert self.m_get_response.call_count == 1
+
+    def test_version_per_platform(self):
+        self._get_project().version
+        self._get_project(arch='aarch64').version
+        self._get_project(os_version='16.04').version
+        self._get_project(sha1='other_sha1').version
+        assert self.m_get_response.call_count == 4
+
+    def test_failure_not_cached(self):
+        resp = Mock()
+        resp.ok = False
+        self.m_get_response.return_value = resp
+        with pytest.raises(VersionNotFoundError):
+            self._get_project().version
+        resp.ok = True
+        resp.text = "0.90.0"
+        assert self._get_project().version == '0.90.0'
@@ -0,0 +1,142 @@
+import gzip
+import os
+import shutil
+import tempfile
+import time
+
+from teuthology import manifest
+from teuthology import prune
+
+
+class TestPrune(object):
+    def setup(self):
+        self.archive = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.archive)
+
+    def make_job(self, run_name, job_id, days_old, success=None,
+                 subdirs=('remote', 'data'), log=True):
+        run_dir = os.path.join(self.archive, run_name)
+        job_dir = os.path.join(run_dir, job_id)
+        os.makedirs(job_dir)
+        for subdir in subdirs:
+            os.mkdir(os.path.join(job_dir, subdir))
+        if success is not None:
+            with file(os.path.join(job_dir, 'summary.yaml'), 'w') as f:
+                f.write('success: %s\n' % str(success).lower())
+        if log:
+            with file(os.path.join(job_dir, 'teuthology.log'), 'w') as f:
+                f.write('log line\n' * 100)
+        self.set_age(job_dir, days_old)
+        return job_dir
+
+    def set_age(self, job_dir, days_old):
+        mtime = time.time() - days_old * 24 * 60 * 60
+        for path in (job_dir, os.path.dirname(job_dir)):
+            os.utime(path, (mtime, mtime))
+
+    def prune(self, processes=1, **kwargs):
+        args = dict(pass_days=14, remotes_days=60, compress_days=30)
+        args.update(kwargs)
+        prune.prune_archive(self.archive, processes=processes, **args)
+
+    def test_passed_jobs_removed(self):
+        old_pass = self.make_job('run1', '1', 20, success=True)
+        old_fail = self.make_job('run1', '2', 20, success=False)
+        new_pass = self.make_job('run2', '3', 1, success=True)
+        self.prune()
+        assert not os.path.exists(old_pass)
+        assert os.path.isdir(old_fail)
+        assert os.path.isdir(new_pass)
+
+    def test_remotes_removed_and_logs_compressed(self):
+        job = self.make_job('run1', '1', 70, success=False)
+        self.prune()
+        assert sorted(os.listdir(job)) == ['summary.yaml',
+                                           'teuthology.log.gz']
+        with gzip.open(os.path.join(job, 'teuthology.log.gz')) as f:
+            assert f.read() == 'log line\n' * 100
+
+    def test_compress_only(self):
+        job = self.make_job('run1', '1', 40, success=True)
+        self.prune(pass_days=-1)
+        assert sorted(os.listdir(job)) == [
+            'data', 'remote', 'summary.yaml', 'teuthology.log.gz']
+
+    def test_preserved(self):
+        job1 = self.make_job('run1', '1', 70, success=True)
+        job2 = self.make_job('run2', '2', 70, success=True)
+        file(os.path.join(self.archive, 'run1', prune.PRESERVE_FILE), 'w')
+        file(os.path.join(job2, prune.PRESERVE_FILE), 'w')
+        self.prune()
+        assert os.path.isdir(os.path.join(job1, 'remote'))
+        assert os.path.isdir(os.path.join(job2, 'remote'))
+
+    def test_dry_run(self):
+        job = self.make_job('run1', '1', 70, success=True)
+        prune.prune_archive(self.archive, 14, 60, 30, dry_run=True)
+        assert os.path.isdir(os.path.join(job, 'remote'))
+
+    def test_processes(self):
+        jobs = [self.make_job('run%d' % i, str(i), 40, success=False)
+                for i in range(6)]
+        self.prune(processes=3)
+        for job in jobs:
+            assert sorted(os.listdir(job)) == [
+                'data', 'remote', 'summary.yaml', 'teuthology.log.gz']
+
+    def test_run_in_processes_failures(self):
+        def func(item):
+            if item % 2:
+                raise ValueError(item)
+            return item != 4
+        assert prune.run_in_processes(func, range(5), 1) == 3
+        assert prune.run_in_processes(func, range(5), 2) == 3
+
+    def test_execute_failures(self):
+        missing = os.path.join(self.archive, 'missing')
+        assert prune.execute(('remove', missing, dict())) is False
+        assert prune.execute(('compress', missing, dict())) is False
+        job = self.make_job('run1', '1', 1)
+        log_path = os.path.join(job, 'teuthology.log')
+        assert prune.execute(('compress', log_path, dict())) is True
+        assert prune.execute(('remove', job, dict())) is True
+
+    def test_dir_entry_fallback(self):
+        job = self.make_job('run1', '1', 1)
+        os.symlink(job, os.path.join(self.archive, 'link'))
+        scandir = prune.scandir
+        prune.scandir = None
+        try:
+            entries = dict((e.name, e) for e in prune.scan(self.archive))
+        finally:
+            prune.scandir = scandir
+        assert entries['run1'].is_dir()
+        assert not entries['run1'].is_symlink()
+        assert entries['link'].is_symlink()
+
+    def test_compress_options(self):
+        job = self.make_job('run1', '1', 40, success=False)
+        self.prune(compress_options=dict(codec='gz', seekable=True))
+        assert sorted(os.listdir(job)) == [
+            'data', 'remote', 'summary.yaml', 'teuthology.log.gz',
+            'teuthology.log.gz.idx']
+
+    def test_manifest_consulted(self):
+        job1 = self.make_job('run1', '1', 20, success=False)
+        job2 = self.make_job('run1', '2', 20, success=True)
+        manifest.record_job(job1, dict(status='pass'))
+        manifest.record_job(job2, dict(status='fail'))
+        self.set_age(job1, 20)
+        self.prune()
+        assert not os.path.exists(job1)
+        assert os.path.isdir(job2)
+
+    def test_summary_formatting(self):
+        job = self.make_job('run1', '1', 20)
+        with file(os.path.join(job, 'summary.yaml'), 'w') as f:
+            f.write('{duration: 10, success: true}\n')
+        self.set_age(job, 20)
+        self.prune()
+        assert not os.path.exists(job)
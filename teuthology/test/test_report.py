@@ -1,6 +1,7 @@
 import yaml
 import json
 import fake_archive
+from mock import patch
 from .. import report
 
 
@@ -75,3 +76,22 @@ class TestSerializer(object):
         assert full_obj == out_obj
 
 
+class TestTryDeleteJobs(object):
+    @patch("teuthology.report.ResultsReporter")
+    def test_delete_jobs(self, m_reporter_class):
+        m_reporter = m_reporter_class.return_value
+        m_reporter.get_jobs.return_value = [
+            dict(job_id=str(i)) for i in range(100)]
+        job_ids = [str(i) for i in range(50)]
+        report.try_delete_jobs('the_run', job_ids)
+        assert not m_reporter.delete_run.called
+        assert sorted(c[0][1] for c in m_reporter.delete_job.call_args_list) \
+            == sorted(job_ids)
+
+    @patch("teuthology.report.ResultsReporter")
+    def test_delete_run(self, m_reporter_class):
+        m_reporter = m_reporter_class.return_value
+        m_reporter.get_jobs.return_value = [dict(job_id='1')]
+        report.try_delete_jobs('the_run', 1)
+        m_reporter.delete_run.assert_called_once_with('the_run')
+        assert not m_reporter.delete_job.called
@@ -1,10 +1,14 @@
+import os
+import shutil
+import tempfile
 import textwrap
 from ..config import config
 from .. import results
 
+from teuthology import manifest
 from teuthology import report
 
-from mock import patch, DEFAULT
+from mock import patch, Mock, DEFAULT
 
 
 class TestResultsEmail(object):
@@ -154,3 +158,103 @@ class TestResultsEmail(object):
                 run_name, _reporter=reporter)
         assert subject == self.reference['subject']
         assert body == self.reference['body']
+
+    def test_build_email_body_jobs(self):
+        reporter = Mock()
+        (subject, body) = results.build_email_body(
+            self.reference['run_name'], _reporter=reporter,
+            _jobs=self.reference['jobs'])
+        assert not reporter.get_jobs.called
+        assert subject == self.reference['subject']
+        assert body == self.reference['body']
+
+
+class TestWaitForJobs(object):
+    def setup(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.reporter = Mock()
+        self.now = 1000.0
+        self.sleeps = 0
+        self.on_sleep = dict()
+        self.patchers = [
+            patch('teuthology.results.time.time', lambda: self.now),
+            patch('teuthology.results.time.sleep', self.sleep),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def teardown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.archive_dir)
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.sleeps += 1
+        func = self.on_sleep.get(self.sleeps)
+        if func:
+            func()
+
+    def finish(self, job_id):
+        job_dir = os.path.join(self.archive_dir, job_id)
+        os.mkdir(job_dir)
+        manifest.record_job(job_dir, dict(status='pass'))
+
+    def jobs(self, *statuses):
+        return [dict(job_id=int(job_id), status=status)
+                for (job_id, status) in enumerate(statuses)]
+
+    def test_finished(self):
+        self.reporter.get_jobs.return_value = self.jobs('pass', 'fail')
+        jobs = results.wait_for_jobs(self.reporter, self.archive_dir,
+                                     'the_run', 3600)
+        assert jobs == self.jobs('pass', 'fail')
+        self.reporter.get_jobs.assert_called_once_with(
+            'the_run', fields=results.EMAIL_FIELDS)
+
+    def test_manifest(self):
+        self.reporter.get_jobs.side_effect = [
+            self.jobs('running', 'queued'),
+            self.jobs('pass', 'pass'),
+        ]
+        self.on_sleep[3] = lambda: self.finish('0')
+        self.on_sleep[5] = lambda: self.finish('1')
+        jobs = results.wait_for_jobs(self.reporter, self.archive_dir,
+                                     'the_run', 3600)
+        assert jobs == self.jobs('pass', 'pass')
+        assert self.reporter.get_jobs.call_count == 2
+        assert self.sleeps == 5
+
+    def test_fallback(self):
+        self.reporter.get_jobs.side_effect = [
+            self.jobs('running'),
+            self.jobs('dead'),
+        ]
+        jobs = results.wait_for_jobs(self.reporter, self.archive_dir,
+                                     'the_run', 3600)
+        assert jobs == self.jobs('dead')
+        assert self.sleeps == \
+            results.FALLBACK_INTERVAL / results.MANIFEST_CHECK_INTERVAL
+
+    def test_timeout(self):
+        self.reporter.get_jobs.return_value = self.jobs('running')
+        jobs = results.wait_for_jobs(self.reporter, self.archive_dir,
+                                     'the_run', 60)
+        assert jobs is None
+        assert self.reporter.get_jobs.call_count == 1
+        # The email is then built from a fresh list
+        self.reporter.get_jobs.return_value = [dict(
+            job_id=0, status='pass', description='desc', duration=10,
+            failure_reason=None, sentry_event=None, log_href='')]
+        (subject, body) = results.build_email_body(
+            'the_run', _reporter=self.reporter, _jobs=jobs)
+        assert self.reporter.get_jobs.call_count == 2
+        assert subject == '1 pass in the_run'
+
+    def test_server_lags(self):
+        self.finish('0')
+        self.reporter.get_jobs.return_value = self.jobs('running')
+        results.wait_for_jobs(self.reporter, self.archive_dir, 'the_run',
+                              results.FALLBACK_INTERVAL)
+        # Fetched once, then again after 5, 10, 20, 40, 80 and 160 seconds
+        assert self.reporter.get_jobs.call_count == 7
@@ -81,3 +81,54 @@ class TestTimer(object):
                     _file.return_value.__enter__.return_value,
                     default_flow_style=False,
                 )
+
+
+class TestCommandStats(object):
+    def test_data_empty(self):
+        self.stats = timer.CommandStats()
+        assert self.stats.data == dict()
+
+    def test_record(self):
+        self.stats = timer.CommandStats()
+        self.stats.record(
+            hostname='host1', label=None, command='uname -m', start=10.0,
+            exec_time=10.25, end=11.5, exitstatus=0, stdout_bytes=7,
+            stderr_bytes=0,
+        )
+        (cmd,) = self.stats.data['commands']
+        assert cmd['host'] == 'host1'
+        assert cmd['duration'] == 1.5
+        assert cmd['ssh'] == 0.25
+        assert cmd['digest'] == timer.CommandStats.get_digest('uname -m')
+        assert cmd['stdout_bytes'] == 7
+
+    def test_aggregates(self):
+        self.stats = timer.CommandStats()
+        for host, command, duration in [
+            ('host1', 'true', 1),
+            ('host2', 'true', 1),
+            ('host1', 'sleep 5', 5),
+        ]:
+            self.stats.record(
+                hostname=host, label=None, command=command, start=0,
+                exec_time=0, end=duration, exitstatus=0, stdout_bytes=None,
+                stderr_bytes=10,
+            )
+        data = self.stats.data
+        assert data['hosts']['host1']['count'] == 2
+        assert data['hosts']['host1']['duration'] == 6
+        assert data['hosts']['host1']['stderr_bytes'] == 20
+        assert data['hosts']['host1']['stdout_bytes'] == 0
+        assert [t['command'] for t in data['top']] == ['sleep 5', 'true']
+        assert data['top'][1]['count'] == 2
+
+    def test_write(self):
+        _path = '/path'
+        _safe_dump = MagicMock(name='safe_dump')
+        with patch('teuthology.timer.yaml.safe_dump', _safe_dump):
+            with patch('teuthology.timer.file') as _file:
+                _file.return_value = MagicMock(spec=file)
+                self.stats = timer.CommandStats(path=_path)
+                self.stats.write()
+                _file.assert_called_once_with(_path, 'w')
+                assert _safe_dump.call_count == 1
@@ -1,10 +1,13 @@
 import beanstalkc
 import os
+import shutil
 import subprocess
+import tempfile
 
 from mock import patch, Mock, MagicMock
 from datetime import datetime, timedelta
 
+from .. import manifest
 from .. import worker
 
 from ..contextutil import MaxWhileTries
@@ -55,6 +58,7 @@ class TestWorker(object):
         # actually logs the exception
         assert m_log.exception.called
 
+    @patch("teuthology.worker.manifest.record_pid")
     @patch("teuthology.worker.run_with_watchdog")
     @patch("teuthology.worker.teuth_config")
     @patch("subprocess.Popen")
@@ -64,7 +68,7 @@ class TestWorker(object):
     @patch("tempfile.NamedTemporaryFile")
     def test_run_job_with_watchdog(self, m_tempfile, m_safe_dump, m_mkdir,
                                    m_environ, m_popen, m_t_config,
-                                   m_run_watchdog):
+                                   m_run_watchdog, m_record_pid):
         config = {
             "suite_path": "suite/path",
             "config": {"foo": "bar"},
@@ -102,7 +106,9 @@ class TestWorker(object):
             "the_name"
         ]
         m_popen.assert_called_with(args=expected_args, env=env)
+        m_record_pid.assert_called_once_with("archive/path", m_p.pid)
 
+    @patch("teuthology.worker.manifest.record_pid")
     @patch("time.sleep")
     @patch("teuthology.worker.symlink_worker_log")
     @patch("teuthology.worker.teuth_config")
@@ -113,7 +119,7 @@ class TestWorker(object):
     @patch("tempfile.NamedTemporaryFile")
     def test_run_job_no_watchdog(self, m_tempfile, m_safe_dump, m_mkdir,
                                  m_environ, m_popen, m_t_config, m_symlink_log,
-                                 m_sleep):
+                                 m_sleep, m_record_pid):
         config = {
             "suite_path": "suite/path",
             "config": {"foo": "bar"},
@@ -185,6 +191,21 @@ class TestWorker(object):
             stderr=subprocess.STDOUT
         )
 
+    def test_record_dead_job(self):
+        run_dir = tempfile.mkdtemp()
+        try:
+            for job_id in ('1', '2'):
+                os.mkdir(os.path.join(run_dir, job_id))
+            with file(os.path.join(run_dir, '2', 'summary.yaml'), 'w') as f:
+                f.write('success: true\n')
+            for job_id in ('1', '2', '3'):
+                worker.record_dead_job(os.path.join(run_dir, job_id))
+            entries = manifest.read_manifest(run_dir)
+            assert entries.keys() == ['1']
+            assert entries['1']['status'] == 'dead'
+        finally:
+            shutil.rmtree(run_dir)
+
     @patch("os.path.isdir")
     @patch("teuthology.worker.fetch_teuthology")
     @patch("teuthology.worker.fetch_qa_suite")
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import time
 import yaml
@@ -112,3 +113,124 @@ class Timer(object):
                 yaml.safe_dump(self.data, f, default_flow_style=False)
         except Exception:
             log.exception("Failed to write timing.yaml !")
+
+
+class CommandStats(object):
+    """
+    A class that records timing and output volume of remote commands.
+
+    It was created in order to find out which remote commands dominate a job's
+    wall time. teuthology.orchestra.run.RemoteProcess objects feed it via
+    self.record() when teuthology.orchestra.run.command_stats is set.
+    """
+    # How many decimal places to use for time intervals
+    precision = 3
+    # How many characters of each command to keep, alongside its digest
+    command_length = 200
+    # How many of the most expensive commands to list in the summary
+    top = 20
+
+    def __init__(self, path=None):
+        """
+        :param path:       A path to a file to be written when self.write() is
+                           called. The file will contain self.data in yaml
+                           format.
+        """
+        self.path = path
+        self.commands = list()
+
+    def record(self, hostname, label, command, start, exec_time, end,
+               exitstatus, stdout_bytes=None, stderr_bytes=None):
+        """
+        Record one finished command
+
+        :param hostname:     The host the command ran on
+        :param label:        The command's label, if any
+        :param command:      The command string
+        :param start:        When the command was started; like time.time()
+        :param exec_time:    When the SSH channel had been opened and the
+                             command handed to the remote host
+        :param end:          When the command was found to have finished
+        :param exitstatus:   The command's exit status
+        :param stdout_bytes: Bytes of stdout read, or None if unknown
+        :param stderr_bytes: Bytes of stderr read, or None if unknown
+        """
+        if exec_time is None:
+            exec_time = start
+        self.commands.append(dict(
+            host=hostname,
+            label=label,
+            digest=self.get_digest(command),
+            command=command[:self.command_length],
+            start=round(start, self.precision),
+            end=round(end, self.precision),
+            duration=round(end - start, self.precision),
+            ssh=round(exec_time - start, self.precision),
+            exitstatus=exitstatus,
+            stdout_bytes=stdout_bytes,
+            stderr_bytes=stderr_bytes,
+        ))
+
+    @staticmethod
+    def get_digest(command):
+        if isinstance(command, unicode):
+            command = command.encode('utf-8')
+        return hashlib.sha1(command).hexdigest()[:12]
+
+    @property
+    def data(self):
+        """
+        Return an object similar to::
+
+            {'commands': [
+                {'host': 'smithi001.front.sepia.ceph.com', 'label': None,
+                 'digest': '7d2bf4b5c1b1', 'command': 'uname -m',
+                 'start': 1454455191.2, 'end': 1454455191.5,
+                 'duration': 0.3, 'ssh': 0.05, 'exitstatus': 0,
+                 'stdout_bytes': 7, 'stderr_bytes': 0},
+             ],
+             'hosts': {
+                 'smithi001.front.sepia.ceph.com': {
+                     'count': 1, 'duration': 0.3, 'ssh': 0.05,
+                     'stdout_bytes': 7, 'stderr_bytes': 0},
+             },
+             'top': [
+                 {'digest': '7d2bf4b5c1b1', 'command': 'uname -m',
+                  'count': 1, 'duration': 0.3},
+             ],
+             }
+
+        'top' lists the commands which took the most time in total.
+        """
+        if not self.commands:
+            return dict()
+        hosts = dict()
+        digests = dict()
+        for cmd in self.commands:
+            host = hosts.setdefault(cmd['host'], dict(
+                count=0, duration=0, ssh=0, stdout_bytes=0, stderr_bytes=0))
+            host['count'] += 1
+            for key in ('duration', 'ssh'):
+                host[key] = round(host[key] + cmd[key], self.precision)
+            for key in ('stdout_bytes', 'stderr_bytes'):
+                host[key] += cmd[key] or 0
+            by_digest = digests.setdefault(cmd['digest'], dict(
+                digest=cmd['digest'], command=cmd['command'], count=0,
+                duration=0))
+            by_digest['count'] += 1
+            by_digest['duration'] = round(
+                by_digest['duration'] + cmd['duration'], self.precision)
+        top = sorted(digests.values(), key=lambda d: d['duration'],
+                     reverse=True)[:self.top]
+        return dict(
+            commands=self.commands,
+            hosts=hosts,
+            top=top,
+        )
+
+    def write(self):
+        try:
+            with file(self.path, 'w') as f:
+                yaml.safe_dump(self.data, f, default_flow_style=False)
+        except Exception:
+            log.exception("Failed to write commands.yaml !")
@@ -10,6 +10,7 @@ from datetime import datetime
 
 from teuthology import setup_log_file
 from . import beanstalk
+from . import manifest
 from . import report
 from . import safepath
 from .config import config as teuth_config
@@ -272,6 +273,10 @@ def run_job(job_config, teuth_bin_path, archive_dir, verbose):
         p = subprocess.Popen(args=arg, env=env)
         log.info("Job archive: %s", job_config['archive_path'])
         log.info("Job PID: %s", str(p.pid))
+        try:
+            manifest.record_pid(job_config['archive_path'], p.pid)
+        except (IOError, OSError):
+            log.exception("Failed to record the job's PID")
 
         if teuth_config.results_server:
             log.info("Running with watchdog")
@@ -349,6 +354,22 @@ def run_with_watchdog(process, job_config):
         # reported to paddles. In that case paddles ignores the 'dead' status.
         # If the job was killed, paddles will use the 'dead' status.
         report.try_push_job_info(job_info, dict(status='dead'))
+    record_dead_job(job_config['archive_path'])
+
+
+def record_dead_job(archive_path):
+    """
+    Record a job that exited without writing its summary as dead in its run's
+    manifest, so that teuthology-results, which watches the manifest, notices
+    it finished
+    """
+    if not os.path.isdir(archive_path) or \
+            os.path.exists(os.path.join(archive_path, 'summary.yaml')):
+        return
+    try:
+        manifest.record_job(archive_path, dict(status='dead'))
+    except (IOError, OSError):
+        log.exception("Failed to record the job in the run's manifest")
 
 
 def symlink_worker_log(worker_log_path, archive_dir):